@@ -0,0 +1,398 @@
+"""Actuator arbiter: one thread owns the motors, the arm servos and the pump.
+
+Callers never write to the PCA9685 themselves. They submit short commands
+(a wheel speed update, one servo frame, pump on/off). A single arbiter
+thread runs them in priority order, so no command waits behind anything
+longer than one in-flight I2C burst:
+
+    estop < obstacle < stop < manual < nav / pattern < arm < automation
+
+The arbiter owns the PCA9685 frequency mode: 1000 Hz for the wheels, 50 Hz
+for the servos. It only switches between commands, stopping the motors or
+releasing the servos first. Among queued commands of equal priority, those
+for the current mode run first, so mode switches are batched.
+
+Long-running activities (navigation, arm routines, patterns) hold a
+Session: an exclusive claim at a priority, with a cancel hook. A
+higher-priority session, a command that outranks it or a stop revokes it.
+Its cancel hook runs, its queued commands are dropped and its next command
+raises Preempted. An emergency stop also latches: every motion command, and
+switching the pump on, is refused until clear_estop(). An obstacle veto (see set_motion_veto) can
+refuse drive commands before they reach the motors.
+"""
+import concurrent.futures
+import itertools
+import threading
+import time
+
+from app import hardware
+
+PRIORITY = {'estop': 0, 'obstacle': 1, 'stop': 2, 'manual': 3, 'nav': 4, 'pattern': 4,
+            'arm': 5, 'automation': 6}
+MODE_FREQUENCY = {'motors': 1000, 'servos': 50}
+PCA_CHANNEL = 0
+ARM_CHANNELS = (9, 10, 11)
+WAIT_TIMEOUT_S = 10.0
+
+
+class Preempted(Exception):
+    """The command or session was cancelled by a higher-priority one (or an emergency stop)."""
+
+
+class Busy(Preempted):
+    """session() could not claim the actuators in time: another session holds them."""
+
+
+class Vetoed(Preempted):
+    """A drive command was refused by the motion veto (e.g. an obstacle ahead)."""
+
+
+_cond = threading.Condition()
+_queue = []               # pending _Command objects
+_seq = itertools.count()
+_mode = None              # current PCA9685 frequency mode
+_session = None           # active Session
+_estop = None             # latched emergency stop reason
+_veto = None              # callable(info) -> reason or None
+_thread = None
+stats = {'commands': 0, 'preempted': 0, 'vetoed': 0, 'superseded': 0, 'timed_out': 0,
+         'mode_switches': 0, 'sessions': 0, 'revoked': 0, 'max_queue': 0, 'estops': 0}
+latency = {}              # class -> {'count', 'total_ms', 'max_ms', 'last_ms'}
+
+
+class _Command:
+    __slots__ = ('priority', 'seq', 'mode', 'fn', 'source', 'key', 'session', 'info', 'submitted', 'future')
+
+    def __init__(self, priority, mode, fn, source, key, session, info):
+        self.priority, self.mode, self.fn, self.source = priority, mode, fn, source
+        self.key, self.session, self.info = key, session, info
+        self.seq = next(_seq)
+        self.submitted = time.monotonic()
+        self.future = concurrent.futures.Future()
+
+
+def _latency_class(priority):
+    for name in ('estop', 'obstacle', 'stop'):
+        if priority == PRIORITY[name]:
+            return name
+    return 'motion'
+
+
+def _record_latency(command):
+    ms = (time.monotonic() - command.submitted) * 1000
+    entry = latency.setdefault(_latency_class(command.priority),
+                               {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': None})
+    entry['count'] += 1
+    entry['total_ms'] += ms
+    entry['max_ms'] = max(entry['max_ms'], ms)
+    entry['last_ms'] = ms
+
+
+def _pca():
+    return hardware.setup_pca9685(channel=PCA_CHANNEL, frequency=None)
+
+
+def _switch_mode(pca, mode):
+    """Leave the current mode safely, then reprogram the prescaler. Called on the arbiter thread."""
+    global _mode
+    if _mode == 'motors':
+        hardware.stop_motors(pca)
+    elif _mode == 'servos':
+        hardware.write_pwm(pca, {ch: 0 for ch in ARM_CHANNELS})
+    hardware.set_pca_frequency(pca, MODE_FREQUENCY[mode])
+    _mode = mode
+    stats['mode_switches'] += 1
+
+
+def _fail(command, exc):
+    if command.future.set_running_or_notify_cancel():
+        command.future.set_exception(exc)
+
+
+def _revoke(session, reason):
+    """Revoke ``session`` and drop its queued commands. Called with _cond held."""
+    global _session
+    if session is None or session.revoked:
+        return
+    session.revoked = reason
+    stats['revoked'] += 1
+    for command in [c for c in _queue if c.session is session]:
+        _queue.remove(command)
+        _fail(command, Preempted(reason))
+        stats['preempted'] += 1
+    if _session is session:
+        _session = None
+    if session.cancel:
+        # Outside the arbiter's critical path: cancel hooks only set flags/events
+        try:
+            session.cancel()
+        except Exception as e:
+            print(f"[WARN] Cancel hook of {session.source} failed: {e}")
+    _cond.notify_all()
+
+
+def _runnable(command):
+    """Whether ``command`` may run now given the active session. Called with _cond held."""
+    session = _session
+    if session is None or command.session is session or command.priority <= PRIORITY['stop']:
+        return True
+    if command.mode is None:
+        return True  # pump/GPIO commands do not touch the PCA9685
+    if command.priority < session.priority:
+        _revoke(session, f'preempted by {command.source}')
+        return True
+    return False
+
+
+def _next_command():
+    with _cond:
+        while True:
+            ready = [c for c in _queue if _runnable(c)]
+            if ready:
+                command = min(ready, key=lambda c: (c.priority, c.mode not in (None, _mode), c.seq))
+                _queue.remove(command)
+                return command
+            _cond.wait()
+
+
+def _arbiter():
+    while True:
+        command = _next_command()
+        if not command.future.set_running_or_notify_cancel():
+            continue
+        try:
+            if command.session is not None and command.session.revoked:
+                raise Preempted(command.session.revoked)
+            pca = _pca()
+            if command.mode is not None and command.mode != _mode:
+                _switch_mode(pca, command.mode)
+            result = command.fn(pca)
+        except BaseException as e:
+            command.future.set_exception(e)
+        else:
+            command.future.set_result(result)
+        stats['commands'] += 1
+        _record_latency(command)
+
+
+def start():
+    """Start the arbiter thread (idempotent)."""
+    global _thread
+    with _cond:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_arbiter, daemon=True, name='actuators')
+            _thread.start()
+
+
+def submit(fn, mode=None, source='api', priority=None, key=None, session=None, info=None):
+    """Queue ``fn(pca)`` and return a Future.
+
+    ``mode`` is 'motors', 'servos' or None (no PCA9685 frequency needed).
+    A queued command with the same ``key`` is replaced (e.g. the previous
+    wheel speed update). ``info`` describes a drive command for the veto.
+    """
+    return _submit(fn, mode, source, priority, key, session, info).future
+
+
+def _submit(fn, mode, source, priority, key, session, info, latched=None):
+    """``latched``: refused while an emergency stop is latched (default: any PCA9685 command)."""
+    start()
+    priority = PRIORITY.get(source, PRIORITY['manual']) if priority is None else priority
+    latched = mode is not None if latched is None else latched
+    with _cond:
+        if _estop and priority > PRIORITY['estop'] and latched:
+            stats['preempted'] += 1
+            raise Preempted(f'emergency stop: {_estop}')
+        if session is not None and session.revoked:
+            raise Preempted(session.revoked)
+        if _veto and info is not None and priority > PRIORITY['obstacle']:
+            reason = _veto(info)
+            if reason:
+                stats['vetoed'] += 1
+                raise Vetoed(reason)
+        command = _Command(priority, mode, fn, source, key, session, info)
+        if key is not None:
+            for old in [c for c in _queue if c.key == key]:
+                _queue.remove(old)
+                old.future.cancel()
+                stats['superseded'] += 1
+        _queue.append(command)
+        stats['max_queue'] = max(stats['max_queue'], len(_queue))
+        _cond.notify_all()
+    return command
+
+
+def _wait(command, timeout):
+    """Result of ``command``; on timeout it is withdrawn, so a caller that got an error never moves anything later."""
+    try:
+        return command.future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        with _cond:
+            if command in _queue:
+                _queue.remove(command)
+                command.future.cancel()
+                stats['timed_out'] += 1
+        raise
+
+
+def call(fn, mode=None, source='api', priority=None, timeout=WAIT_TIMEOUT_S, key=None, session=None, info=None):
+    """submit() and wait for the result."""
+    return _wait(_submit(fn, mode, source, priority, key, session, info), timeout)
+
+
+class Session:
+    """Exclusive use of the actuators by one activity (see module docstring)."""
+
+    def __init__(self, source, mode, priority=None, cancel=None):
+        self.source = source
+        self.mode = mode
+        self.priority = PRIORITY[source] if priority is None else priority
+        self.cancel = cancel
+        self.revoked = None
+
+    def call(self, fn, timeout=WAIT_TIMEOUT_S, key=None, info=None):
+        return _wait(_submit(fn, self.mode, self.source, self.priority, key, self, info), timeout)
+
+    def write_pwm(self, duties):
+        return self.call(lambda pca: hardware.write_pwm(pca, duties))
+
+    def close(self):
+        global _session
+        with _cond:
+            if _session is self:
+                _session = None
+                _cond.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def session(source, mode, priority=None, cancel=None, wait=True, timeout=None):
+    """Claim the actuators for an activity. Preempts a lower-priority session;
+    otherwise waits for the current one to end (or raises Busy if ``wait`` is False or ``timeout`` passes)."""
+    start()
+    new = Session(source, mode, priority, cancel)
+    global _session
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _cond:
+        while True:
+            if _estop and new.priority > PRIORITY['estop']:
+                raise Preempted(f'emergency stop: {_estop}')
+            if _session is None:
+                break
+            if new.priority < _session.priority:
+                _revoke(_session, f'preempted by {source}')
+                break
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if not wait or (remaining is not None and remaining <= 0):
+                raise Busy(f'actuators busy ({_session.source})')
+            _cond.wait(remaining)
+        _session = new
+        stats['sessions'] += 1
+    return new
+
+
+# === Stops ===
+def _stop_all(pca):
+    hardware.stop_motors(pca)
+    hardware.write_pwm(pca, {ch: 0 for ch in ARM_CHANNELS})
+    hardware.pump_off()
+
+
+def emergency_stop(reason='emergency stop'):
+    """Stop everything now and refuse motion until clear_estop(). Returns the stop latency (ms)."""
+    global _estop
+    started = time.monotonic()
+    with _cond:
+        _estop = reason
+        stats['estops'] += 1
+        _revoke(_session, reason)
+        for command in [c for c in _queue if c.priority > PRIORITY['estop']]:
+            _queue.remove(command)
+            _fail(command, Preempted(reason))
+            stats['preempted'] += 1
+    call(_stop_all, source='estop', priority=PRIORITY['estop'])
+    return (time.monotonic() - started) * 1000
+
+
+def clear_estop():
+    global _estop
+    with _cond:
+        _estop = None
+
+
+def stop_motors(source='stop', reason='stop', priority=None):
+    """Stop the wheels, revoking a driving session. Returns the stop latency (ms)."""
+    started = time.monotonic()
+    priority = PRIORITY.get(source, PRIORITY['stop']) if priority is None else priority
+    with _cond:
+        if _session is not None and _session.mode == 'motors' and _session.priority > priority:
+            _revoke(_session, reason)
+    # Stopping needs no mode switch: in servo mode the wheel channels are already off
+    call(lambda pca: hardware.stop_motors(pca), source=source, priority=priority)
+    return (time.monotonic() - started) * 1000
+
+
+def obstacle_stop(reason='obstacle'):
+    return stop_motors(source='obstacle', reason=reason)
+
+
+def set_motion_veto(fn):
+    """``fn(info)`` returns a reason to refuse a drive command (info: {'left', 'right'}) or None."""
+    global _veto
+    _veto = fn
+
+
+def wheel_directions():
+    """(left, right) direction the wheels are driven in right now (see hardware.wheel_directions)."""
+    return hardware.wheel_directions(_pca())
+
+
+# === Convenience commands ===
+def drive(left, right, max_pwm=65535, source='manual', session=None):
+    """Differential drive through the arbiter; replaces a queued update from the same source."""
+    fn = lambda pca: hardware.set_wheel_speeds(pca, left, right, max_pwm)
+    info = {'left': left, 'right': right}
+    if session is not None:
+        return session.call(fn, key=('drive', source), info=info)
+    return call(fn, 'motors', source, key=('drive', source), info=info)
+
+
+DRIVE_ACTIONS = {
+    'forward': hardware.move_forward, 'backward': hardware.move_backward,
+    'left': hardware.rotate_left, 'right': hardware.rotate_right,
+    'northwest': hardware.move_northwest, 'northeast': hardware.move_northeast,
+    'southwest': hardware.move_southwest, 'southeast': hardware.move_southeast,
+}
+# Sign of each wheel for the veto: +1 forward, -1 backward
+DRIVE_DIRECTIONS = {'forward': (1, 1), 'backward': (-1, -1), 'left': (-1, 1), 'right': (1, -1),
+                    'northwest': (1, 1), 'northeast': (1, 1), 'southwest': (-1, -1), 'southeast': (-1, -1)}
+
+
+def drive_action(action, pwm, source='manual'):
+    """One of the manual_control actions ('stop' goes through stop_motors)."""
+    if action == 'stop':
+        return stop_motors(source='stop')
+    move = DRIVE_ACTIONS[action]
+    left, right = DRIVE_DIRECTIONS[action]
+    return call(lambda pca: move(pca, pwm), 'motors', source, key=('drive', source),
+                info={'left': left, 'right': right})
+
+
+def pump(on, source='manual'):
+    """Switch the pump. Switching it on is refused while an emergency stop is latched."""
+    fn = lambda pca: hardware.pump_on() if on else hardware.pump_off()
+    return _wait(_submit(fn, None, source, None, None, None, None, latched=on), WAIT_TIMEOUT_S)
+
+
+def get_stats():
+    with _cond:
+        return dict(stats, queue=len(_queue), mode=_mode, estop=_estop,
+                    session={'source': _session.source, 'mode': _session.mode,
+                             'priority': _session.priority} if _session else None,
+                    latency_ms={name: dict(entry, mean_ms=entry['total_ms'] / entry['count'])
+                                for name, entry in latency.items() if entry['count']})
@@ -0,0 +1,379 @@
+"""Keyframe arm routines: stored, compiled once, played by one worker.
+
+A sequence is a list of keyframes. Each keyframe moves some servos together,
+then holds for a while. Sequences live in ``arm_sequences/<name>.seq``, one
+keyframe per line:
+
+    # sample at a plant pot
+    9:70 10:100 11:0 hold=0.5
+    11:10
+    9:60 10:45 hold=2 shape=scurve
+    release
+
+``release`` drops every PCA9685 channel to 0, so the servos stop holding. A
+name without a file falls back to the built-in object routine generated
+from hardware.object_positions, which is the old perform_object_sequence
+script. New files can be recorded from manual /servo_control moves (see
+start_recording).
+
+Playing a sequence compiles it into one motion tick table for the arm's
+current pose; the table is cached per (sequence, file version, start pose).
+Jobs are queued and run one at a time on a worker thread, and can be
+cancelled and polled for progress, so requests no longer start threads that
+write to the PCA9685 together. Each job plays inside an actuators session,
+so a stop or a higher-priority command cancels it.
+"""
+import collections
+import functools
+import itertools
+import os
+import re
+import threading
+import time
+
+from app import actuators
+from app import hardware
+from app import motion
+
+SEQUENCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'arm_sequences')
+NAME_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+MAX_TEACH_HOLD_S = 10.0
+JOB_HISTORY = 50
+SESSION_POLL_S = 0.2       # how often a job waiting for the actuators checks for cancel()
+
+_cond = threading.Condition()
+_queue = collections.deque()
+_jobs = collections.OrderedDict()  # id -> job dict, newest last
+_job_ids = itertools.count(1)
+_current = None                    # (job, stop event) being played
+_thread = None
+_recording = None                  # {'name', 'keyframes', 'last'} while teaching
+stats = {'compiled': 0, 'cache_hits': 0, 'played': 0, 'cancelled': 0, 'errors': 0}
+
+
+# === File format ===
+def loads(text):
+    """Parse sequence text into [{'targets': {ch: angle}, 'hold': s, 'shape': str}] / {'release': True}."""
+    keyframes = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        if line == 'release':
+            keyframes.append({'release': True})
+            continue
+        frame = {'targets': {}, 'hold': 0.0, 'shape': motion.DEFAULT_PROFILE}
+        try:
+            for token in line.split():
+                if token.startswith('hold='):
+                    frame['hold'] = float(token[5:])
+                elif token.startswith('shape='):
+                    frame['shape'] = token[6:]
+                else:
+                    channel, angle = token.split(':')
+                    frame['targets'][int(channel)] = float(angle)
+        except ValueError:
+            raise ValueError(f"line {number}: cannot parse {line!r}")
+        unknown = [ch for ch in frame['targets'] if ch not in hardware.servo_config]
+        if unknown or frame['hold'] < 0 or frame['shape'] not in ('trapezoid', 'scurve'):
+            raise ValueError(f"line {number}: bad channel, hold or shape in {line!r}")
+        keyframes.append(frame)
+    return keyframes
+
+
+def dumps(keyframes):
+    lines = []
+    for frame in keyframes:
+        if frame.get('release'):
+            lines.append('release')
+            continue
+        tokens = [f"{ch}:{angle:g}" for ch, angle in sorted(frame['targets'].items())]
+        if frame.get('hold'):
+            tokens.append(f"hold={frame['hold']:g}")
+        if frame.get('shape', motion.DEFAULT_PROFILE) != motion.DEFAULT_PROFILE:
+            tokens.append(f"shape={frame['shape']}")
+        lines.append(' '.join(tokens))
+    return '\n'.join(lines) + '\n'
+
+
+def _path(name):
+    if not NAME_RE.match(name or ''):
+        raise ValueError(f"Invalid sequence name: {name!r}")
+    return os.path.join(SEQUENCE_DIR, name + '.seq')
+
+
+def save(name, keyframes):
+    path = _path(name)
+    os.makedirs(SEQUENCE_DIR, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(dumps(keyframes))
+    os.replace(tmp, path)
+
+
+def _object_routine(object_name):
+    """The old perform_object_sequence script as keyframes."""
+    if object_name not in hardware.object_positions:
+        return None
+    init, straight, rest = hardware.init_position, hardware.straight_position, hardware.rest_position
+    target = hardware.object_positions[object_name]
+
+    def one_by_one(position, order, hold):
+        frames = [{'targets': {ch: position[ch]}, 'hold': 0.0} for ch in order if ch in position]
+        frames[-1]['hold'] = hold
+        return frames
+
+    return (one_by_one(init, (9, 10, 11), 0.5)
+            + [{'targets': dict(straight), 'hold': 0.5}]
+            + one_by_one(target, [11] + [ch for ch in target if ch != 11], 2.0)
+            + [{'targets': dict(straight), 'hold': 0.5}]
+            + one_by_one(rest, (9, 10, 11), 0.5)
+            + [{'release': True}])
+
+
+def _version(name):
+    """File modification time, or None for a built-in routine."""
+    try:
+        return os.stat(_path(name)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load(name):
+    version = _version(name)
+    if version is not None:
+        with open(_path(name)) as f:
+            return loads(f.read())
+    keyframes = _object_routine(name)
+    if keyframes is None:
+        raise KeyError(f"Unknown sequence: {name}")
+    for frame in keyframes:
+        if not frame.get('release'):
+            frame.setdefault('shape', motion.DEFAULT_PROFILE)
+    return keyframes
+
+
+def available():
+    names = set(hardware.object_positions)
+    if os.path.isdir(SEQUENCE_DIR):
+        names.update(f[:-4] for f in os.listdir(SEQUENCE_DIR) if f.endswith('.seq'))
+    return sorted(names)
+
+
+# === Compilation ===
+def compile_keyframes(keyframes, start):
+    """One tick table for the whole routine, starting from pose ``start`` ({channel: angle})."""
+    frames, tick, pose = [], 0, dict(start)
+    for frame in keyframes:
+        if frame.get('release'):
+            frames.append((tick, {ch: 0 for ch in range(16)}, {}))
+            tick += 1
+            continue
+        profiles, duration = motion.plan(frame['targets'], start=pose, shape=frame['shape'])
+        moved = motion.compile_profiles(profiles, duration, first_tick=tick)
+        frames.extend(moved)
+        tick = (moved[-1][0] if moved else tick) + 1
+        pose.update({ch: profiles[ch].position(duration) for ch in profiles})
+        tick += round(frame['hold'] * motion.TICK_HZ)
+    return frames, tick
+
+
+@functools.lru_cache(maxsize=64)
+def _compiled(name, version, start):
+    stats['compiled'] += 1
+    return compile_keyframes(load(name), dict(start))
+
+
+def compiled(name):
+    """(frames, total ticks) for ``name`` from the arm's current pose, compiled once per pose."""
+    start = tuple(sorted(hardware.current_angles.items()))
+    hits = _compiled.cache_info().hits
+    table = _compiled(name, _version(name), start)
+    stats['cache_hits'] += _compiled.cache_info().hits - hits
+    return table
+
+
+# === Worker ===
+def _public(job):
+    return {k: v for k, v in job.items() if not k.startswith('_')}
+
+
+def submit(name):
+    """Queue ``name`` to play; returns the job dict (id, status, ...)."""
+    load(name)  # fail now on unknown names or bad files
+    job = {'id': next(_job_ids), 'sequence': name, 'status': 'queued', 'progress': 0.0,
+           'submitted': time.time(), 'started': None, 'finished': None, 'error': None,
+           '_done': threading.Event()}
+    with _cond:
+        _jobs[job['id']] = job
+        while len(_jobs) > JOB_HISTORY:
+            oldest = next(iter(_jobs.values()))
+            if oldest['status'] in ('queued', 'running'):
+                break
+            _jobs.popitem(last=False)
+        _queue.append(job)
+        _cond.notify_all()
+    start()
+    return _public(job)
+
+
+def cancel(job_id=None):
+    """Cancel a queued or running job (default: the running one and everything queued)."""
+    cancelled = []
+    with _cond:
+        for job in list(_queue):
+            if job_id is None or job['id'] == job_id:
+                _queue.remove(job)
+                _finish(job, 'cancelled')
+                cancelled.append(job['id'])
+        if _current and (job_id is None or _current[0]['id'] == job_id):
+            _current[1].set()
+            cancelled.append(_current[0]['id'])
+    return cancelled
+
+
+def _finish(job, status, error=None):
+    job.update(status=status, finished=time.time(), error=error)
+    stats['cancelled' if status == 'cancelled' else 'errors' if status == 'error' else 'played'] += 1
+    job['_done'].set()
+
+
+def wait(job_id, timeout=None):
+    with _cond:
+        job = _jobs.get(job_id)
+    if job is None:
+        return None
+    job['_done'].wait(timeout)
+    return _public(job)
+
+
+def get_job(job_id):
+    with _cond:
+        job = _jobs.get(job_id)
+        return _public(job) if job else None
+
+
+def get_jobs():
+    with _cond:
+        return [_public(job) for job in reversed(_jobs.values())]
+
+
+def _claim(stop):
+    """Actuators session for the next job, or None if it was cancelled while waiting for one."""
+    while not stop.is_set():
+        try:
+            return actuators.session('arm', 'servos', cancel=stop.set, timeout=SESSION_POLL_S)
+        except actuators.Busy:
+            continue  # navigation or a pattern holds the actuators: keep waiting
+    return None
+
+
+def _worker():
+    global _current
+    while True:
+        with _cond:
+            while not _queue:
+                _cond.wait()
+            job = _queue.popleft()
+            stop = threading.Event()
+            _current = (job, stop)
+        try:
+            # The job stays 'queued' (and cancellable) until the actuators are ours
+            session = _claim(stop)
+            if session is None:
+                _finish(job, 'cancelled')
+                continue
+            job.update(status='running', started=time.time())
+            with session, motion.move_lock:
+                frames, ticks = compiled(job['sequence'])
+                job['ticks'] = ticks
+
+                def progress(tick):
+                    job['progress'] = round(min(1.0, tick / max(ticks, 1)), 3)
+
+                finished = motion.play(None, frames, stop, on_tick=progress, session=session)
+                if finished:
+                    # Let the last hold run out before the next job starts
+                    remaining = frames[-1][0] if frames else 0
+                    stop.wait(max(0.0, (ticks - remaining - 1) / motion.TICK_HZ))
+            if stop.is_set():
+                _finish(job, 'cancelled', session.revoked)
+            else:
+                job['progress'] = 1.0
+                _finish(job, 'done')
+        except actuators.Preempted as e:
+            _finish(job, 'cancelled', str(e))
+        except Exception as e:
+            print(f"[ERROR] Arm sequence {job['sequence']} failed: {e}")
+            _finish(job, 'error', str(e))
+        finally:
+            with _cond:
+                _current = None
+
+
+def start():
+    """Start the sequence worker (idempotent)."""
+    global _thread
+    with _cond:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_worker, daemon=True, name='arm-sequences')
+            _thread.start()
+
+
+# === Teach and replay ===
+def start_recording(name):
+    global _recording
+    _path(name)
+    with _cond:
+        _recording = {'name': name, 'keyframes': [], 'last': None}
+
+
+def record(targets, hold=None):
+    """Append a keyframe while recording (a no-op otherwise).
+
+    Without ``hold``, the previous keyframe holds for the time that passed
+    between the two commands (capped at MAX_TEACH_HOLD_S). Raises ValueError
+    for targets or holds loads() would reject.
+    """
+    unknown = [ch for ch in targets if ch not in hardware.servo_config]
+    if unknown:
+        raise ValueError(f"Unknown servo channel(s): {', '.join(map(str, sorted(unknown)))}")
+    if hold is not None and hold < 0:
+        raise ValueError('hold must not be negative')
+    with _cond:
+        if _recording is None:
+            return False
+        now = time.monotonic()
+        frames = _recording['keyframes']
+        if frames and _recording['last'] is not None and not frames[-1].get('hold'):
+            frames[-1]['hold'] = round(min(now - _recording['last'], MAX_TEACH_HOLD_S), 2)
+        frames.append({'targets': dict(targets), 'hold': hold or 0.0, 'shape': motion.DEFAULT_PROFILE})
+        _recording['last'] = now
+        return True
+
+
+def stop_recording(release=True, discard=False):
+    """Finish teaching; writes the sequence file unless ``discard``. Returns its keyframes."""
+    global _recording
+    with _cond:
+        recording, _recording = _recording, None
+    if recording is None:
+        raise ValueError('Not recording')
+    keyframes = recording['keyframes'] + ([{'release': True}] if release else [])
+    if not discard and recording['keyframes']:
+        save(recording['name'], keyframes)
+    return keyframes
+
+
+def recording_status():
+    with _cond:
+        if _recording is None:
+            return None
+        return {'name': _recording['name'], 'keyframes': len(_recording['keyframes'])}
+
+
+def get_stats():
+    with _cond:
+        queued = len(_queue)
+        running = _public(_current[0]) if _current else None
+    return dict(stats, queued=queued, running=running)
@@ -0,0 +1,107 @@
+"""Hardware backend selection.
+
+hardware.py takes its I2C bus, device drivers, GPIO, serial port and 1-Wire
+access from here instead of importing the Raspberry Pi libraries itself.
+``ROVER_BACKEND=sim`` swaps in the simulator from sim_hardware.py, so the
+server can be started, profiled and load-tested on any Linux machine.
+
+Driver modules are imported on first attribute access (``backend.PCA9685``),
+not when this module is imported, so starting the server does not pay for
+drivers a request never touches.
+"""
+import importlib
+import os
+import threading
+import time
+
+NAME = os.environ.get('ROVER_BACKEND', 'pi').lower()
+
+# attribute -> (module, attribute in that module or None for the module itself)
+if NAME == 'sim':
+    _PROVIDERS = {name: ('app.sim_hardware', name) for name in (
+        'I2C', 'PCA9685', 'ADS', 'AnalogIn', 'OutputDevice', 'ping',
+        'lgpio', 'serial', 'gps_port', 'w1_devices_dir', 'read_w1_slave', 'read_w1', 'write_w1')}
+else:
+    _PROVIDERS = {
+        'PCA9685': ('adafruit_pca9685', 'PCA9685'),
+        'ADS': ('adafruit_ads1x15.ads1115', None),
+        'AnalogIn': ('adafruit_ads1x15.analog_in', 'AnalogIn'),
+        'OutputDevice': ('gpiozero', 'OutputDevice'),
+        'lgpio': ('lgpio', None),
+        'serial': ('serial', None),
+    }
+
+    def I2C():
+        import busio
+        from board import SCL, SDA
+        return busio.I2C(SCL, SDA)
+
+    def gps_port():
+        return '/dev/ttyUSB0'
+
+    def w1_devices_dir():
+        return '/sys/bus/w1/devices'
+
+    def read_w1_slave(path):
+        with open(path, 'r') as f:
+            return f.readlines()
+
+    def read_w1(path):
+        """Read a w1 sysfs attribute (temperature, resolution, therm_bulk_read)."""
+        with open(path, 'r') as f:
+            return f.read()
+
+    def write_w1(path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    SPEED_OF_SOUND = 343.0
+    _ping_handle = None
+    _echoes = {}  # echo pin -> {'rise', 'fall' (kernel ns), 'done' Event, 'callback'}
+
+    def _echo_edge(chip, gpio, level, tick):
+        # lgpio alert thread: edge timestamps come from the kernel, so the GIL
+        # or a busy interpreter cannot stretch the measured pulse
+        echo = _echoes[gpio]
+        if level == 1:
+            echo['rise'] = tick
+        elif level == 0 and echo['rise'] is not None and echo['fall'] is None:
+            echo['fall'] = tick
+            echo['done'].set()
+
+    def ping(trigger, echo, max_distance, timeout=0.05):
+        """One HC-SR04 measurement in metres: ``max_distance`` if the echo is
+        longer than that, None if no echo pulse starts within ``timeout``."""
+        global _ping_handle
+        import lgpio
+        if _ping_handle is None:
+            _ping_handle = lgpio.gpiochip_open(0)
+        if echo not in _echoes:
+            lgpio.gpio_claim_output(_ping_handle, trigger, 0)
+            lgpio.gpio_claim_alert(_ping_handle, echo, lgpio.BOTH_EDGES)
+            _echoes[echo] = {'rise': None, 'fall': None, 'done': threading.Event()}
+            _echoes[echo]['callback'] = lgpio.callback(_ping_handle, echo, lgpio.BOTH_EDGES, _echo_edge)
+        state = _echoes[echo]
+        state['rise'] = state['fall'] = None
+        state['done'].clear()
+        lgpio.gpio_write(_ping_handle, trigger, 1)
+        time.sleep(10e-6)
+        lgpio.gpio_write(_ping_handle, trigger, 0)
+        state['done'].wait(timeout + 2 * max_distance / SPEED_OF_SOUND)
+        rise, fall = state['rise'], state['fall']
+        if rise is None:
+            return None
+        if fall is None:
+            return max_distance
+        return min(max_distance, (fall - rise) / 1e9 * SPEED_OF_SOUND / 2)
+
+def __getattr__(name):
+    try:
+        module_name, attr = _PROVIDERS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = importlib.import_module(module_name)
+    if attr is not None:
+        value = getattr(value, attr)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
@@ -0,0 +1,132 @@
+"""Micro-benchmark: per-request sqlite3.connect() vs the pooled WAL layer in db.py.
+
+Replays the query mix of the dashboard poll routes (get_points, get_schedules,
+api_sample_history) from several reader threads while a writer thread inserts
+samples the way scheduler_thread does, and reports requests/sec for both the
+old access pattern and db.py.
+
+    python -m app.bench_db [--seconds 5] [--readers 4]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from app import db
+
+READ_MIX = [
+    ('SELECT point, lat, lng FROM points', ()),
+    ('SELECT point, day, time, pattern, radius, lat, lng, week FROM schedules', ()),
+    ('SELECT timestamp, point, lat, lng, ph, do, turbidity, temp, water_level '
+     'FROM samples ORDER BY timestamp DESC LIMIT 100', ()),
+]
+INSERT_SAMPLE = ('INSERT INTO samples (timestamp, point, lat, lng, ph, ph_voltage, do, '
+                 'do_voltage, turbidity, temp, water_level) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+
+def _make_db(path, rows=2000):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE points (point TEXT PRIMARY KEY, lat REAL, lng REAL)')
+    conn.execute('CREATE TABLE schedules (id INTEGER PRIMARY KEY AUTOINCREMENT, point TEXT UNIQUE, '
+                 'day TEXT, time TEXT, pattern TEXT, radius INTEGER, lat REAL, lng REAL, week INTEGER)')
+    conn.execute('CREATE TABLE samples (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, point TEXT, '
+                 'lat REAL, lng REAL, ph REAL, ph_voltage REAL, do REAL, do_voltage REAL, '
+                 'turbidity REAL, temp REAL, water_level REAL)')
+    for p in 'ABCD':
+        conn.execute('INSERT INTO points VALUES (?, ?, ?)', (p, 14.6, 121.0))
+        conn.execute('INSERT INTO schedules (point, day, time, pattern, radius, lat, lng, week) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (p, 'Monday', '08:00', 'circle', 1, 14.6, 121.0, 1))
+    conn.executemany(INSERT_SAMPLE, [_sample(i) for i in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def _sample(i):
+    return (f'2026-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}', 'ABCD'[i % 4],
+            14.6, 121.0, 7.0, 2.5, 1.5, 900.0, 10.0, 28.0, 1.2)
+
+
+def _old_read(path, sql, params):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute(sql, params)
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+
+def _old_write(path, params):
+    conn = sqlite3.connect(path)
+    conn.execute(INSERT_SAMPLE, params)
+    conn.commit()
+    conn.close()
+
+
+def _run(read_fn, write_fn, seconds, readers):
+    stop = threading.Event()
+    counts = [0] * readers
+    writes = [0]
+
+    def reader(idx):
+        n = 0
+        while not stop.is_set():
+            sql, params = READ_MIX[n % len(READ_MIX)]
+            try:
+                read_fn(sql, params)
+                n += 1
+            except sqlite3.OperationalError:
+                pass  # database is locked: counts as a failed request
+        counts[idx] = n
+
+    def writer():
+        i = 10 ** 6
+        while not stop.is_set():
+            try:
+                write_fn(_sample(i))
+                writes[0] += 1
+            except sqlite3.OperationalError:
+                pass
+            i += 1
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(counts) / seconds, writes[0] / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--readers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path = os.path.join(tmp, 'old.db')
+        _make_db(old_path)
+        old_rps, old_wps = _run(lambda sql, p: _old_read(old_path, sql, p),
+                                lambda p: _old_write(old_path, p),
+                                args.seconds, args.readers)
+
+        new_path = os.path.join(tmp, 'new.db')
+        _make_db(new_path)
+        db.DB_PATH = new_path
+        new_rps, new_wps = _run(db.query, lambda p: db.execute(INSERT_SAMPLE, p),
+                                args.seconds, args.readers)
+        db.close_all()
+
+    print(f"{'':24}{'reads/s':>12}{'writes/s':>12}")
+    print(f"{'connect-per-request':24}{old_rps:12.0f}{old_wps:12.1f}")
+    print(f"{'db.py pooled + WAL':24}{new_rps:12.0f}{new_wps:12.1f}")
+    print(f"speedup: {new_rps / old_rps if old_rps else float('inf'):.2f}x")
+
+
+if __name__ == '__main__':
+    main()
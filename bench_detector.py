@@ -0,0 +1,113 @@
+"""Detector benchmark: latency, throughput, memory and agreement per backend.
+
+Each backend runs in its own process (so peak RSS is its own) over the same
+fixed set of images, after a warm-up pass. Detections are compared with the
+first backend listed, which is treated as the reference: "recall" is the
+share of reference detections found with the same class at IoU >= 0.5.
+
+    python -m app.bench_detector --images samples/ \\
+        --backend ultralytics:yolov8n.pt --backend onnx:yolov8n.onnx \\
+        --backend onnx:yolov8n-int8.onnx [--imgsz 320] [--runs 3]
+
+Without --images a seeded set of synthetic frames is used (timing only).
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import time
+
+from app import detector
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+
+
+def _load_images(directory, np):
+    if not directory:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(8)]
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(directory, pattern)))
+    try:
+        import cv2
+        return [cv2.imread(p) for p in paths]
+    except ImportError:
+        from PIL import Image
+        return [np.asarray(Image.open(p).convert('RGB'))[:, :, ::-1].copy() for p in paths]
+
+
+def _run_backend(spec, images_dir, imgsz, runs):
+    import numpy as np
+    backend, _, model_path = spec.partition(':')
+    images = _load_images(images_dir, np)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    model = detector.load(backend, model_path or None, imgsz)
+    load_s = time.perf_counter() - t0
+    results = [model.detect(image) for image in images]  # warm-up, also the detections compared
+    latencies = []
+    for _ in range(runs):
+        for image in images:
+            start = time.perf_counter()
+            model.detect(image)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        'spec': spec,
+        'load_s': load_s,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        'fps': len(latencies) / sum(latencies),
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'model_rss_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+        'detections': results,
+    }
+
+
+def _iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def recall_against(reference, candidate, iou=0.5):
+    matched = total = 0
+    for ref_objs, objs in zip(reference, candidate):
+        for ref in ref_objs:
+            total += 1
+            if any(o['class'] == ref['class'] and _iou(o['box'], ref['box']) >= iou for o in objs):
+                matched += 1
+    return matched / total if total else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', help='directory of sample images (default: synthetic frames)')
+    parser.add_argument('--backend', action='append', dest='backends',
+                        help='backend[:model path], repeatable; the first is the reference')
+    parser.add_argument('--imgsz', type=int, default=None)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+    backends = args.backends or ['ultralytics:yolov8n.pt', 'onnx:yolov8n.onnx']
+
+    ctx = multiprocessing.get_context('spawn')
+    reports = []
+    for spec in backends:
+        with ctx.Pool(1) as pool:
+            try:
+                reports.append(pool.apply(_run_backend, (spec, args.images, args.imgsz, args.runs)))
+            except Exception as e:
+                print(f"[WARN] {spec}: {e}")
+
+    print(f"{'backend':36}{'load s':>8}{'p50 ms':>9}{'p95 ms':>9}{'fps':>7}{'rss MB':>8}{'model MB':>10}{'recall':>8}")
+    for report in reports:
+        recall = recall_against(reports[0]['detections'], report['detections'])
+        print(f"{report['spec']:36}{report['load_s']:8.2f}{report['p50_ms']:9.1f}{report['p95_ms']:9.1f}"
+              f"{report['fps']:7.1f}{report['rss_mb']:8.0f}{report['model_rss_mb']:10.0f}"
+              f"{'-' if recall is None else f'{recall:.2f}':>8}")
+
+
+if __name__ == '__main__':
+    main()
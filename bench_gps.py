@@ -0,0 +1,121 @@
+"""Throughput benchmark: legacy line-by-line GPS decoding vs gps_parser.
+
+Replays a raw serial capture (as recorded with hardware.GPS_CAPTURE_PATH) in
+fixed-size chunks through GpsStreamParser, and through the old
+readline()/decode()/startswith() loop over an unbuffered stream (pyserial's
+readline() reads one byte per call), and reports bytes, lines and fixes per
+second for both. Without --capture a synthetic ESP32 + NMEA capture is used.
+
+    python -m app.bench_gps [--capture gps.raw] [--chunk 64] [--repeat 20]
+"""
+import argparse
+import functools
+import io
+import time
+
+from app import gps_parser
+
+
+def _nmea(body):
+    checksum = functools.reduce(lambda a, b: a ^ b, body.encode(), 0)
+    return f"${body}*{checksum:02X}\r\n"
+
+
+def synthetic_capture(fixes=2000):
+    """ESP32 text blocks interleaved with GN RMC/GGA/VTG sentences."""
+    out = []
+    for i in range(fixes):
+        lat = 14.5995 + i * 1e-5
+        lng = 120.9842 + i * 1e-5
+        out.append(f"Latitude: {lat:.6f}\r\nLongitude: {lng:.6f}\r\n"
+                   f"Date: 10/18/2026\r\nTime: 08:{i // 60 % 60:02d}:{i % 60:02d}\r\n"
+                   f"{gps_parser.ESP32_DELIMITER.decode()}\r\n")
+        lat_m = f"{int(lat):02d}{(lat % 1) * 60:07.4f}"
+        lng_m = f"{int(lng):03d}{(lng % 1) * 60:07.4f}"
+        hms = f"08{i // 60 % 60:02d}{i % 60:02d}.00"
+        out.append(_nmea(f"GNGGA,{hms},{lat_m},N,{lng_m},E,1,09,0.9,12.3,M,46.9,M,,"))
+        out.append(_nmea("GNVTG,54.7,T,,M,0.4,N,0.7,K,A"))
+        out.append(_nmea(f"GNRMC,{hms},A,{lat_m},N,{lng_m},E,0.4,54.7,181026,,,A"))
+    return ''.join(out).encode()
+
+
+class _FakeSerial(io.RawIOBase):
+    """Unbuffered raw stream like pyserial's Serial: readline() is read(1) per byte."""
+
+    def __init__(self, data):
+        self._src = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._src.readinto(b)
+
+
+def _legacy(data, chunk):
+    # The original _gps_reader: ser.readline(), decode, strip, startswith per line
+    stream = _FakeSerial(data)
+    fixes = lines = 0
+    gps_data = {}
+    while True:
+        raw = stream.readline()
+        if not raw:
+            break
+        line = raw.decode('utf-8', errors='ignore').strip()
+        if not line:
+            continue
+        lines += 1
+        if line.startswith('Latitude:'):
+            gps_data['lat'] = float(line.split(':')[1].strip())
+        elif line.startswith('Longitude:'):
+            gps_data['lng'] = float(line.split(':')[1].strip())
+        elif line.startswith('Date:'):
+            gps_data['date'] = line.split(':', 1)[1].strip()
+        elif line.startswith('Time:'):
+            gps_data['time'] = line.split(':', 1)[1].strip()
+        elif line.startswith('-----------------------'):
+            if 'lat' in gps_data and 'lng' in gps_data:
+                fixes += 1
+            gps_data = {}
+    return lines, fixes
+
+
+def _streaming(data, chunk):
+    parser = gps_parser.GpsStreamParser()
+    view = memoryview(data)
+    fixes = 0
+    for i in range(0, len(data), chunk):
+        fixes += len(parser.feed(view[i:i + chunk]))
+    return parser.stats['lines'], fixes
+
+
+def _measure(fn, data, chunk, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        lines, fixes = fn(data, chunk)
+    elapsed = time.perf_counter() - start
+    return len(data) * repeat / elapsed, lines * repeat / elapsed, fixes * repeat / elapsed, fixes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--capture', help='raw serial capture file (default: synthetic)')
+    parser.add_argument('--chunk', type=int, default=64, help='bytes per simulated serial read')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, 'rb') as f:
+            data = f.read()
+    else:
+        data = synthetic_capture()
+
+    print(f"capture: {len(data)} bytes, chunk {args.chunk}, x{args.repeat}")
+    print(f"{'':22}{'MB/s':>10}{'lines/s':>12}{'fixes/s':>12}{'fixes':>8}")
+    for name, fn in (('legacy (ESP32 only)', _legacy), ('GpsStreamParser', _streaming)):
+        bps, lps, fps, fixes = _measure(fn, data, args.chunk, args.repeat)
+        print(f"{name:22}{bps / 1e6:10.2f}{lps:12.0f}{fps:12.0f}{fixes:8d}")
+
+
+if __name__ == '__main__':
+    main()
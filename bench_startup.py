@@ -0,0 +1,82 @@
+"""Startup benchmark: import time by module, then create_app().
+
+Runs a fresh interpreter with ``-X importtime`` so nothing is cached, and
+reports the modules that dominate the import of the target, grouped by
+top-level package, plus how long main.create_app() takes afterwards.
+
+    python -m app.bench_startup [--module app.main] [--top 15] [--sim]
+"""
+import argparse
+import collections
+import os
+import subprocess
+import sys
+
+_CHILD = '''
+import time
+t0 = time.perf_counter()
+import importlib
+mod = importlib.import_module({module!r})
+t1 = time.perf_counter()
+if {create_app!r} and hasattr(mod, 'create_app'):
+    mod.create_app()
+t2 = time.perf_counter()
+print('STARTUP', t1 - t0, t2 - t1)
+'''
+
+
+def _parse_importtime(stderr):
+    """-> list of (module, self_us, cumulative_us)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='app.main')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--create-app', action='store_true', help='also time create_app() (starts threads)')
+    parser.add_argument('--sim', action='store_true', help='use the simulated hardware backend')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.sim:
+        env['ROVER_BACKEND'] = 'sim'
+    code = _CHILD.format(module=args.module, create_app=args.create_app)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        print(proc.stderr.splitlines()[-1] if proc.stderr else 'import failed')
+        sys.exit(proc.returncode)
+
+    rows = _parse_importtime(proc.stderr)
+    by_package = collections.Counter()
+    for name, self_us, _ in rows:
+        by_package[name.split('.')[0]] += self_us
+
+    print(f"{'package':32}{'self ms':>10}")
+    for package, us in by_package.most_common(args.top):
+        print(f"{package:32}{us / 1000:10.1f}")
+
+    print(f"\n{'module':40}{'cumulative ms':>15}")
+    for name, _, cumulative_us in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{name:40}{cumulative_us / 1000:15.1f}")
+
+    for line in proc.stdout.splitlines():
+        if line.startswith('STARTUP'):
+            _, import_s, create_s = line.split()
+            print(f"\nimport {args.module}: {float(import_s) * 1000:.1f} ms")
+            if args.create_app:
+                print(f"create_app(): {float(create_s) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
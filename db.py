@@ -0,0 +1,131 @@
+"""Shared SQLite access layer for the Flask routes and background threads.
+
+Connections are long-lived and pooled: a thread borrows one for the
+duration of a ``with connection()`` block (nested blocks on the same thread
+reuse it) and hands it back afterwards, so routes no longer pay a file open,
+schema parse and pragma setup on every request. The database runs in WAL
+mode so the scheduler's writes do not block dashboard readers.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, 'schedules.db')
+
+POOL_SIZE = 8              # idle connections kept open
+STATEMENT_CACHE_SIZE = 128  # prepared statements cached per connection
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 8192
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_local = threading.local()
+_wal_enabled = False
+_wal_lock = threading.Lock()
+
+
+def _connect():
+    global _wal_enabled
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000.0,
+                           check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    # journal_mode is persistent in the file, the rest are per-connection
+    with _wal_lock:
+        if not _wal_enabled:
+            conn.execute('PRAGMA journal_mode=WAL')
+            _wal_enabled = True
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    return conn
+
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection for the current thread."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        yield conn
+        return
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _connect()
+    _local.conn = conn
+    try:
+        yield conn
+    finally:
+        _local.conn = None
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            _pool.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+
+@contextmanager
+def transaction():
+    """Run several statements in one transaction (commit on success).
+
+    Nested inside another transaction (or uncommitted writes in a
+    ``connection()`` block) it becomes a SAVEPOINT: an error rolls back only
+    the inner block's statements, and only the outermost block commits.
+    """
+    with connection() as conn:
+        if not conn.in_transaction:
+            conn.execute('BEGIN')
+            with conn:
+                yield conn
+            return
+        depth = getattr(_local, 'savepoints', 0)
+        name = f'nested_{depth}'
+        conn.execute(f'SAVEPOINT {name}')
+        _local.savepoints = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f'ROLLBACK TO {name}')
+            raise
+        finally:
+            _local.savepoints = depth
+            conn.execute(f'RELEASE {name}')
+
+
+def query(sql, params=()):
+    with connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def query_one(sql, params=()):
+    with connection() as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+def execute(sql, params=()):
+    """Execute a single write statement and commit. Returns the rowcount."""
+    with transaction() as conn:
+        return conn.execute(sql, params).rowcount
+
+
+def insert(sql, params=()):
+    """Execute a single INSERT and commit. Returns the new row id."""
+    with transaction() as conn:
+        return conn.execute(sql, params).lastrowid
+
+
+def executemany(sql, seq_of_params):
+    with transaction() as conn:
+        return conn.executemany(sql, seq_of_params).rowcount
+
+
+def close_all():
+    """Close idle pooled connections (e.g. before exit or after tests)."""
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
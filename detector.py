@@ -0,0 +1,171 @@
+"""Object detector backends for the vision worker.
+
+Every backend takes a BGR uint8 image and returns the same detection dicts
+(``class``, ``name``, ``confidence``, ``box``), so callers do not care which
+runtime produced them:
+
+* ``ultralytics``: stock PyTorch YOLOv8 (``yolov8n.pt``).
+* ``onnx``: the same model exported to ONNX and run with ONNX Runtime on the
+  CPU, optionally INT8-quantized. Pre/post-processing (letterbox, NMS) is
+  done here in NumPy, so neither torch nor ultralytics is imported.
+
+Export a model once on any machine with ultralytics installed:
+
+    python -m app.detector yolov8n.pt --imgsz 320 [--int8]
+"""
+import argparse
+import ast
+import os
+
+DEFAULT_IMGSZ = 640
+CONFIDENCE = 0.25
+IOU_THRESHOLD = 0.45
+MAX_DETECTIONS = 100
+
+
+class UltralyticsDetector:
+    def __init__(self, model_path='yolov8n.pt', imgsz=DEFAULT_IMGSZ, confidence=CONFIDENCE):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.imgsz = imgsz
+        self.confidence = confidence
+
+    def detect(self, image):
+        results = self.model(image, imgsz=self.imgsz, conf=self.confidence, verbose=False)
+        objects = []
+        for r in results:
+            names = r.names
+            for box in r.boxes:
+                cls = int(box.cls[0])
+                objects.append({
+                    'class': cls,
+                    'name': names.get(cls, str(cls)) if isinstance(names, dict) else names[cls],
+                    'confidence': float(box.conf[0]),
+                    'box': [round(float(v), 1) for v in box.xyxy[0]],  # x1, y1, x2, y2 in pixels
+                })
+        return objects
+
+
+def _letterbox(image, size, np):
+    """Resize keeping aspect ratio and pad to size x size (grey 114), like ultralytics."""
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    new_h, new_w = int(round(h * scale)), int(round(w * scale))
+    try:
+        import cv2
+        resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    except ImportError:
+        rows = (np.arange(new_h) / scale).astype(np.int32).clip(0, h - 1)
+        cols = (np.arange(new_w) / scale).astype(np.int32).clip(0, w - 1)
+        resized = image[rows[:, None], cols]
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return canvas, scale, left, top
+
+
+def _nms(boxes, scores, iou_threshold, np):
+    order = scores.argsort()[::-1]
+    keep = []
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    while order.size and len(keep) < MAX_DETECTIONS:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(boxes[i, 0], boxes[order[1:], 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[order[1:], 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[order[1:], 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[order[1:], 3])
+        inter = (xx2 - xx1).clip(0) * (yy2 - yy1).clip(0)
+        iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+        order = order[1:][iou <= iou_threshold]
+    return keep
+
+
+class OnnxDetector:
+    def __init__(self, model_path='yolov8n.onnx', imgsz=None, confidence=CONFIDENCE, threads=None):
+        import numpy as np
+        import onnxruntime as ort
+        self.np = np
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input = self.session.get_inputs()[0]
+        shape = self.input.shape  # [1, 3, H, W], static for ultralytics exports
+        self.imgsz = shape[2] if isinstance(shape[2], int) else (imgsz or DEFAULT_IMGSZ)
+        if imgsz and imgsz != self.imgsz:
+            print(f"[WARN] {model_path} was exported at {self.imgsz}px, ignoring imgsz={imgsz}")
+        self.confidence = confidence
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta['names']) if 'names' in meta else {}
+
+    def detect(self, image):
+        np = self.np
+        canvas, scale, left, top = _letterbox(image, self.imgsz, np)
+        blob = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0  # BGR->RGB, NCHW
+        output = self.session.run(None, {self.input.name: np.ascontiguousarray(blob)})[0]
+        preds = output[0].T  # (anchors, 4 + classes): cx, cy, w, h, class scores
+        scores = preds[:, 4:]
+        classes = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(classes)), classes]
+        mask = confidences >= self.confidence
+        preds, classes, confidences = preds[mask], classes[mask], confidences[mask]
+        if not len(preds):
+            return []
+        boxes = np.empty((len(preds), 4), dtype=np.float32)
+        boxes[:, 0] = preds[:, 0] - preds[:, 2] / 2
+        boxes[:, 1] = preds[:, 1] - preds[:, 3] / 2
+        boxes[:, 2] = preds[:, 0] + preds[:, 2] / 2
+        boxes[:, 3] = preds[:, 1] + preds[:, 3] / 2
+        # Per-class NMS by offsetting each class into its own coordinate range
+        keep = _nms(boxes + classes[:, None] * 4096.0, confidences, IOU_THRESHOLD, np)
+        h, w = image.shape[:2]
+        boxes = (boxes - [left, top, left, top]) / scale
+        boxes = boxes.clip(0, [w, h, w, h])
+        return [
+            {
+                'class': int(classes[i]),
+                'name': self.names.get(int(classes[i]), str(int(classes[i]))),
+                'confidence': float(confidences[i]),
+                'box': [round(float(v), 1) for v in boxes[i]],
+            }
+            for i in keep
+        ]
+
+
+BACKENDS = {'ultralytics': UltralyticsDetector, 'onnx': OnnxDetector}
+
+
+def load(backend='ultralytics', model_path=None, imgsz=None):
+    """Create a detector; ``model_path`` defaults to yolov8n.pt / yolov8n.onnx."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend}")
+    kwargs = {'imgsz': imgsz} if imgsz else {}
+    if model_path:
+        kwargs['model_path'] = model_path
+    return BACKENDS[backend](**kwargs)
+
+
+def export_onnx(weights='yolov8n.pt', imgsz=DEFAULT_IMGSZ, int8=False):
+    """Export YOLOv8 weights to ONNX (and a dynamically INT8-quantized copy). Returns the path."""
+    from ultralytics import YOLO
+    path = YOLO(weights).export(format='onnx', imgsz=imgsz, opset=12, simplify=True)
+    if int8:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantized = path.replace('.onnx', '-int8.onnx')
+        quantize_dynamic(path, quantized, weight_type=QuantType.QUInt8)
+        path = quantized
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export YOLOv8 weights for the onnx backend')
+    parser.add_argument('weights', nargs='?', default='yolov8n.pt')
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ)
+    parser.add_argument('--int8', action='store_true', help='also write a dynamically quantized model')
+    args = parser.parse_args()
+    print(export_onnx(args.weights, args.imgsz, args.int8))
+
+
+if __name__ == '__main__':
+    main()
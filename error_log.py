@@ -0,0 +1,175 @@
+"""Asynchronous, bounded error-log pipeline.
+
+log_error() only enqueues; a background writer drains the queue in batched
+transactions. Entries below MIN_PERSIST_SEVERITY are printed but not stored,
+repeats of the same message within DEDUP_WINDOW_S bump a counter on the
+existing row instead of adding rows, and the table is pruned by row count
+and age.
+"""
+import datetime
+import queue
+import threading
+import time
+
+from app import db
+
+SEVERITIES = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+MIN_PERSIST_SEVERITY = 'WARNING'
+DEDUP_WINDOW_S = 300.0
+FLUSH_INTERVAL_S = 1.0
+MAX_BATCH = 100
+MAX_ROWS = 5000
+MAX_AGE_DAYS = 30
+PRUNE_INTERVAL_S = 600.0
+
+_queue = queue.Queue(maxsize=1000)
+_writer_thread = None
+_start_lock = threading.Lock()
+_recent_lock = threading.Lock()  # held by the writer while it uses _recent, and by clear()
+_recent = {}  # (error_type, message, component, severity) -> (row id, monotonic time stored)
+stats = {'queued': 0, 'filtered': 0, 'dropped': 0, 'inserted': 0, 'deduplicated': 0, 'pruned': 0}
+
+COLUMNS = 'timestamp, error_type, message, component, severity, water_level, gps_lat, gps_lng, count, last_timestamp'
+
+
+def severity_rank(severity):
+    try:
+        return SEVERITIES.index(str(severity).upper())
+    except ValueError:
+        return SEVERITIES.index('ERROR')  # unknown severities are kept
+
+
+def init_schema(c):
+    """Add dedup columns to error_logs and its indexes. ``c`` is an open connection/cursor."""
+    columns = {row[1] for row in c.execute('PRAGMA table_info(error_logs)')}
+    if 'count' not in columns:
+        c.execute('ALTER TABLE error_logs ADD COLUMN count INTEGER DEFAULT 1')
+    if 'last_timestamp' not in columns:
+        c.execute('ALTER TABLE error_logs ADD COLUMN last_timestamp TEXT')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_error_logs_timestamp ON error_logs (timestamp)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_error_logs_component ON error_logs (component, timestamp)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_error_logs_severity ON error_logs (severity, timestamp)')
+
+
+def log_error(error_type, message, component, severity, water_level=None, gps_lat=None, gps_lng=None):
+    """Queue a log entry; never blocks the caller on the database."""
+    severity = str(severity).upper()
+    if severity_rank(severity) < severity_rank(MIN_PERSIST_SEVERITY):
+        stats['filtered'] += 1
+        return
+    start()
+    entry = (datetime.datetime.now().isoformat(), error_type, message, component,
+             severity, water_level, gps_lat, gps_lng)
+    try:
+        _queue.put_nowait(entry)
+        stats['queued'] += 1
+    except queue.Full:
+        stats['dropped'] += 1
+
+
+def _write_batch(batch):
+    now = time.monotonic()
+    with _recent_lock:
+        with db.transaction() as conn:
+            for entry in batch:
+                timestamp, error_type, message, component, severity = entry[:5]
+                key = (error_type, message, component, severity)
+                recent = _recent.get(key)
+                if recent and now - recent[1] < DEDUP_WINDOW_S:
+                    updated = conn.execute('UPDATE error_logs SET count = COALESCE(count, 1) + 1, last_timestamp = ? '
+                                           'WHERE id = ?', (timestamp, recent[0])).rowcount
+                    if updated:
+                        stats['deduplicated'] += 1
+                        continue
+                cur = conn.execute('''INSERT INTO error_logs
+                    (timestamp, error_type, message, component, severity, water_level, gps_lat, gps_lng, count, last_timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)''', entry + (timestamp,))
+                _recent[key] = (cur.lastrowid, now)
+                stats['inserted'] += 1
+        for key in [k for k, (_, t) in _recent.items() if now - t >= DEDUP_WINDOW_S]:
+            del _recent[key]
+
+
+def prune():
+    """Apply the row-count and age retention limits."""
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=MAX_AGE_DAYS)).isoformat()
+    with db.transaction() as conn:
+        removed = conn.execute('DELETE FROM error_logs WHERE timestamp < ?', (cutoff,)).rowcount
+        removed += conn.execute('''DELETE FROM error_logs WHERE id IN (
+            SELECT id FROM error_logs ORDER BY timestamp DESC LIMIT -1 OFFSET ?)''', (MAX_ROWS,)).rowcount
+    stats['pruned'] += removed
+
+
+def clear():
+    """Delete every stored entry (and forget dedup state)."""
+    with _recent_lock:
+        _recent.clear()
+        db.execute('DELETE FROM error_logs')
+
+
+def _writer():
+    last_prune = 0.0
+    while True:
+        batch = []
+        try:
+            batch.append(_queue.get(timeout=FLUSH_INTERVAL_S))
+            while len(batch) < MAX_BATCH:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+        try:
+            if batch:
+                _write_batch(batch)
+            if time.monotonic() - last_prune >= PRUNE_INTERVAL_S:
+                prune()
+                last_prune = time.monotonic()
+        except Exception as e:
+            print(f"Error logging failed: {str(e)}")
+
+
+def start():
+    """Start the background writer (idempotent)."""
+    global _writer_thread
+    if _writer_thread is not None and _writer_thread.is_alive():
+        return
+    with _start_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer, daemon=True)
+            _writer_thread.start()
+
+
+def query(component=None, severity=None, min_severity=None, limit=100):
+    """Newest-first entries as dicts, optionally filtered."""
+    where, params = [], []
+    if component:
+        where.append('component = ?')
+        params.append(component)
+    if severity:
+        levels = [s.strip().upper() for s in severity.split(',') if s.strip()]
+        if levels:
+            where.append(f"severity IN ({', '.join('?' * len(levels))})")
+            params.extend(levels)
+    if min_severity:
+        levels = SEVERITIES[severity_rank(min_severity):]
+        where.append(f"severity IN ({', '.join('?' * len(levels))})")
+        params.extend(levels)
+    sql = f'SELECT {COLUMNS} FROM error_logs'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY timestamp DESC LIMIT ?'
+    params.append(max(1, min(int(limit), 1000)))
+    return [
+        {
+            'timestamp': row[0],
+            'error_type': row[1],
+            'message': row[2],
+            'component': row[3],
+            'severity': row[4],
+            'water_level': row[5],
+            'gps_lat': row[6],
+            'gps_lng': row[7],
+            'count': row[8] or 1,
+            'last_timestamp': row[9] or row[0]
+        }
+        for row in db.query(sql, params)
+    ]
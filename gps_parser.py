@@ -0,0 +1,204 @@
+"""Incremental GPS stream parser.
+
+Works directly on the bytes read from the serial port and understands both
+the ESP32's text blocks (``Latitude:``/``Longitude:``/``Date:``/``Time:``
+terminated by a dashed line) and checksummed NMEA 0183 RMC/GGA/VTG sentences
+from any talker (GP, GN, ...). Completed fixes are returned from feed().
+"""
+import datetime
+
+ESP32_DELIMITER = b'-----------------------'
+MAX_LINE = 256  # anything longer without a newline is garbage
+
+KNOTS_TO_KMH = 1.852
+
+
+def _checksum_ok(line):
+    """Validate ``$...*hh``. Sentences without a checksum are accepted."""
+    star = line.rfind(b'*')
+    if star == -1:
+        return True
+    try:
+        expected = int(line[star + 1:star + 3], 16)
+    except ValueError:
+        return False
+    actual = 0
+    for byte in line[1:star]:
+        actual ^= byte
+    return actual == expected
+
+
+def _coord(value, hemisphere, degree_digits):
+    if not value:
+        return None
+    deg = float(value[:degree_digits]) + float(value[degree_digits:]) / 60.0
+    return -deg if hemisphere in ('S', 'W') else deg
+
+
+def _float(value):
+    return float(value) if value else None
+
+
+def _nmea_time(value):
+    return f"{value[:2]}:{value[2:4]}:{value[4:6]}" if len(value) >= 6 else None
+
+
+def parse_nmea_fields(sentence):
+    """Parse one NMEA sentence (str, without line ending) into a dict of fields.
+
+    Returns None for unsupported sentence types or bad checksums.
+    """
+    line = sentence.strip().encode('ascii', 'ignore')
+    if not line.startswith(b'$') or not _checksum_ok(line):
+        return None
+    return _parse_fields(line)
+
+
+def _parse_fields(line):
+    star = line.find(b'*')
+    body = (line[1:star] if star != -1 else line[1:]).decode('ascii', 'ignore')
+    parts = body.split(',')
+    kind = parts[0][2:]
+    try:
+        if kind == 'RMC' and len(parts) >= 10:
+            return {
+                'type': 'RMC',
+                'time': _nmea_time(parts[1]),
+                'valid': parts[2] == 'A',
+                'lat': _coord(parts[3], parts[4], 2),
+                'lng': _coord(parts[5], parts[6], 3),
+                'speed_kmh': _float(parts[7]) * KNOTS_TO_KMH if parts[7] else None,
+                'course': _float(parts[8]),
+                'date': f"{parts[9][2:4]}/{parts[9][:2]}/20{parts[9][4:6]}" if len(parts[9]) == 6 else None,
+            }
+        if kind == 'GGA' and len(parts) >= 10:
+            quality = int(parts[6]) if parts[6] else 0
+            return {
+                'type': 'GGA',
+                'time': _nmea_time(parts[1]),
+                'lat': _coord(parts[2], parts[3], 2),
+                'lng': _coord(parts[4], parts[5], 3),
+                'fix_quality': quality,
+                'valid': quality > 0,
+                'satellites': int(parts[7]) if parts[7] else None,
+                'hdop': _float(parts[8]),
+                'altitude': _float(parts[9]),
+            }
+        if kind == 'VTG' and len(parts) >= 8:
+            return {
+                'type': 'VTG',
+                'course': _float(parts[1]),
+                'speed_kmh': _float(parts[7]),
+            }
+    except ValueError:
+        return None
+    return None
+
+
+class GpsStreamParser:
+    """Feed raw serial bytes, get completed fixes back."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._esp32 = {}
+        self._nmea = {}
+        self._sends_rmc = None  # unknown until an RMC, or a whole GGA cycle without one
+        self._gga_seen = False
+        self.stats = {'bytes': 0, 'lines': 0, 'fixes': 0, 'bad_checksum': 0, 'discarded': 0}
+
+    def feed(self, data):
+        """Consume a chunk of bytes; returns a list of new fix dicts."""
+        self.stats['bytes'] += len(data)
+        self._buf += data
+        fixes = []
+        start = 0
+        buf = self._buf
+        while True:
+            end = buf.find(b'\n', start)
+            if end == -1:
+                break
+            line = bytes(buf[start:end]).strip()
+            start = end + 1
+            if line:
+                self.stats['lines'] += 1
+                fix = self._line(line)
+                if fix is not None:
+                    self.stats['fixes'] += 1
+                    fixes.append(fix)
+        del buf[:start]
+        if len(buf) > MAX_LINE:
+            self.stats['discarded'] += len(buf)
+            buf.clear()
+        return fixes
+
+    def _line(self, line):
+        if line[:1] == b'$':
+            return self._nmea_line(line)
+        if line.startswith(b'Latitude:'):
+            self._esp32['lat'] = _float_or_none(line[9:])
+        elif line.startswith(b'Longitude:'):
+            self._esp32['lng'] = _float_or_none(line[10:])
+        elif line.startswith(b'Date:'):
+            self._esp32['date'] = line[5:].strip().decode('utf-8', 'replace')
+        elif line.startswith(b'Time:'):
+            self._esp32['time'] = line[5:].strip().decode('utf-8', 'replace')
+        elif line.startswith(ESP32_DELIMITER):
+            data, self._esp32 = self._esp32, {}
+            if data.get('lat') is not None and data.get('lng') is not None:
+                return {
+                    'lat': data['lat'],
+                    'lng': data['lng'],
+                    'date': data.get('date'),
+                    'time': data.get('time'),
+                    'raw': f"Lat: {data['lat']}, Lng: {data['lng']}, Date: {data.get('date')}, Time: {data.get('time')}",
+                    'source': 'esp32',
+                    'fix_quality': None,
+                    'timestamp': datetime.datetime.now().isoformat(),
+                }
+        return None
+
+    def _nmea_line(self, line):
+        if not _checksum_ok(line):
+            self.stats['bad_checksum'] += 1
+            return None
+        fields = _parse_fields(line)
+        if fields is None:
+            return None
+        kind = fields.pop('type')
+        state = self._nmea
+        state.update({k: v for k, v in fields.items() if v is not None})
+        if kind == 'RMC':
+            self._sends_rmc = True
+        elif kind == 'GGA' and self._sends_rmc is None:
+            # Only a second GGA with no RMC in between shows the receiver sends no RMC;
+            # closing an epoch on the first GGA would repeat that fix at the next RMC
+            if self._gga_seen:
+                self._sends_rmc = False
+            self._gga_seen = True
+        # RMC closes an epoch; GGA does too on receivers that do not send RMC
+        if kind == 'RMC' or (kind == 'GGA' and self._sends_rmc is False):
+            if not fields.get('valid') or fields.get('lat') is None or fields.get('lng') is None:
+                return None
+            return {
+                'lat': fields['lat'],
+                'lng': fields['lng'],
+                'date': state.get('date'),
+                'time': state.get('time'),
+                'raw': line.decode('ascii', 'ignore'),
+                'source': 'nmea',
+                'fix_quality': state.get('fix_quality'),
+                'satellites': state.get('satellites'),
+                'hdop': state.get('hdop'),
+                'altitude': state.get('altitude'),
+                'speed_kmh': state.get('speed_kmh'),
+                'course': state.get('course'),
+                'timestamp': datetime.datetime.now().isoformat(),
+            }
+        return None
+
+
+def _float_or_none(value):
+    try:
+        return float(value.strip())
+    except ValueError:
+        return None
@@ -0,0 +1,108 @@
+"""Background GPS track writer.
+
+Fixes are pushed by the hardware GPS thread (see hardware.add_gps_listener),
+so gps_log grows with the number of fixes instead of the number of dashboards
+polling /api/gps. Stationary duplicates are dropped and the remaining rows are
+written in periodic batched transactions.
+"""
+import datetime
+import queue
+import threading
+import time
+
+from app import db
+from app import hardware
+from app import spatial
+
+MIN_MOVE_M = 2.0         # skip fixes closer than this to the last stored one...
+MAX_IDLE_S = 60.0        # ...unless this long has passed since it was stored
+FLUSH_INTERVAL_S = 5.0   # commit a batch at least this often
+MAX_BATCH = 50           # or as soon as this many rows are pending
+
+_fix_queue = queue.Queue(maxsize=1000)
+_writer_thread = None
+_last_stored = None      # (lat, lng, monotonic time) of the last accepted fix
+stats = {'received': 0, 'skipped': 0, 'dropped': 0, 'written': 0, 'batches': 0}
+
+INSERT_SQL = 'INSERT INTO gps_log (timestamp, lat, lng, raw, date, time) VALUES (?, ?, ?, ?, ?, ?)'
+
+
+def fix_date_time(gps):
+    """Return (date, time) for a fix, falling back to the raw NMEA sentence."""
+    date_str = gps.get('date')
+    time_str = gps.get('time')
+    if (not date_str or not time_str) and gps.get('raw'):
+        try:
+            parts = gps['raw'].split(',')
+            if gps['raw'].startswith('$GPRMC'):
+                if len(parts) > 9:
+                    time_str = f"{parts[1][:2]}:{parts[1][2:4]}:{parts[1][4:6]}"
+                    date_str = f"{parts[9][4:6]}/{parts[9][2:4]}/{parts[9][:2]}"
+            elif gps['raw'].startswith('$GPGGA'):
+                if len(parts) > 1:
+                    time_str = f"{parts[1][:2]}:{parts[1][2:4]}:{parts[1][4:6]}"
+                    date_str = datetime.datetime.now().strftime("%m/%d/%Y")
+        except Exception as e:
+            print(f"Error parsing GPS date/time: {e}")
+    return date_str, time_str
+
+
+def _should_store(fix, now):
+    global _last_stored
+    if _last_stored is not None:
+        lat, lng, t = _last_stored
+        if now - t < MAX_IDLE_S and spatial.haversine_m(lat, lng, fix['lat'], fix['lng']) < MIN_MOVE_M:
+            return False
+    _last_stored = (fix['lat'], fix['lng'], now)
+    return True
+
+
+def _on_fix(fix):
+    """GPS listener: runs on the GPS thread, so only enqueue."""
+    stats['received'] += 1
+    try:
+        _fix_queue.put_nowait(fix)
+    except queue.Full:
+        stats['dropped'] += 1
+
+
+def _flush(batch):
+    if not batch:
+        return
+    try:
+        db.executemany(INSERT_SQL, batch)
+        stats['written'] += len(batch)
+        stats['batches'] += 1
+    except Exception as e:
+        print(f"[ERROR] GPS track write failed: {e}")
+    batch.clear()
+
+
+def _writer():
+    batch = []
+    deadline = time.monotonic() + FLUSH_INTERVAL_S
+    while True:
+        try:
+            fix = _fix_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            fix = None
+        if fix is not None and fix.get('lat') is not None and fix.get('lng') is not None:
+            if _should_store(fix, time.monotonic()):
+                date_str, time_str = fix_date_time(fix)
+                batch.append((fix.get('timestamp') or datetime.datetime.now().isoformat(),
+                              fix['lat'], fix['lng'], fix.get('raw'), date_str, time_str))
+            else:
+                stats['skipped'] += 1
+        if len(batch) >= MAX_BATCH or time.monotonic() >= deadline:
+            _flush(batch)
+            deadline = time.monotonic() + FLUSH_INTERVAL_S
+
+
+def start():
+    """Subscribe to the GPS thread and start the batch writer (idempotent)."""
+    global _writer_thread
+    if _writer_thread is None or not _writer_thread.is_alive():
+        hardware.add_gps_listener(_on_fix)
+        _writer_thread = threading.Thread(target=_writer, daemon=True)
+        _writer_thread.start()
+    hardware.start_gps_thread()
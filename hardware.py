@@ -1,41 +1,44 @@
 import time
-import busio
-from board import SCL, SDA
-from adafruit_pca9685 import PCA9685
-from gpiozero import OutputDevice, DistanceSensor
-import board
-from adafruit_tca9548a import TCA9548A
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-import Adafruit_ADS1x15  # For DO sensor
-import glob
+import concurrent.futures
 import os
-import serial  # For UART GPS
 import threading
-import queue
 import datetime
-import lgpio
-try:
-    from picamera import PiCamera
-except (ImportError, OSError):
-    PiCamera = None
-
-# For YOLOv8 (assume ultralytics is installed)
-try:
-    from ultralytics import YOLO
-except ImportError:
-    YOLO = None
+from contextlib import contextmanager
+from app import backend  # drivers, GPIO and serial are imported on first use
+from app import gps_parser
+
+# picamera and ultralytics are heavy: imported on first camera/YOLO use
+_MISSING = object()
+PiCamera = _MISSING
+YOLO = _MISSING
+
+def _load_picamera():
+    global PiCamera
+    if PiCamera is _MISSING:
+        try:
+            from picamera import PiCamera as camera_class
+        except (ImportError, OSError):
+            camera_class = None
+        PiCamera = camera_class
+    return PiCamera
+
+def _load_yolo():
+    global YOLO
+    if YOLO is _MISSING:
+        try:
+            from ultralytics import YOLO as yolo_class
+        except ImportError:
+            yolo_class = None
+        YOLO = yolo_class
+    return YOLO
 
 # Global variables for hardware instances
 _i2c = None
-_tca = None
 _r_en1 = None
 _l_en1 = None
 _r_en2 = None
 _l_en2 = None
-_back_sensor = None
-_front_sensor = None
-_adc = None
+_hardware_initialized = False
 _temp_sensor_initialized = False
 
 # Constants for pH sensor
@@ -57,74 +60,80 @@ DO_Table = [
 READ_TEMP = 25
 
 # --- GPS Integration ---
-_gps_serial = None
-_gps_queue = queue.Queue()
+GPS_PORT = None  # None = the backend's port (/dev/ttyUSB0 on the Pi)
+GPS_BAUD = 115200
+GPS_CAPTURE_PATH = None  # set to a file path to record raw serial bytes for bench_gps.py
 _gps_thread = None
-_gps_latest = None
 _latest_gps = None
+_gps_seq = 0  # incremented on every published fix
+_gps_cond = threading.Condition()
+_gps_parser = None
 
 # Shared hardware resources
 _ads = None
 _ads_lock = threading.Lock()
-
-_temp_sensor_lock = threading.Lock()
+_i2c_init_lock = threading.Lock()
 
 RELAY_PIN = 26
 _pump_gpio_handle = None
 
+# Callbacks invoked from the GPS thread once per new fix
+_gps_listeners = []
+
+def add_gps_listener(callback):
+    """Register callback(fix) to be called from the GPS thread on every new fix."""
+    if callback not in _gps_listeners:
+        _gps_listeners.append(callback)
+
+def remove_gps_listener(callback):
+    if callback in _gps_listeners:
+        _gps_listeners.remove(callback)
+
+def _publish_gps(fix):
+    global _latest_gps, _gps_seq
+    with _gps_cond:
+        _latest_gps = fix
+        _gps_seq += 1
+        _gps_cond.notify_all()
+    for callback in list(_gps_listeners):
+        try:
+            callback(fix)
+        except Exception as e:
+            print(f"[WARN] GPS listener error: {e}")
+
+def _in_philippines(fix):
+    return 4.6431 <= fix['lat'] <= 21.1205 and 116.9549 <= fix['lng'] <= 126.5995
+
 def _gps_reader():
-    """Background thread to read GPS data from ESP32"""
-    global _latest_gps
-    current_data = {}
-    
+    """Background thread to read GPS data (ESP32 text blocks or NMEA) from the serial port"""
+    global _gps_parser
+    _gps_parser = gps_parser.GpsStreamParser()
+    capture = open(GPS_CAPTURE_PATH, 'ab') if GPS_CAPTURE_PATH else None
+
     while True:
+        ser = None
         try:
-            ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
+            ser = backend.serial.Serial(GPS_PORT or backend.gps_port(), GPS_BAUD, timeout=1)
             # print("[INFO] Connected to ESP32 GPS")
-            
+
             while True:
                 try:
-                    line = ser.readline().decode('utf-8').strip()
-                    if line:
-                        # print(f"[DEBUG] ESP32 says: {line}")
-                        if line.startswith("Latitude:"):
-                            try:
-                                lat = float(line.split("Latitude:")[1].strip())
-                                current_data['lat'] = lat
-                            except ValueError as e:
-                                # print(f"[ERROR] Failed to parse latitude: {e}")
-                                pass
-                        elif line.startswith("Longitude:"):
-                            try:
-                                lng = float(line.split("Longitude:")[1].strip())
-                                current_data['lng'] = lng
-                            except ValueError as e:
-                                # print(f"[ERROR] Failed to parse longitude: {e}")
-                                pass
-                        elif line.startswith("Date:"):
-                            current_data['date'] = line.split("Date:")[1].strip()
-                        elif line.startswith("Time:"):
-                            current_data['time'] = line.split("Time:")[1].strip()
-                        elif line.startswith("-----------------------"):
-                            if 'lat' in current_data and 'lng' in current_data:
-                                if 4.6431 <= current_data['lat'] <= 21.1205 and 116.9549 <= current_data['lng'] <= 126.5995:
-                                    _latest_gps = {
-                                        'lat': current_data['lat'],
-                                        'lng': current_data['lng'],
-                                        'date': current_data.get('date'),
-                                        'time': current_data.get('time'),
-                                        'raw': f"Lat: {current_data['lat']}, Lng: {current_data['lng']}, Date: {current_data.get('date')}, Time: {current_data.get('time')}",
-                                        'timestamp': datetime.datetime.now().isoformat()
-                                    }
-                                    # print(f"[INFO] GPS Update - Lat: {current_data['lat']}, Lng: {current_data['lng']}, Date: {current_data.get('date')}, Time: {current_data.get('time')}")
-                                else:
-                                    # print(f"[WARNING] GPS coordinates outside Philippines bounds: {current_data['lat']}, {current_data['lng']}")
-                                    pass
-                            current_data = {}
-                except serial.SerialException as e:
+                    # Block for the first byte, then take whatever else is already buffered
+                    data = ser.read(1)
+                    if data and ser.in_waiting:
+                        data += ser.read(ser.in_waiting)
+                except backend.serial.SerialException as e:
                     # print(f"[ERROR] GPS Serial read error: {e}")
                     break
-        except serial.SerialException as e:
+                if not data:
+                    continue
+                if capture:
+                    capture.write(data)
+                for fix in _gps_parser.feed(data):
+                    if _in_philippines(fix):
+                        _publish_gps(fix)
+                    # else: coordinates outside Philippines bounds, ignore
+        except backend.serial.SerialException as e:
             # print(f"[ERROR] GPS Serial connection failed: {e}")
             time.sleep(5)
         except Exception as e:
@@ -143,23 +152,10 @@ def start_gps_thread():
         _gps_thread.start()
 
 def parse_nmea(nmea):
-    # Minimal NMEA parser for GPRMC or GPGGA
-    try:
-        parts = nmea.split(',')
-        if nmea.startswith('$GPRMC') and parts[3] and parts[5]:
-            lat = float(parts[3][:2]) + float(parts[3][2:])/60.0
-            if parts[4] == 'S': lat = -lat
-            lng = float(parts[5][:3]) + float(parts[5][3:])/60.0
-            if parts[6] == 'W': lng = -lng
-            return {'lat': lat, 'lng': lng, 'raw': nmea}
-        elif nmea.startswith('$GPGGA') and parts[2] and parts[4]:
-            lat = float(parts[2][:2]) + float(parts[2][2:])/60.0
-            if parts[3] == 'S': lat = -lat
-            lng = float(parts[4][:3]) + float(parts[4][3:])/60.0
-            if parts[5] == 'W': lng = -lng
-            return {'lat': lat, 'lng': lng, 'raw': nmea}
-    except Exception:
-        pass
+    # Single-sentence NMEA parser (RMC/GGA/VTG, checksum verified when present)
+    fields = gps_parser.parse_nmea_fields(nmea)
+    if fields and fields.get('lat') is not None and fields.get('lng') is not None:
+        return {'lat': fields['lat'], 'lng': fields['lng'], 'fix_quality': fields.get('fix_quality'), 'raw': nmea}
     return {'lat': None, 'lng': None, 'raw': nmea}
 
 def get_latest_gps():
@@ -169,183 +165,455 @@ def get_latest_gps():
         return _latest_gps
     return {'lat': None, 'lng': None, 'date': None, 'time': None, 'raw': None}
 
+def get_gps_seq():
+    """Sequence number of the latest fix (pass to wait_for_gps_fix)."""
+    return _gps_seq
+
+def wait_for_gps_fix(after_seq=None, timeout=None):
+    """Block until a fix newer than ``after_seq`` arrives.
+
+    Returns (seq, fix), or (seq, None) on timeout. With after_seq=None waits
+    for the next fix from now.
+    """
+    start_gps_thread()
+    with _gps_cond:
+        if after_seq is None:
+            after_seq = _gps_seq
+        if not _gps_cond.wait_for(lambda: _gps_seq > after_seq, timeout):
+            return _gps_seq, None
+        return _gps_seq, _latest_gps
+
+def get_gps_stats():
+    return dict(_gps_parser.stats) if _gps_parser else {}
+
 # === Ultrasonic Sensor Readings ===
 def get_ultrasonic():
-    initialize_hardware()
-    try:
-        front = _front_sensor.distance if _front_sensor else None
-        back = _back_sensor.distance if _back_sensor else None
-        return {'front': front, 'back': back}
-    except Exception as e:
-        return {'front': None, 'back': None, 'error': str(e)}
+    """Latest median-filtered distances (m) from the ranging service (see ranging.py)."""
+    from app import ranging
+    readings = ranging.latest(timeout=1.0)
+    result = {side: reading['distance'] for side, reading in readings.items()}
+    errors = [f"{side}: {reading['error']}" for side, reading in readings.items() if reading['error']]
+    if errors:
+        result['error'] = '; '.join(errors)
+    return result
 
 # === Camera + YOLOv8 Object Detection ===
-_yolo_model = None
+CAMERA_RESOLUTION = (640, 480)
 _camera = None
 
 def get_camera():
     global _camera
-    if PiCamera is None:
+    if _load_picamera() is None:
         print("[INFO] PiCamera not available on this system.")
         return None
     if _camera is None:
         _camera = PiCamera()
+        _camera.resolution = CAMERA_RESOLUTION
     return _camera
 
-def run_yolo_inference():
-    global _yolo_model
-    if YOLO is None:
-        return {'error': 'YOLOv8 not installed'}
-    cam = get_camera()
-    if cam is None:
-        return {'error': 'PiCamera not available'}
-    if _yolo_model is None:
-        _yolo_model = YOLO('yolov8n.pt')  # Use nano model for speed
-    # Capture image to a temporary file
-    import tempfile
-    with tempfile.NamedTemporaryFile(suffix='.jpg') as tmp:
-        cam.capture(tmp.name)
-        results = _yolo_model(tmp.name)
-        # Return detected objects (labels and confidences)
-        objects = []
-        for r in results:
-            for box in r.boxes:
-                cls = int(box.cls[0])
-                conf = float(box.conf[0])
-                objects.append({'class': cls, 'confidence': conf})
-        return {'objects': objects}
+def yolo_available():
+    """Whether ultralytics is installed (imported on first call)."""
+    return _load_yolo() is not None
+
+def run_yolo_inference(max_age=0):
+    """Detections from the vision worker (see vision.py); waits for a fresh frame by default."""
+    from app import vision
+    return vision.get_detections(max_age=max_age)
 
 def initialize_hardware():
-    global _i2c, _tca, _r_en1, _l_en1, _r_en2, _l_en2, _back_sensor, _front_sensor, _adc, _temp_sensor_initialized
+    global _hardware_initialized, _r_en1, _l_en1, _r_en2, _l_en2, _temp_sensor_initialized
     
-    if _i2c is None:
+    if not _hardware_initialized:
+        _hardware_initialized = True
         # === Motor Enable Pins ===
-        _r_en1 = OutputDevice(17)
-        _l_en1 = OutputDevice(27)
-        _r_en2 = OutputDevice(23)
-        _l_en2 = OutputDevice(24)
+        _r_en1 = backend.OutputDevice(17)
+        _l_en1 = backend.OutputDevice(27)
+        _r_en2 = backend.OutputDevice(23)
+        _l_en2 = backend.OutputDevice(24)
 
         _r_en1.on()
         _l_en1.on()
         _r_en2.on()
         _l_en2.on()
 
-        # === I2C Setup ===
-        _i2c = busio.I2C(SCL, SDA)
-
-        # === TCA9548A Multiplexer Setup ===
-        _tca = TCA9548A(_i2c)
+        # === I2C + TCA9548A Multiplexer Setup ===
+        _get_i2c()
 
-        # === Ultrasonic Sensors ===
-        _back_sensor = DistanceSensor(echo=19, trigger=13, max_distance=4)
-        _front_sensor = DistanceSensor(echo=6, trigger=5, max_distance=4)
-
-        # === DO Sensor Setup ===
-        try:
-            _adc = Adafruit_ADS1x15.ADS1115(busnum=1)
-        except Exception as e:
-            print(f"[WARN] DO sensor not available: {e}")
-            _adc = None
+        # Ultrasonic sensors are owned by the ranging service (ranging.py)
 
         # === Temperature Sensor Setup ===
         try:
             if not _temp_sensor_initialized:
                 # Check if modules are already loaded
-                if not os.path.exists('/sys/bus/w1/devices'):
+                if not os.path.exists(backend.w1_devices_dir()):
                     print("[INFO] Temperature sensor modules not loaded, using default temperature")
                 else:
                     _temp_sensor_initialized = True
         except Exception as e:
             print(f"[WARN] Temperature sensor setup error: {e}")
 
+# === I2C Bus and ADS1115 Driver Layer ===
+# One shared bus, one long-lived ADS1115 handle per TCA9548A channel and one
+# cached AnalogIn per input, so a reading costs only the conversion itself.
+# The multiplexer selection is tracked so it is only rewritten when it changes.
+TCA_ADDRESS = 0x70
+_tca_selected = None  # channel currently selected on the TCA9548A (None = unknown)
+_mux_channels = {}
+ADS_TCA_CHANNEL = 1  # TCA9548A channel the ADS1115 is wired to
+ADS_FULL_SCALE_V = 4.096  # +/- range at the default gain of 1
+_ads_devices = {}
+_analog_inputs = {}
+_i2c_local = threading.local()
+i2c_stats = {'transactions': 0}
+_reading_stats = {}
+
+class CountingI2C:
+    """Wraps the busio bus and counts every I2C transaction."""
+    def __init__(self, bus):
+        self._bus = bus
+
+    def _count(self):
+        i2c_stats['transactions'] += 1
+        _i2c_local.count = getattr(_i2c_local, 'count', 0) + 1
+
+    def writeto(self, address, buffer, **kwargs):
+        self._count()
+        return self._bus.writeto(address, buffer, **kwargs)
+
+    def readfrom_into(self, address, buffer, **kwargs):
+        self._count()
+        return self._bus.readfrom_into(address, buffer, **kwargs)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, **kwargs):
+        self._count()
+        return self._bus.writeto_then_readfrom(address, buffer_out, buffer_in, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._bus, name)
+
+def _get_i2c():
+    global _i2c
+    with _i2c_init_lock:
+        if _i2c is None:
+            _i2c = CountingI2C(backend.I2C())
+    return _i2c
+
+def _lock_bus(bus):
+    while not bus.try_lock():
+        time.sleep(0)
+
+def _ensure_tca_channel(channel):
+    """Select a TCA9548A channel unless it already is. Caller must hold the bus lock."""
+    global _tca_selected
+    if _tca_selected == channel:
+        return
+    _tca_selected = None  # unknown until the write succeeds
+    _i2c.writeto(TCA_ADDRESS, bytes([1 << channel]))
+    _tca_selected = channel
+
+class MuxChannel:
+    """I2C bus view behind one TCA9548A channel (drop-in for busio.I2C).
+
+    Unlike adafruit_tca9548a's channel object it only writes the multiplexer
+    when a different channel was selected last.
+    """
+    def __init__(self, bus, channel):
+        self._bus = bus
+        self.channel = channel
+
+    def try_lock(self):
+        if not self._bus.try_lock():
+            return False
+        try:
+            _ensure_tca_channel(self.channel)
+        except Exception:
+            self._bus.unlock()
+            raise
+        return True
+
+    def unlock(self):
+        self._bus.unlock()
+
+    def writeto(self, address, buffer, **kwargs):
+        return self._bus.writeto(address, buffer, **kwargs)
+
+    def readfrom_into(self, address, buffer, **kwargs):
+        return self._bus.readfrom_into(address, buffer, **kwargs)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, **kwargs):
+        return self._bus.writeto_then_readfrom(address, buffer_out, buffer_in, **kwargs)
+
+    def scan(self):
+        return [addr for addr in self._bus.scan() if addr != TCA_ADDRESS]
+
+def get_mux_channel(channel):
+    mux = _mux_channels.get(channel)
+    if mux is None:
+        mux = MuxChannel(_get_i2c(), channel)
+        _mux_channels[channel] = mux
+    return mux
+
+def get_ads(tca_channel=ADS_TCA_CHANNEL):
+    """Long-lived ADS1115 handle behind the given TCA9548A channel."""
+    ads = _ads_devices.get(tca_channel)
+    if ads is None:
+        _get_i2c()
+        ads = backend.ADS.ADS1115(get_mux_channel(tca_channel))
+        _ads_devices[tca_channel] = ads
+    return ads
+
+def get_analog_in(pin, tca_channel=ADS_TCA_CHANNEL):
+    """Cached AnalogIn for an ADS1115 input (0-3 = P0-P3)."""
+    key = (tca_channel, pin)
+    chan = _analog_inputs.get(key)
+    if chan is None:
+        chan = backend.AnalogIn(get_ads(tca_channel), pin)
+        _analog_inputs[key] = chan
+    return chan
+
+@contextmanager
+def counted_reading(name):
+    """Record how many I2C transactions the enclosed reading of ``name`` took."""
+    start = getattr(_i2c_local, 'count', 0)
+    try:
+        yield
+    finally:
+        used = getattr(_i2c_local, 'count', 0) - start
+        stats = _reading_stats.setdefault(name, {'reads': 0, 'transactions': 0, 'last': 0})
+        stats['reads'] += 1
+        stats['transactions'] += used
+        stats['last'] = used
+
+def get_i2c_stats():
+    """Total bus transactions plus per-reading transaction counts."""
+    readings = {}
+    for name, stats in _reading_stats.items():
+        readings[name] = dict(stats, per_read=stats['transactions'] / stats['reads'] if stats['reads'] else 0)
+    return {'transactions': i2c_stats['transactions'], 'readings': readings, 'pwm': dict(pwm_stats)}
+
 def select_tca_channel(channel):
-    if _i2c is None:
-        initialize_hardware()
-    _i2c.writeto(0x70, bytes([1 << channel]))
+    bus = _get_i2c()
+    _lock_bus(bus)
+    try:
+        _ensure_tca_channel(channel)
+    finally:
+        bus.unlock()
 
 # === PCA9685 Setup ===
-def setup_pca9685(channel, frequency=1000):
-    if _i2c is None:
-        initialize_hardware()
-    select_tca_channel(channel)
-    pca = PCA9685(_i2c)
+# One PCA9685 object per multiplexer channel, created once. The prescaler is
+# only reprogrammed (a sleep/restart cycle on the chip) when it actually changes.
+PCA_REFERENCE_CLOCK = 25000000
+_pca_devices = {}
+_pca_prescale = {}
+_pca_lock = threading.Lock()
+
+def _prescale_for(frequency):
+    return int(PCA_REFERENCE_CLOCK / 4096.0 / frequency + 0.5)
+
+def _pca_channel_of(pca):
+    for channel, device in _pca_devices.items():
+        if device is pca:
+            return channel
+    return None
+
+def set_pca_frequency(pca, frequency):
+    """Set the PWM frequency, skipping the I2C writes if the prescaler is unchanged."""
+    channel = _pca_channel_of(pca)
+    prescale = _prescale_for(frequency)
+    if channel is not None and _pca_prescale.get(channel) == prescale:
+        return
     pca.frequency = frequency
+    if channel is not None:
+        _pca_prescale[channel] = prescale
+
+def get_pca9685(channel, frequency=None):
+    """Cached PCA9685 behind the given TCA9548A channel."""
+    with _pca_lock:
+        pca = _pca_devices.get(channel)
+        if pca is None:
+            pca = backend.PCA9685(get_mux_channel(channel))
+            _pca_devices[channel] = pca
+            _pca_prescale[channel] = None
+    if frequency is not None:
+        set_pca_frequency(pca, frequency)
     return pca
 
+def release_pca9685(pca):
+    """Reset and forget a PCA9685 (the next get_pca9685 re-creates it)."""
+    channel = _pca_channel_of(pca)
+    with _pca_lock:
+        if channel is not None:
+            del _pca_devices[channel]
+            _pca_prescale.pop(channel, None)
+    forget_pwm_state(pca)
+    pca.deinit()
+
+def setup_pca9685(channel, frequency=1000):
+    initialize_hardware()
+    return get_pca9685(channel, frequency)
+
 # === PWM Control ===
+# A shadow copy of the 16 LEDn_ON/OFF register pairs is kept per PCA9685 so a
+# command only sends the channels whose duty actually changed, and changed
+# channels close together go out as one auto-increment burst. All four wheel
+# channels therefore switch in the same I2C transaction.
+PCA_MODE1 = 0x00
+PCA_MODE1_AI = 0x20
+PCA_LED0_ON_L = 0x06
+PWM_BURST_MAX_GAP = 3  # unchanged channels worth rewriting to avoid a second transaction
+_pwm_shadow = {}
+_pwm_lock = threading.RLock()
+pwm_stats = {'commands': 0, 'bursts': 0, 'channels_written': 0, 'channels_skipped': 0}
+
+def _duty_to_regs(duty):
+    """16-bit duty cycle -> (ON, OFF) counts, matching adafruit_pca9685."""
+    duty = int(duty)
+    if not 0 <= duty <= 0xFFFF:
+        raise ValueError(f"Out of range: duty cycle {duty}")
+    if duty == 0xFFFF:
+        return (0x1000, 0)        # fully on
+    if duty >> 4 == 0:
+        return (0, 0x1000)        # fully off
+    return (0, duty >> 4)
+
+def _changed_runs(changed, regs):
+    """Group sorted channel numbers into [first, last] runs.
+
+    Small gaps are bridged by rewriting the unchanged channels in between,
+    but only when their register contents are known.
+    """
+    runs = []
+    for ch in changed:
+        if (runs and ch - runs[-1][1] - 1 <= PWM_BURST_MAX_GAP
+                and all(regs[gap] is not None for gap in range(runs[-1][1] + 1, ch))):
+            runs[-1][1] = ch
+        else:
+            runs.append([ch, ch])
+    return runs
+
+def write_pwm(pca, duties):
+    """Set several channels at once: ``duties`` maps channel -> 16-bit duty cycle."""
+    with _pwm_lock:
+        shadow = _pwm_shadow.get(pca)
+        if shadow is None:
+            # Unknown register contents: make sure auto-increment is on, write everything once
+            pca.mode1 = pca.mode1 | PCA_MODE1_AI
+            shadow = _pwm_shadow[pca] = [None] * 16
+        wanted = list(shadow)
+        for ch, duty in duties.items():
+            wanted[ch] = _duty_to_regs(duty)
+        changed = sorted(ch for ch in duties if wanted[ch] != shadow[ch])
+        pwm_stats['commands'] += 1
+        pwm_stats['channels_skipped'] += len(duties) - len(changed)
+        for first, last in _changed_runs(changed, wanted):
+            buf = bytearray([PCA_LED0_ON_L + 4 * first])
+            for ch in range(first, last + 1):
+                on, off = wanted[ch]
+                buf += bytes([on & 0xFF, on >> 8, off & 0xFF, off >> 8])
+            try:
+                with pca.i2c_device as i2c:
+                    i2c.write(buf)
+            except Exception:
+                for ch in range(first, last + 1):
+                    shadow[ch] = None
+                raise
+            shadow[first:last + 1] = wanted[first:last + 1]
+            pwm_stats['bursts'] += 1
+            pwm_stats['channels_written'] += last - first + 1
+
+def forget_pwm_state(pca):
+    """Drop the shadow registers (e.g. after the chip was reset)."""
+    with _pwm_lock:
+        _pwm_shadow.pop(pca, None)
+
 def set_pwm(pca, channel, duty):
-    pca.channels[channel].duty_cycle = duty
+    write_pwm(pca, {channel: duty})
 
 def move_forward(pca, pwm):
-    set_pwm(pca, 0, pwm)  # Left backward
-    set_pwm(pca, 1, 0)    # Left forward off
-    set_pwm(pca, 2, 0)    # Right forward off
-    set_pwm(pca, 3, pwm)  # Right backward
+    write_pwm(pca, {0: pwm,   # Left backward
+                    1: 0,     # Left forward off
+                    2: 0,     # Right forward off
+                    3: pwm})  # Right backward
 
 def move_backward(pca, pwm):
-    set_pwm(pca, 0, 0)    # Left backward off
-    set_pwm(pca, 1, pwm)  # Left forward
-    set_pwm(pca, 2, pwm)  # Right forward
-    set_pwm(pca, 3, 0)    # Right backward off
+    write_pwm(pca, {0: 0,     # Left backward off
+                    1: pwm,   # Left forward
+                    2: pwm,   # Right forward
+                    3: 0})    # Right backward off
 
 def stop_motors(pca):
-    for ch in range(4):
-        set_pwm(pca, ch, 0)
+    write_pwm(pca, {ch: 0 for ch in range(4)})
 
 def rotate_left(pca, pwm):
-    set_pwm(pca, 0, pwm)  # Left backward
-    set_pwm(pca, 1, 0)
-    set_pwm(pca, 2, pwm)  # Right forward
-    set_pwm(pca, 3, 0)
+    write_pwm(pca, {0: pwm,   # Left backward
+                    1: 0,
+                    2: pwm,   # Right forward
+                    3: 0})
 
 def rotate_right(pca, pwm):
-    set_pwm(pca, 0, 0)
-    set_pwm(pca, 1, pwm)  # Left forward
-    set_pwm(pca, 2, 0)
-    set_pwm(pca, 3, pwm)  # Right backward
+    write_pwm(pca, {0: 0,
+                    1: pwm,   # Left forward
+                    2: 0,
+                    3: pwm})  # Right backward
 
 def move_northwest(pca, pwm):
-    set_pwm(pca, 0, int(pwm / 4))  # Left backward low
-    set_pwm(pca, 1, 0)
-    set_pwm(pca, 2, 0)
-    set_pwm(pca, 3, pwm)           # Right backward
+    write_pwm(pca, {0: int(pwm / 4),  # Left backward low
+                    1: 0,
+                    2: 0,
+                    3: pwm})          # Right backward
 
 def move_northeast(pca, pwm):
-    set_pwm(pca, 0, pwm)           # Left backward
-    set_pwm(pca, 1, 0)
-    set_pwm(pca, 2, 0)
-    set_pwm(pca, 3, int(pwm / 4))  # Right backward low
+    write_pwm(pca, {0: pwm,           # Left backward
+                    1: 0,
+                    2: 0,
+                    3: int(pwm / 4)})  # Right backward low
 
 def move_southwest(pca, pwm):
-    set_pwm(pca, 0, 0)
-    set_pwm(pca, 1, int(pwm / 4))  # Left forward low
-    set_pwm(pca, 2, pwm)           # Right forward
-    set_pwm(pca, 3, 0)
+    write_pwm(pca, {0: 0,
+                    1: int(pwm / 4),  # Left forward low
+                    2: pwm,           # Right forward
+                    3: 0})
 
 def move_southeast(pca, pwm):
-    set_pwm(pca, 0, 0)
-    set_pwm(pca, 1, pwm)           # Left forward
-    set_pwm(pca, 2, int(pwm / 4))  # Right forward low
-    set_pwm(pca, 3, 0)
+    write_pwm(pca, {0: 0,
+                    1: pwm,            # Left forward
+                    2: int(pwm / 4),   # Right forward low
+                    3: 0})
+
+def wheel_directions(pca):
+    """(left, right) drive direction from the PWM shadow: 1 forward, -1 reverse, 0 stopped or unknown."""
+    with _pwm_lock:
+        shadow = list(_pwm_shadow.get(pca) or [None] * 16)
+    driving = lambda ch: shadow[ch] is not None and shadow[ch] != (0, 0x1000)
+    # Same mapping as set_wheel_speeds: 3/2 drive the left side forward/back, 0/1 the right
+    return driving(3) - driving(2), driving(0) - driving(1)
+
+WHEEL_PWM_QUANTUM = 1024  # speed changes smaller than this are not sent to the motors
+
+def set_wheel_speeds(pca, left, right, max_pwm=65535):
+    """Differential drive: ``left``/``right`` in [-1, 1] (negative = reverse), both sides in one burst."""
+    def duty(speed):
+        speed = max(-1.0, min(speed, 1.0))
+        return int(abs(speed) * max_pwm) // WHEEL_PWM_QUANTUM * WHEEL_PWM_QUANTUM
+    left_duty, right_duty = duty(left), duty(right)
+    # Same channel mapping as move_forward/move_backward/rotate_right: forward
+    # is 0+3, reverse 1+2, and a right turn (left wheels forward, right wheels
+    # back) is rotate_right's 1+3, so 0/1 drive the right side and 2/3 the left.
+    write_pwm(pca, {0: right_duty if right > 0 else 0,  # Right forward drive
+                    1: right_duty if right < 0 else 0,  # Right reverse drive
+                    2: left_duty if left < 0 else 0,    # Left reverse drive
+                    3: left_duty if left > 0 else 0})   # Left forward drive
 
 # === pH Sensor ===
 def read_ph():
-    from adafruit_ads1x15.analog_in import AnalogIn
-    initialize_ads()
-    with _ads_lock:
-        channel = AnalogIn(_ads, 2)  # ADS.P2
-        voltage = channel.voltage
+    with _ads_lock, counted_reading('ph'):
+        voltage = get_analog_in(2).voltage  # ADS.P2
         pH_Value = (voltage - 2.5) * 3.5 + 7.0
         return {'ph': pH_Value, 'voltage': voltage}
 
 # === DO Sensor ===
 def read_do(offset=0):
-    import smbus
-    import Adafruit_ADS1x15
-    TCA_ADDRESS = 0x70
-    TCA_CHANNEL = 1
     ADS_CHANNEL = 1  # A1/P1
-    GAIN = 1
     VREF = 5000
     ADC_RES = 32767
 
@@ -354,13 +622,9 @@ def read_do(offset=0):
     MAX_VOLTAGE_DO = 2000  # mV at 2.6%
 
     try:
-        i2c_bus = smbus.SMBus(1)
-        adc = Adafruit_ADS1x15.ADS1115(busnum=1)
-
-        # Re-select TCA channel 1 before each read
-        i2c_bus.write_byte(TCA_ADDRESS, 1 << TCA_CHANNEL)
-
-        raw = adc.read_adc(ADS_CHANNEL, gain=GAIN)
+        # Same ADS1115 (gain 1) as the other water sensors, via the shared handle
+        with _ads_lock, counted_reading('do'):
+            raw = get_analog_in(ADS_CHANNEL).value
         voltage = (raw / ADC_RES) * VREF  # Convert to millivolts
 
         # Map voltage to % DO
@@ -372,8 +636,9 @@ def read_do(offset=0):
             do_percent = 0.5 + (voltage - MIN_VOLTAGE_DO) * (2.6 - 0.5) / (MAX_VOLTAGE_DO - MIN_VOLTAGE_DO)
         do_percent += offset
 
-        print(f"[DEBUG] DO P1 -> Raw ADC: {raw} | Voltage: {voltage:.2f} mV | DO: {do_percent:.2f}%")
-        return {'do': do_percent, 'voltage': voltage, 'raw': raw}
+        # Temperature compensation reference from the cached probe reading (no conversion wait)
+        saturation, temp_c = do_saturation()
+        return {'do': do_percent, 'voltage': voltage, 'raw': raw, 'temp': temp_c, 'saturation': saturation}
     except OSError as e:
         print("[ERROR] I2C communication error. Check wiring and channel selection.")
         print(e)
@@ -383,14 +648,9 @@ def read_do(offset=0):
         return {'do': None, 'voltage': None, 'error': str(e)}
 
 # === Turbidity Sensor ===
-latest_turbidity = None
-
 def read_turbidity():
-    from adafruit_ads1x15.analog_in import AnalogIn
-    initialize_ads()
-    with _ads_lock:
-        channel = AnalogIn(_ads, 0)  # ADS.P0
-        voltage = channel.voltage * 1000  # Convert V to mV
+    with _ads_lock, counted_reading('turbidity'):
+        voltage = get_analog_in(0).voltage * 1000  # ADS.P0, convert V to mV
         # Calibration range (example)
         MIN_VOLTAGE_TURBIDITY = 300   # mV → 0.29 NTU
         MAX_VOLTAGE_TURBIDITY = 4300  # mV → 731.00 NTU
@@ -403,54 +663,45 @@ def read_turbidity():
         return {'ntu': round(turbidity, 2), 'voltage': voltage}
 
 def turbidity_reader():
-    global latest_turbidity
-    while True:
-        try:
-            result = read_turbidity()
-            latest_turbidity = result['ntu']
-            print(f"[DEBUG] Turbidity Voltage: {result['voltage']:.2f} mV | NTU: {latest_turbidity}")
-        except Exception as e:
-            latest_turbidity = None
-            print(f"Error reading turbidity: {str(e)}")
-        import time; time.sleep(1)
+    """Kept for compatibility: turbidity is now sampled by the acquisition service."""
+    start_acquisition()
 
 def start_turbidity_thread():
-    if not hasattr(start_turbidity_thread, "started"):
-        threading.Thread(target=turbidity_reader, daemon=True).start()
-        start_turbidity_thread.started = True
+    start_acquisition()
 
 def get_latest_turbidity():
-    start_turbidity_thread()
-    return latest_turbidity
+    start_acquisition()
+    entry = get_sensor_snapshot('turbidity')
+    value = entry['value']
+    return value['ntu'] if value else None
 
 # === Temperature Sensor ===
-def read_temp():
-    try:
-        with _temp_sensor_lock:
-            device_folders = glob.glob('/sys/bus/w1/devices/28*')
-            if not device_folders:
-                return {'temp': None, 'error': 'No sensor found'}
-            device_file = device_folders[0] + '/w1_slave'
-            with open(device_file, 'r') as f:
-                lines = f.readlines()
-            if len(lines) < 2 or 'YES' not in lines[0]:
-                return {'temp': None, 'error': 'Invalid sensor response'}
-            temp_output = lines[1].find('t=')
-            if temp_output == -1:
-                return {'temp': None, 'error': 'Temperature data not found'}
-            temp_string = lines[1][temp_output+2:]
-            temp_c = float(temp_string) / 1000.0
-            if -55 <= temp_c <= 125:
-                return {'temp': temp_c}
-            else:
-                return {'temp': None, 'error': 'Temperature out of valid range'}
-    except Exception as e:
-        return {'temp': None, 'error': str(e)}
+TEMP_MAX_AGE_S = 15.0
+
+def read_temp(max_age=TEMP_MAX_AGE_S, timeout=None):
+    """Primary DS18B20 reading from the w1temp cache (refreshed in the background).
+
+    Waits up to ``timeout`` for a reading at most ``max_age`` seconds old.
+    """
+    from app import w1temp
+    reading = w1temp.latest(max_age=max_age, timeout=timeout)
+    if reading['temp'] is None or reading['age'] is None or reading['age'] > max_age:
+        return {'temp': None, 'error': reading['error'] or 'Temperature reading is stale'}
+    return {'temp': reading['temp'], 'probe': reading['probe'], 'age': reading['age']}
+
+def do_saturation(temp_c=None):
+    """Saturated DO (mg/L) at ``temp_c`` from DO_Table; defaults to the cached water temperature."""
+    if temp_c is None:
+        temp_c = read_temp(timeout=0).get('temp')
+    if temp_c is None:
+        temp_c = READ_TEMP
+    index = max(0, min(len(DO_Table) - 1, int(round(temp_c))))
+    return DO_Table[index] / 1000.0, temp_c
 
 # === Cleanup Function ===
 def cleanup(pca):
     stop_motors(pca)
-    pca.deinit()
+    release_pca9685(pca)
     if _r_en1: _r_en1.off()
     if _l_en1: _l_en1.off()
     if _r_en2: _r_en2.off()
@@ -458,36 +709,204 @@ def cleanup(pca):
 
 # Initialize I2C, TCA9548A, and ADS1115 only once
 def initialize_ads():
-    global _i2c, _tca, _ads
-    if _i2c is None or _tca is None or _ads is None:
-        import board, busio
-        import adafruit_ads1x15.ads1115 as ADS
-        from adafruit_tca9548a import TCA9548A
-        _i2c = busio.I2C(board.SCL, board.SDA)
-        _tca = TCA9548A(_i2c)
-        ads_i2c = _tca[1]
-        _ads = ADS.ADS1115(ads_i2c)
-
-# Helper to select multiplexer channel
+    global _ads
+    _ads = get_ads()
+
+# Helper to get an ADS1115 input on the multiplexer channel
 def select_ads_channel(channel):
     initialize_ads()
-    with _ads_lock:
-        # Select channel 1 on the TCA9548A (where ADS1115 is connected)
-        ads_i2c = _tca[1]
-        # Re-initialize ADS1115 for each read to ensure correct channel
-        from adafruit_ads1x15 import ads1115 as ADS
-        _ads = ADS.ADS1115(ads_i2c)
-        from adafruit_ads1x15.analog_in import AnalogIn
-        return AnalogIn(_ads, channel)
+    return get_analog_in(channel)
 
 # Water Level (A3)
 def read_water_level():
-    from adafruit_ads1x15.analog_in import AnalogIn
-    initialize_ads()
-    with _ads_lock:
-        channel = AnalogIn(_ads, 3)  # ADS.P3
-        voltage = channel.voltage
-        return channel.value, voltage
+    with _ads_lock, counted_reading('water_level'):
+        raw = get_analog_in(3).value  # ADS.P3
+    # One conversion: derive the voltage from the raw count instead of reading twice
+    return raw, raw * ADS_FULL_SCALE_V / 32767
+
+def _read_water_level_sample():
+    raw, voltage = read_water_level()
+    return {'raw': raw, 'voltage': voltage}
+
+# === Sensor Acquisition Service ===
+# Every sensor is sampled in the background on its own schedule and the latest
+# value is kept in memory, so HTTP handlers and the scheduler read snapshots
+# instead of touching the bus. Sensors on the same bus share one worker thread
+# so I2C reads stay serialized; the slow 1-Wire conversion runs on its own.
+ACQUISITION_SCHEDULE = {
+    # name: bus group, sample interval (s), age (s) after which the value is stale
+    'ph': {'bus': 'i2c', 'interval': 1.0, 'stale_after': 5.0},
+    'do': {'bus': 'i2c', 'interval': 1.0, 'stale_after': 5.0},
+    'turbidity': {'bus': 'i2c', 'interval': 1.0, 'stale_after': 5.0},
+    'water_level': {'bus': 'i2c', 'interval': 1.0, 'stale_after': 5.0},
+    'temp': {'bus': 'w1', 'interval': 5.0, 'stale_after': 20.0},
+}
+
+SENSOR_READERS = {
+    'ph': read_ph,
+    'do': read_do,
+    'turbidity': read_turbidity,
+    'water_level': _read_water_level_sample,
+    'temp': read_temp,
+}
+
+_sensor_store = {}
+_sensor_store_cond = threading.Condition()
+_acquisition_threads = {}
+
+def _store_sample(name, value, error):
+    with _sensor_store_cond:
+        entry = _sensor_store.setdefault(name, {'value': None, 'timestamp': None, 'monotonic': None,
+                                                'attempted': None, 'error': None})
+        entry['attempted'] = time.monotonic()
+        if error is None:
+            entry['value'] = value
+            entry['timestamp'] = datetime.datetime.now().isoformat()
+            entry['monotonic'] = time.monotonic()
+        entry['error'] = error
+        _sensor_store_cond.notify_all()
+
+def _sample_sensor(name):
+    try:
+        value = SENSOR_READERS[name]()
+    except Exception as e:
+        _store_sample(name, None, str(e))
+        return
+    # Some readers report failures in-band instead of raising
+    if isinstance(value, dict) and value.get('error'):
+        _store_sample(name, None, value['error'])
+    else:
+        _store_sample(name, value, None)
+
+def _acquisition_loop(bus):
+    next_due = {name: time.monotonic() for name, cfg in ACQUISITION_SCHEDULE.items() if cfg['bus'] == bus}
+    while True:
+        name = min(next_due, key=next_due.get)
+        delay = next_due[name] - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        _sample_sensor(name)
+        next_due[name] = max(next_due[name] + ACQUISITION_SCHEDULE[name]['interval'], time.monotonic())
+
+def start_acquisition():
+    """Start the background sampling threads (idempotent)."""
+    for bus in {cfg['bus'] for cfg in ACQUISITION_SCHEDULE.values()}:
+        thread = _acquisition_threads.get(bus)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_acquisition_loop, args=(bus,), daemon=True)
+            _acquisition_threads[bus] = thread
+            thread.start()
+
+def _snapshot_entry(name, now):
+    entry = _sensor_store.get(name)
+    if entry is None or entry['monotonic'] is None:
+        return {'value': None, 'timestamp': None, 'age': None, 'stale': True,
+                'error': entry['error'] if entry else 'No reading yet'}
+    age = now - entry['monotonic']
+    return {'value': entry['value'], 'timestamp': entry['timestamp'], 'age': age,
+            'stale': age > ACQUISITION_SCHEDULE[name]['stale_after'], 'error': entry['error']}
+
+def get_sensor_snapshot(name=None):
+    """Latest value(s) with timestamp, age and staleness flag. Never touches the bus."""
+    now = time.monotonic()
+    with _sensor_store_cond:
+        if name is not None:
+            return _snapshot_entry(name, now)
+        return {n: _snapshot_entry(n, now) for n in ACQUISITION_SCHEDULE}
+
+def wait_for_sensors(since=None, timeout=10.0, names=None):
+    """Block until every sensor has been sampled after ``since`` (time.monotonic()).
+
+    Returns the snapshot; sensors that failed or did not refresh in time are
+    reported with their error/stale flag.
+    """
+    start_acquisition()
+    since = time.monotonic() if since is None else since
+    names = list(names or ACQUISITION_SCHEDULE)
+    deadline = time.monotonic() + timeout
+
+    def sampled_since(name):
+        entry = _sensor_store.get(name)
+        return entry is not None and entry['attempted'] >= since
+
+    with _sensor_store_cond:
+        while not all(sampled_since(n) for n in names):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            _sensor_store_cond.wait(remaining)
+    return get_sensor_snapshot()
+
+# === Concurrent Sensor Sweep ===
+# One on-demand reading of every sensor for a sampling run. Each bus has its
+# own single-thread worker, so the DS18B20 conversion (~750 ms) and the
+# ultrasonic echo timing overlap with the ADC reads, which stay serialized on
+# the I2C worker and under _ads_lock against the acquisition thread. A sweep
+# therefore takes about as long as its slowest bus instead of the sum.
+SWEEP_SENSORS = {
+    # name: bus worker, timeout (s) counted from the start of the sweep
+    'ph': {'bus': 'i2c', 'timeout': 2.0},
+    'do': {'bus': 'i2c', 'timeout': 2.0},
+    'turbidity': {'bus': 'i2c', 'timeout': 2.0},
+    'water_level': {'bus': 'i2c', 'timeout': 2.0},
+    'temp': {'bus': 'w1', 'timeout': 2.0},
+    'ultrasonic': {'bus': 'gpio', 'timeout': 1.0},
+}
+SWEEP_DEFAULT = ('ph', 'do', 'turbidity', 'water_level', 'temp')
+
+_sweep_executors = {}
+_sweep_executors_lock = threading.Lock()
+sweep_stats = {'sweeps': 0, 'timeouts': 0, 'errors': 0, 'last_duration_s': None}
+
+def _sweep_executor(bus):
+    with _sweep_executors_lock:
+        executor = _sweep_executors.get(bus)
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'sweep-{bus}')
+            _sweep_executors[bus] = executor
+        return executor
+
+def _sweep_read(name):
+    start = time.monotonic()
+    reader = get_ultrasonic if name == 'ultrasonic' else SENSOR_READERS[name]
+    try:
+        value = reader()
+        error = value.get('error') if isinstance(value, dict) else None
+    except Exception as e:
+        value, error = None, str(e)
+    if name in ACQUISITION_SCHEDULE:
+        # Share the fresh reading with snapshot readers
+        _store_sample(name, None if error else value, error)
+    return value, error, time.monotonic() - start
+
+def sweep_sensors(names=None, timeouts=None):
+    """Read ``names`` (default SWEEP_DEFAULT) now, independent buses in parallel.
+
+    Returns {'timestamp', 'duration_s', 'sensors': {name: entry}} where each
+    entry has the same value/timestamp/stale/error keys as a snapshot entry,
+    plus 'elapsed' (s). A sensor that misses its timeout is reported with
+    error 'timeout'; its read finishes in the background.
+    """
+    names = list(names or SWEEP_DEFAULT)
+    timeouts = dict(timeouts or {})
+    start = time.monotonic()
+    futures = {name: _sweep_executor(SWEEP_SENSORS[name]['bus']).submit(_sweep_read, name) for name in names}
+    sensors = {}
+    for name, future in futures.items():
+        deadline = start + timeouts.get(name, SWEEP_SENSORS[name]['timeout'])
+        try:
+            value, error, elapsed = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            value, error, elapsed = None, 'timeout', time.monotonic() - start
+            sweep_stats['timeouts'] += 1
+        if error:
+            sweep_stats['errors'] += 1
+        sensors[name] = {'value': None if error else value, 'timestamp': datetime.datetime.now().isoformat(),
+                         'stale': error is not None, 'error': error, 'elapsed': elapsed}
+    duration = time.monotonic() - start
+    sweep_stats['sweeps'] += 1
+    sweep_stats['last_duration_s'] = duration
+    return {'timestamp': datetime.datetime.now().isoformat(), 'duration_s': duration, 'sensors': sensors}
 
 # === Servo Arm Control ===
 servo_config = {
@@ -504,34 +923,30 @@ def angle_to_pwm(angle):
 def set_servo_angle(pca, channel, angle):
     cfg = servo_config[channel]
     clamped = max(cfg["min"], min(angle, cfg["max"]))
-    pca.channels[channel].duty_cycle = angle_to_pwm(clamped)
+    set_pwm(pca, channel, angle_to_pwm(clamped))
+    current_angles[channel] = clamped
     return clamped
 
 # Track current angles for all channels
 current_angles = {9: servo_config[9]["init"], 10: servo_config[10]["init"], 11: servo_config[11]["init"]}
 
-def smooth_move(pca, channel, target, delay):
-    global current_angles
-    current = current_angles[channel]
-    step = 1 if target > current else -1
-    for angle in range(current, target + step, step):
-        set_servo_angle(pca, channel, angle)
-        time.sleep(delay)
-    current_angles[channel] = target
-    return target
-
-def move_channels(pca, targets):
-    threads = []
-    for ch in targets:
-        t = threading.Thread(target=smooth_move, args=(pca, ch, targets[ch], servo_config[ch]["delay"]))
-        threads.append(t)
-        t.start()
-    for t in threads:
-        t.join()
+def smooth_move(pca, channel, target, delay=None, session=None):
+    """Move one servo along a planned trajectory (see motion.py).
+
+    ``delay`` keeps the old meaning of seconds per degree at full speed.
+    With an actuators ``session`` the move goes through the actuator arbiter.
+    """
+    from app import motion
+    speed = {channel: 1.0 / delay} if delay else None
+    return motion.move(pca, {channel: target}, speed=speed, session=session)[channel]
+
+def move_channels(pca, targets, session=None):
+    """Move several servos together, all arriving at the same time."""
+    from app import motion
+    return motion.move(pca, targets, session=session)
 
 def reset_all_channels(pca):
-    for ch in range(16):
-        pca.channels[ch].duty_cycle = 0
+    write_pwm(pca, {ch: 0 for ch in range(16)})
 
 # === Utility Patterns for Servo and DC Motor Control ===
 def reset_all_servos(pca):
@@ -541,7 +956,7 @@ def reset_all_servos(pca):
 
 def set_servo_freq(pca, freq):
     """Set the PWM frequency for the servo controller."""
-    pca.frequency = freq
+    set_pca_frequency(pca, freq)
 
 def move_servo(pca, channel, angle):
     """Move a servo to a specific angle."""
@@ -559,7 +974,7 @@ def reset_all_motors(pca):
 
 def set_motor_freq(pca, freq):
     """Set the PWM frequency for the DC motor controller."""
-    pca.frequency = freq
+    set_pca_frequency(pca, freq)
 
 def move_dc_motor(pca, direction, pwm):
     """Move the DC motor in a direction with a given PWM value.
@@ -618,73 +1033,69 @@ def move_channels_9_10_11(pca, targets):
         smooth_move(pca, 11, targets[11], servo_config[11]["delay"])
 
 def perform_object_sequence(object_name):
-    pca = setup_pca9685(channel=0, frequency=50)
-    # Step 1: Reset all servos to rest
-    move_channels_9_10_11(pca, init_position)
-    time.sleep(0.5)
-    # Step 2: Set frequency (already set above)
-    set_servo_freq(pca, 50)
-    # Step 3: Move to straight position
-    move_channels(pca, straight_position)
-    time.sleep(0.5)
-    # Step 4: Move to object position
-    if object_name in object_positions:
-        move_channels_11_then_10(pca, object_positions[object_name])
-    else:
+    """Play the object's arm routine (see arm_sequences.py) and wait for it to finish."""
+    from app import actuators, arm_sequences
+    try:
+        job = arm_sequences.submit(object_name)
+    except (KeyError, ValueError):
         print(f"Unknown object: {object_name}")
-        pca.deinit()
-        return
-    # Step 5: Hold
-    time.sleep(2)
-    # Step 6: Return to straight
-    move_channels(pca, straight_position)
-    time.sleep(0.5)
-    # Step 7: Return to rest
-    move_channels_9_10_11(pca, rest_position)
-    time.sleep(0.5)
-    reset_all_channels(pca)  # Reset all 16 channels to 0 (servos will lose holding torque)
-    pca.deinit()
+        actuators.call(reset_all_channels, 'servos', 'arm')
+        return None
+    return arm_sequences.wait(job['id'])
 
 def init_pump_gpio():
     global _pump_gpio_handle
     if _pump_gpio_handle is None:
-        _pump_gpio_handle = lgpio.gpiochip_open(0)
-        lgpio.gpio_claim_output(_pump_gpio_handle, RELAY_PIN)
-        lgpio.gpio_write(_pump_gpio_handle, RELAY_PIN, 1)  # Ensure OFF
+        _pump_gpio_handle = backend.lgpio.gpiochip_open(0)
+        backend.lgpio.gpio_claim_output(_pump_gpio_handle, RELAY_PIN)
+        backend.lgpio.gpio_write(_pump_gpio_handle, RELAY_PIN, 1)  # Ensure OFF
 
 def pump_on():
     init_pump_gpio()
-    lgpio.gpio_write(_pump_gpio_handle, RELAY_PIN, 0)
+    backend.lgpio.gpio_write(_pump_gpio_handle, RELAY_PIN, 0)
     print("Water pump is ON")
 
 def pump_off():
     init_pump_gpio()
-    lgpio.gpio_write(_pump_gpio_handle, RELAY_PIN, 1)
+    backend.lgpio.gpio_write(_pump_gpio_handle, RELAY_PIN, 1)
     print("Water pump is OFF")
 
-def run_circle_pattern(center_lat, center_lng, radius, stop_event):
+def run_circle_pattern(center_lat, center_lng, radius, stop_event, progress=None, session=None):
     """
     Moves the rover in a circle of the given radius (meters) centered at (center_lat, center_lng).
     Uses existing move_forward, rotate_left, rotate_right, stop_motors, etc.
     Checks stop_event.is_set() to allow stopping.
+    If a ``progress`` dict is given, 'segment'/'segments' are updated as the pattern runs.
+    With an actuators ``session``, motor commands go through the actuator arbiter.
     """
     import math
-    from app import hardware
-    pca = setup_pca9685(channel=0)
+    if session is not None:
+        # ``info`` lets the obstacle guard veto the forward legs
+        drive = lambda fn, *args, info=None: session.call(lambda pca: fn(pca, *args), info=info)
+    else:
+        pca = setup_pca9685(channel=0)
+        drive = lambda fn, *args, info=None: fn(pca, *args)
     # Circle: break into N segments
     N = 36  # 10 degrees per segment
     segment_length = 2 * math.pi * radius / N
     forward_pwm = 30000  # Adjust as needed for your speed
     turn_pwm = 20000     # Adjust as needed for your turning
-    for i in range(N):
-        if stop_event.is_set():
-            break
-        move_forward(pca, forward_pwm)
-        time.sleep(segment_length / 0.1)  # 0.1 m/s speed, adjust as needed
-        stop_motors(pca)
-        time.sleep(0.2)
-        rotate_left(pca, turn_pwm)
-        time.sleep(0.25)  # Adjust for 10 degree turn
-        stop_motors(pca)
-        time.sleep(0.2)
-    stop_motors(pca) 
\ No newline at end of file
+    if progress is not None:
+        progress.update(segment=0, segments=N)
+    try:
+        for i in range(N):
+            if stop_event.is_set():
+                break
+            if progress is not None:
+                progress['segment'] = i + 1
+            drive(move_forward, forward_pwm, info={'left': 1, 'right': 1})
+            stop_event.wait(segment_length / 0.1)  # 0.1 m/s speed, adjust as needed
+            drive(stop_motors)
+            stop_event.wait(0.2)
+            drive(rotate_left, turn_pwm)
+            stop_event.wait(0.25)  # Adjust for 10 degree turn
+            drive(stop_motors)
+            stop_event.wait(0.2)
+    finally:
+        if session is None or not session.revoked:
+            drive(stop_motors) 
\ No newline at end of file
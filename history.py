@@ -0,0 +1,164 @@
+"""Sample history: indexes, time-series rollups and keyset-paginated queries.
+
+Hourly and daily min/max/mean per sensor per point are kept in rollup tables
+that SQLite triggers maintain on every insert into ``samples``, so charts of
+long histories never scan the raw table. A deleted sample makes the trigger
+recompute just the buckets it belonged to. Samples without a point are
+rolled up under point '' (the rollup key must not contain NULLs, which
+SQLite never treats as equal in a conflict target).
+"""
+import base64
+import json
+
+SENSORS = ('ph', 'do', 'turbidity', 'temp', 'water_level')
+# resolution -> number of ISO-8601 timestamp characters that form the bucket key
+RESOLUTIONS = {'hourly': 13, 'daily': 10}
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+HISTORY_COLUMNS = 'id, timestamp, point, lat, lng, ph, do, turbidity, temp, water_level'
+
+
+def _rollup_table(resolution):
+    return f'sample_rollups_{resolution}'
+
+
+def init_schema(c):
+    """Create indexes, rollup tables and triggers. ``c`` is an open connection/cursor."""
+    c.execute('CREATE INDEX IF NOT EXISTS idx_samples_point_timestamp ON samples (point, timestamp)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_samples_timestamp ON samples (timestamp)')
+    for resolution, width in RESOLUTIONS.items():
+        table = _rollup_table(resolution)
+        columns = {row[1]: row[3] for row in c.execute(f'PRAGMA table_info({table})')}
+        exists = bool(columns)
+        if exists and not columns.get('point'):
+            # Rollups keyed on a nullable point: rebuild them with point NOT NULL
+            for kind in ('insert', 'delete'):
+                c.execute(f'DROP TRIGGER IF EXISTS trg_{table}_{kind}')
+            c.execute(f'DROP TABLE {table}')
+            exists = False
+        c.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+            bucket TEXT,
+            point TEXT NOT NULL,
+            sensor TEXT,
+            count INTEGER,
+            sum REAL,
+            min REAL,
+            max REAL,
+            PRIMARY KEY (bucket, point, sensor)
+        )''')
+        c.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_point ON {table} (point, bucket)')
+        insert_sql = ';\n'.join(_upsert_sql(table, width, sensor) for sensor in SENSORS)
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_insert AFTER INSERT ON samples
+            BEGIN
+            {insert_sql};
+            END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_delete AFTER DELETE ON samples
+            BEGIN
+            DELETE FROM {table}
+                WHERE bucket = substr(OLD.timestamp, 1, {width}) AND point = COALESCE(OLD.point, '');
+            {';'.join(_rebuild_sql(table, width, sensor) for sensor in SENSORS)};
+            END''')
+        if not exists:
+            # First run on an existing database: backfill from the raw samples
+            for sensor in SENSORS:
+                c.execute(f'''INSERT INTO {table} (bucket, point, sensor, count, sum, min, max)
+                    SELECT substr(timestamp, 1, {width}), COALESCE(point, ''), '{sensor}',
+                           COUNT({sensor}), SUM({sensor}), MIN({sensor}), MAX({sensor})
+                    FROM samples WHERE {sensor} IS NOT NULL AND timestamp IS NOT NULL
+                    GROUP BY 1, 2''')
+
+
+def _upsert_sql(table, width, sensor):
+    return f'''INSERT INTO {table} (bucket, point, sensor, count, sum, min, max)
+                SELECT substr(NEW.timestamp, 1, {width}), COALESCE(NEW.point, ''), '{sensor}',
+                       1, NEW.{sensor}, NEW.{sensor}, NEW.{sensor}
+                WHERE NEW.{sensor} IS NOT NULL AND NEW.timestamp IS NOT NULL
+                ON CONFLICT (bucket, point, sensor) DO UPDATE SET
+                    count = count + 1,
+                    sum = sum + excluded.sum,
+                    min = MIN(min, excluded.min),
+                    max = MAX(max, excluded.max)'''
+
+
+def _rebuild_sql(table, width, sensor):
+    return f'''INSERT INTO {table} (bucket, point, sensor, count, sum, min, max)
+                SELECT substr(OLD.timestamp, 1, {width}), COALESCE(OLD.point, ''), '{sensor}',
+                       COUNT({sensor}), SUM({sensor}), MIN({sensor}), MAX({sensor})
+                FROM samples
+                WHERE timestamp >= substr(OLD.timestamp, 1, {width})
+                  AND timestamp < substr(OLD.timestamp, 1, {width}) || '~'
+                  AND point IS OLD.point AND {sensor} IS NOT NULL
+                GROUP BY 1, 2'''
+
+
+def encode_cursor(timestamp, sample_id):
+    raw = json.dumps([timestamp, sample_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    timestamp, sample_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return timestamp, int(sample_id)
+
+
+def query_history(conn, point=None, start=None, end=None, cursor=None, limit=DEFAULT_LIMIT):
+    """Newest-first page of samples. Returns (rows, next_cursor or None)."""
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    where, params = [], []
+    if point:
+        where.append('point = ?')
+        params.append(point)
+    if start:
+        where.append('timestamp >= ?')
+        params.append(start)
+    if end:
+        where.append('timestamp < ?')
+        params.append(end)
+    if cursor:
+        timestamp, sample_id = decode_cursor(cursor)
+        where.append('(timestamp, id) < (?, ?)')
+        params.extend([timestamp, sample_id])
+    sql = f'SELECT {HISTORY_COLUMNS} FROM samples'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY timestamp DESC, id DESC LIMIT ?'
+    params.append(limit + 1)
+    rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    return rows, next_cursor
+
+
+def query_rollups(conn, resolution='hourly', point=None, sensor=None, start=None, end=None):
+    """Rollup rows as dicts, oldest bucket first."""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    where, params = [], []
+    if point:
+        where.append('point = ?')
+        params.append(point)
+    if sensor:
+        if sensor not in SENSORS:
+            raise ValueError(f"Unknown sensor: {sensor}")
+        where.append('sensor = ?')
+        params.append(sensor)
+    width = RESOLUTIONS[resolution]
+    if start:
+        where.append('bucket >= ?')
+        params.append(start[:width])
+    if end:
+        where.append('bucket <= ?')
+        params.append(end[:width])
+    sql = f'SELECT bucket, point, sensor, count, sum, min, max FROM {_rollup_table(resolution)}'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY bucket, point, sensor'
+    return [
+        {'bucket': bucket, 'point': pt or None, 'sensor': name, 'count': count,
+         'min': lo, 'max': hi, 'mean': total / count if count else None}
+        for bucket, pt, name, count, total, lo, hi in conn.execute(sql, params)
+    ]
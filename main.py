@@ -2,15 +2,26 @@ from flask import Flask, render_template, request, redirect, url_for, session, j
 from flask_socketio import SocketIO, emit
 import os
 import json
-import math
 import uuid
-import sqlite3
 import threading
 import datetime
 import time
 from app import hardware
-from app.hardware import perform_object_sequence
-from app.compass import Compass
+from app import db
+from app import gps_track
+from app import error_log
+from app import history
+from app import telemetry
+from app import vision
+from app import navigation
+from app import spatial
+from app import planner
+from app import scheduler
+from app import w1temp
+from app import motion
+from app import arm_sequences
+from app import actuators
+from app import ranging
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -35,73 +46,83 @@ current_pattern = None
 docking_station = None
 # Store schedules
 schedules = {}
+# Visiting order of the scheduler's current run (planner.plan() result)
+mission_plan = None
 
 # Dummy credentials (in real app, use proper authentication)
 CREDENTIALS = {
     "admin": "password"
 }
 
-DB_PATH = os.path.join(BASE_DIR, 'schedules.db')
+DB_PATH = db.DB_PATH
 
 # Initialize database
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS schedules (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        point TEXT UNIQUE,
-        day TEXT,
-        time TEXT,
-        pattern TEXT,
-        radius INTEGER,
-        lat REAL,
-        lng REAL,
-        week INTEGER
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS docking_station (
-        id INTEGER PRIMARY KEY CHECK (id = 1),
-        lat REAL,
-        lng REAL
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS points (
-        point TEXT PRIMARY KEY,
-        lat REAL,
-        lng REAL
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS target_location (
-        id INTEGER PRIMARY KEY CHECK (id = 1),
-        lat REAL,
-        lng REAL
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS samples (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        point TEXT,
-        lat REAL,
-        lng REAL,
-        ph REAL,
-        ph_voltage REAL,
-        do REAL,
-        do_voltage REAL,
-        turbidity REAL,
-        temp REAL,
-        water_level REAL
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS error_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        error_type TEXT,
-        message TEXT,
-        component TEXT,
-        severity TEXT,
-        water_level REAL,
-        gps_lat REAL,
-        gps_lng REAL
-    )''')
-    conn.commit()
-    conn.close()
-
-init_db()
+    with db.transaction() as c:
+        c.execute('''CREATE TABLE IF NOT EXISTS schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            point TEXT UNIQUE,
+            day TEXT,
+            time TEXT,
+            pattern TEXT,
+            radius INTEGER,
+            lat REAL,
+            lng REAL,
+            week INTEGER
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS docking_station (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            lat REAL,
+            lng REAL
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS points (
+            point TEXT PRIMARY KEY,
+            lat REAL,
+            lng REAL
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS target_location (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            lat REAL,
+            lng REAL
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS samples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            point TEXT,
+            lat REAL,
+            lng REAL,
+            ph REAL,
+            ph_voltage REAL,
+            do REAL,
+            do_voltage REAL,
+            turbidity REAL,
+            temp REAL,
+            water_level REAL
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS error_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            error_type TEXT,
+            message TEXT,
+            component TEXT,
+            severity TEXT,
+            water_level REAL,
+            gps_lat REAL,
+            gps_lng REAL
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS gps_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            lat REAL,
+            lng REAL,
+            raw TEXT,
+            date TEXT,
+            time TEXT
+        )''')
+        history.init_schema(c)
+        error_log.init_schema(c)
+        spatial.init_schema(c)
+        scheduler.init_schema(c)
 
 # --- Global State for Locking and Automation ---
 control_lock = threading.Lock()
@@ -113,10 +134,13 @@ stop_automation_flag = threading.Event()
 nav_thread = None
 nav_thread_lock = threading.Lock()
 nav_status = {'running': False, 'target': None, 'last': None}
+nav_controller = None
+NAV_RATE_HZ = 10
 
 # New pattern thread and stop event
 pattern_thread = None
 pattern_stop_event = threading.Event()
+pattern_status = {'running': False, 'pattern': None, 'segment': 0, 'segments': 0}
 
 # --- Helper: Set Status ---
 def set_status(state):
@@ -189,73 +213,18 @@ def move_rover():
     target_lat = float(data.get('lat'))
     target_lng = float(data.get('lng'))
     pwm = int(data.get('pwm', 40000))  # Default forward PWM
-    turn_pwm = 65535  # Default turn PWM
-
-    def haversine(lat1, lon1, lat2, lon2):
-        R = 6371000  # meters
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        dphi = math.radians(lat2 - lat1)
-        dlambda = math.radians(lon2 - lon1)
-        a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-        return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    def bearing(lat1, lon1, lat2, lon2):
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        dlambda = math.radians(lon2 - lon1)
-        y = math.sin(dlambda) * math.cos(phi2)
-        x = math.cos(phi1)*math.sin(phi2) - math.sin(phi1)*math.cos(phi2)*math.cos(dlambda)
-        brng = math.degrees(math.atan2(y, x))
-        return (brng + 360) % 360
+    controller = navigation.NavigationController(forward_pwm=pwm, status=nav_status,
+                                                 rate_hz=float(data.get('rate_hz', NAV_RATE_HZ)))
 
     def nav_thread_fn():
-        try:
-            nav_status['running'] = True
-            nav_status['target'] = {'lat': target_lat, 'lng': target_lng}
-            pca = hardware.setup_pca9685(channel=0)
-            compass = Compass()
-            STOP_DIST = 1.5  # meters
-            TURN_THRESH = 10  # degrees
-            last_gps = None
-            for _ in range(120):  # up to 2 minutes
-                gps = hardware.get_latest_gps()
-                if not gps or not gps['lat'] or not gps['lng']:
-                    hardware.stop_motors(pca)
-                    nav_status['last'] = 'no_gps'
-                    break
-                last_gps = gps
-                dist = haversine(gps['lat'], gps['lng'], target_lat, target_lng)
-                brng = bearing(gps['lat'], gps['lng'], target_lat, target_lng)
-                comp = compass.get_compass_data()
-                if not comp or 'heading' not in comp:
-                    hardware.stop_motors(pca)
-                    nav_status['last'] = 'no_compass'
-                    break
-                heading = comp['heading']
-                err = (brng - heading + 360) % 360
-                if err > 180:
-                    err -= 360
-                if dist < STOP_DIST:
-                    hardware.stop_motors(pca)
-                    nav_status['last'] = 'arrived'
-                    break
-                if abs(err) > TURN_THRESH:
-                    if err > 0:
-                        hardware.rotate_right(pca, turn_pwm)
-                    else:
-                        hardware.rotate_left(pca, turn_pwm)
-                else:
-                    hardware.move_forward(pca, pwm)
-                nav_status['last'] = {'gps': gps, 'compass': comp, 'dist': dist, 'bearing': brng, 'heading': heading, 'err': err}
-                time.sleep(0.5)
-            hardware.stop_motors(pca)
-            nav_status['running'] = False
-        except Exception as e:
-            nav_status['last'] = f'error: {e}'
-            try:
-                hardware.stop_motors(pca)
-            except:
-                pass
-            nav_status['running'] = False
+        global nav_controller
+        nav_controller = controller
+        # Optional budgets; by default they scale with the starting distance
+        max_time_s = data.get('max_time_s')
+        max_distance_m = data.get('max_distance_m')
+        controller.run(target_lat, target_lng,
+                       max_time_s=float(max_time_s) if max_time_s else None,
+                       max_distance_m=float(max_distance_m) if max_distance_m else None)
 
     with nav_thread_lock:
         global nav_thread
@@ -265,6 +234,13 @@ def move_rover():
         nav_thread.start()
     return jsonify({'status': 'started', 'target': {'lat': target_lat, 'lng': target_lng}, 'pwm': pwm})
 
+@app.route('/stop_rover', methods=['POST'])
+def stop_rover():
+    if nav_controller is not None:
+        nav_controller.stop()
+    latency_ms = actuators.stop_motors(reason='stop_rover')
+    return jsonify({'status': 'stopping' if nav_status['running'] else 'idle', 'latency_ms': latency_ms})
+
 @app.route('/control_motors', methods=['POST'])
 def control_motors():
     data = request.get_json()
@@ -277,25 +253,17 @@ def set_point():
     point = data['point']
     lat = data['lat']
     lng = data['lng']
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
+    db.execute('''
         INSERT INTO points (point, lat, lng)
         VALUES (?, ?, ?)
         ON CONFLICT(point) DO UPDATE SET lat=excluded.lat, lng=excluded.lng
     ''', (point, lat, lng))
-    conn.commit()
-    conn.close()
     return jsonify({'status': 'success', 'point': {'lat': lat, 'lng': lng}})
 
 # New route for getting point coordinates
 @app.route('/get_points')
 def get_points():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT point, lat, lng FROM points')
-    rows = c.fetchall()
-    conn.close()
+    rows = db.query('SELECT point, lat, lng FROM points')
     # Build dictionary with keys 'A', 'B', 'C', 'D'
     points = {pt: None for pt in ['A', 'B', 'C', 'D']}
     for row in rows:
@@ -308,25 +276,17 @@ def set_docking_station():
     data = request.get_json()
     lat = data['lat']
     lng = data['lng']
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
+    db.execute('''
         INSERT INTO docking_station (id, lat, lng)
         VALUES (1, ?, ?)
         ON CONFLICT(id) DO UPDATE SET lat=excluded.lat, lng=excluded.lng
     ''', (lat, lng))
-    conn.commit()
-    conn.close()
     return jsonify({'status': 'success', 'docking_station': {'lat': lat, 'lng': lng}})
 
 # New route for getting docking station
 @app.route('/get_docking_station')
 def get_docking_station():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT lat, lng FROM docking_station WHERE id=1')
-    row = c.fetchone()
-    conn.close()
+    row = db.query_one('SELECT lat, lng FROM docking_station WHERE id=1')
     if row and row[0] is not None and row[1] is not None:
         return jsonify({'lat': row[0], 'lng': row[1]})
     else:
@@ -339,15 +299,8 @@ def get_pattern():
 
 # Function to calculate distance between two GPS points
 def calculate_distance(lat1, lon1, lat2, lon2):
-    R = 6371  # Earth's radius in kilometers
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2) * math.sin(dlat/2) + \
-        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * \
-        math.sin(dlon/2) * math.sin(dlon/2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    distance = R * c
-    return distance
+    """Great-circle distance in kilometers (see spatial.haversine_m)."""
+    return spatial.haversine_m(lat1, lon1, lat2, lon2) / 1000.0
 
 @socketio.on('connect')
 def handle_connect():
@@ -355,6 +308,7 @@ def handle_connect():
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    telemetry.drop_client(request.sid)
     print('Client disconnected')
 
 @socketio.on('position_update')
@@ -397,17 +351,16 @@ def handle_position_update(data):
                                 'reached_target': True
                             })
 
-                # Check if we're in any point's range
-                for point, coords in point_coordinates.items():
-                    if coords:
-                        distance = calculate_distance(lat, lng, coords['lat'], coords['lng'])
-                        if distance <= 0.015:  # Within 15 meters
-                            emit('point_range', {
-                                'type': 'point_range',
-                                'point': point,
-                                'in_range': True,
-                                'distance': distance
-                            })
+                # Check if we're in any point's range (spatial index over saved points)
+                with db.connection() as conn:
+                    nearby = spatial.within(conn, lat, lng, 15, kind='points')  # Within 15 meters
+                for item in nearby:
+                    emit('point_range', {
+                        'type': 'point_range',
+                        'point': item['point'],
+                        'in_range': True,
+                        'distance': item['distance_m'] / 1000.0  # km, like calculate_distance
+                    })
             else:
                 emit('error', {
                     'type': 'error',
@@ -437,19 +390,16 @@ def save_schedule():
         return jsonify({'success': False, 'error': 'Invalid location'}), 400
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
         # Upsert: replace if point exists
-        c.execute('''INSERT INTO schedules (point, day, time, pattern, radius, lat, lng, week)
+        db.execute('''INSERT INTO schedules (point, day, time, pattern, radius, lat, lng, week)
                      VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                      ON CONFLICT(point) DO UPDATE SET
                         day=excluded.day, time=excluded.time, pattern=excluded.pattern,
                         radius=excluded.radius, lat=excluded.lat, lng=excluded.lng, week=excluded.week''',
                   (data['point'], data['day'], data['time'], data['pattern'], data['radius'],
                    data['location']['lat'], data['location']['lng'], data['week']))
-        conn.commit()
-        conn.close()
         print('Schedule saved successfully')
+        scheduler.notify_changed()
         return jsonify({'success': True})
     except Exception as e:
         print('Error saving schedule:', e)
@@ -457,11 +407,7 @@ def save_schedule():
 
 @app.route('/get_schedules')
 def get_schedules():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT point, day, time, pattern, radius, lat, lng, week FROM schedules')
-    rows = c.fetchall()
-    conn.close()
+    rows = db.query('SELECT point, day, time, pattern, radius, lat, lng, week FROM schedules')
     schedules = []
     for row in rows:
         schedules.append({
@@ -475,85 +421,93 @@ def get_schedules():
         })
     return jsonify(schedules)
 
-# --- Background Scheduler Thread ---
-def scheduler_thread():
-    while True:
-        now = datetime.datetime.now()
-        weekday = now.strftime('%A')
-        current_time = now.strftime('%H:%M')
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('SELECT point, lat, lng FROM schedules WHERE day=? AND time=?', (weekday, current_time))
-        due = c.fetchall()
-        conn.close()
-        for point, lat, lng in due:
-            # Simulate navigation, YOLO, arm, and sampling
-            # (Replace with real navigation and YOLO logic as needed)
-            print(f"[SCHEDULER] Navigating to {point} at {lat},{lng}")
-            # Move arm to sample position
-            hardware.set_arm_angle(90)
-            time.sleep(2)
-            # Read all sensors
-            ph = hardware.read_ph()
-            do = hardware.read_do()
-            try:
-                turbidity_voltage = hardware.get_latest_turbidity()
-                turbidity = {'voltage': turbidity_voltage}
-            except Exception as e:
-                print(f"[ERROR] Turbidity sensor: {e}")
-                turbidity = {'voltage': None, 'error': str(e)}
-            temp = hardware.read_temp()
-            water_level = hardware.read_water_level()
-            # Log sample
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute('''INSERT INTO samples (timestamp, point, lat, lng, ph, ph_voltage, do, do_voltage, turbidity, temp, water_level)
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', (
-                now.isoformat(), point, lat, lng,
-                ph['ph'], ph['voltage'],
-                do['do'], do['voltage'],
-                turbidity['voltage'], temp, water_level['voltage']
-            ))
-            conn.commit()
-            conn.close()
-            print(f"[SCHEDULER] Sample logged for {point}")
-        time.sleep(60)  # Check every minute
-
-# Start scheduler in background
-threading.Thread(target=scheduler_thread, daemon=True).start()
+# --- Sensor Snapshots ---
+def _sensor_reading(snapshot, name, empty):
+    """Flatten one acquisition-service entry into the reading dict the API/DB expect."""
+    entry = snapshot[name]
+    reading = dict(entry['value']) if entry['value'] else dict(empty)
+    reading['timestamp'] = entry['timestamp']
+    reading['stale'] = entry['stale']
+    if entry['error']:
+        reading['error'] = entry['error']
+    return reading
+
+# --- Scheduled Missions ---
+def run_scheduled_mission(due_schedules, due):
+    """Called by the scheduler with every schedule due at ``due``; returns {point: (status, detail)}."""
+    global mission_plan
+    # Visit the due points in the shortest order from and back to the dock
+    mission_plan = _plan_mission(due_schedules, depart=datetime.datetime.now())
+    print(f"[SCHEDULER] Route {' -> '.join(mission_plan['order'])}: "
+          f"{mission_plan['total_m']:.0f} m, ~{mission_plan['total_s'] / 60:.0f} min")
+    rank = {point: i for i, point in enumerate(mission_plan['order'])}
+    results = {}
+    for schedule in sorted(due_schedules, key=lambda s: rank.get(s['point'], len(rank))):
+        point, lat, lng = schedule['point'], schedule['lat'], schedule['lng']
+        try:
+            _sample_point(point, lat, lng)
+            results[point] = ('ok', None)
+        except Exception as e:
+            print(f"[ERROR] Scheduled sampling at {point} failed: {e}")
+            results[point] = ('error', str(e))
+    return results
+
+def _sample_point(point, lat, lng):
+    # Simulate navigation, YOLO, arm, and sampling
+    # (Replace with real navigation and YOLO logic as needed)
+    print(f"[SCHEDULER] Navigating to {point} at {lat},{lng}")
+    # Move arm to sample position
+    hardware.set_arm_angle(90)
+    time.sleep(2)
+    # One fresh reading of every sensor, buses read in parallel
+    snapshot = hardware.sweep_sensors()['sensors']
+    ph = _sensor_reading(snapshot, 'ph', {'ph': None, 'voltage': None})
+    do = _sensor_reading(snapshot, 'do', {'do': None, 'voltage': None})
+    turbidity = _sensor_reading(snapshot, 'turbidity', {'ntu': None, 'voltage': None})
+    temp = _sensor_reading(snapshot, 'temp', {'temp': None})
+    water_level = _sensor_reading(snapshot, 'water_level', {'raw': None, 'voltage': None})
+    now = datetime.datetime.now()
+    # Log sample
+    sample_id = db.insert('''INSERT INTO samples (timestamp, point, lat, lng, ph, ph_voltage, do, do_voltage, turbidity, temp, water_level)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', (
+        now.isoformat(), point, lat, lng,
+        ph['ph'], ph['voltage'],
+        do['do'], do['voltage'],
+        turbidity['ntu'], temp['temp'], water_level['voltage']
+    ))
+    telemetry.publish('samples', {
+        'id': sample_id, 'timestamp': now.isoformat(), 'point': point, 'lat': lat, 'lng': lng,
+        'ph': ph['ph'], 'do': do['do'], 'turbidity': turbidity['ntu'],
+        'temp': temp['temp'], 'water_level': water_level['voltage']
+    })
+    print(f"[SCHEDULER] Sample logged for {point}")
+
+@app.route('/api/schedule/upcoming')
+def api_schedule_upcoming():
+    return jsonify(dict(scheduler.upcoming(request.args.get('limit', 20, type=int)), stats=scheduler.get_stats()))
+
+@app.route('/api/schedule/history')
+def api_schedule_history():
+    limit = max(1, min(request.args.get('limit', scheduler.HISTORY_LIMIT, type=int), 1000))
+    return jsonify(scheduler.history(request.args.get('point'), limit))
 
 # --- API Endpoints for Live Data and History ---
 @app.route('/api/live_sample')
 def api_live_sample():
     try:
-        try:
-            ph = hardware.read_ph()
-        except Exception as e:
-            print(f"[ERROR] pH sensor: {e}")
-            ph = {'ph': None, 'voltage': None, 'error': str(e)}
-        try:
-            do = hardware.read_do()
-        except Exception as e:
-            print(f"[ERROR] DO sensor: {e}")
-            do = {'do': None, 'voltage': None, 'error': str(e)}
-        try:
-            turbidity_voltage = hardware.get_latest_turbidity()
-            if turbidity_voltage is None:
-                turbidity_voltage = hardware.read_turbidity()
-            turbidity = {'voltage': turbidity_voltage}
-        except Exception as e:
-            print(f"[ERROR] Turbidity sensor: {e}")
-            turbidity = {'voltage': None, 'error': str(e)}
-        try:
-            temp = hardware.read_temp()
-        except Exception as e:
-            print(f"[ERROR] Temp sensor: {e}")
-            temp = None
-        try:
-            water_level_raw, water_level_voltage = hardware.read_water_level()
-        except Exception as e:
-            print(f"[ERROR] Water level sensor: {e}")
-            water_level_raw, water_level_voltage = None, None
+        # Served from the acquisition service's in-memory snapshot (no bus access),
+        # or from a concurrent sweep of all sensors with ?fresh=1
+        if request.args.get('fresh', type=int):
+            snapshot = hardware.sweep_sensors()['sensors']
+        else:
+            snapshot = hardware.get_sensor_snapshot()
+        ph = _sensor_reading(snapshot, 'ph', {'ph': None, 'voltage': None})
+        do = _sensor_reading(snapshot, 'do', {'do': None, 'voltage': None})
+        turbidity = _sensor_reading(snapshot, 'turbidity', {'ntu': None, 'voltage': None})
+        turbidity['voltage'] = turbidity['ntu']  # dashboard reads NTU from 'voltage'
+        temp = _sensor_reading(snapshot, 'temp', {'temp': None})
+        water_level = _sensor_reading(snapshot, 'water_level', {'raw': None, 'voltage': None})
+        water_level_raw, water_level_voltage = water_level['raw'], water_level['voltage']
 
         if water_level_voltage is None:
             water_status = "disconnected"
@@ -571,7 +525,9 @@ def api_live_sample():
                 'raw': water_level_raw,
                 'voltage': water_level_voltage,
                 'status': water_status,
-                'detected': detected
+                'detected': detected,
+                'timestamp': water_level['timestamp'],
+                'stale': water_level['stale']
             }
         })
     except Exception as e:
@@ -580,35 +536,57 @@ def api_live_sample():
 
 @app.route('/api/sample_history')
 def api_sample_history():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT timestamp, point, lat, lng, ph, do, turbidity, temp, water_level FROM samples ORDER BY timestamp DESC LIMIT 100')
-    rows = c.fetchall()
-    conn.close()
-    history = [
+    # Optional filters: point, start/end (ISO timestamps), limit, cursor (from X-Next-Cursor)
+    try:
+        with db.connection() as conn:
+            rows, next_cursor = history.query_history(
+                conn,
+                point=request.args.get('point'),
+                start=request.args.get('start'),
+                end=request.args.get('end'),
+                cursor=request.args.get('cursor'),
+                limit=request.args.get('limit', history.DEFAULT_LIMIT))
+    except (ValueError, TypeError) as e:
+        return jsonify({'status': 'error', 'message': f'Invalid query: {e}'}), 400
+    samples = [
         {
-            'timestamp': row[0],
-            'point': row[1],
-            'lat': row[2],
-            'lng': row[3],
-            'ph': row[4],
-            'do': row[5],
-            'turbidity': row[6],
-            'temp': row[7],
-            'water_level': row[8]
+            'id': row[0],
+            'timestamp': row[1],
+            'point': row[2],
+            'lat': row[3],
+            'lng': row[4],
+            'ph': row[5],
+            'do': row[6],
+            'turbidity': row[7],
+            'temp': row[8],
+            'water_level': row[9]
         }
         for row in rows
     ]
-    return jsonify(history)
+    response = jsonify(samples)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@app.route('/api/sample_rollups')
+def api_sample_rollups():
+    try:
+        with db.connection() as conn:
+            rollups = history.query_rollups(
+                conn,
+                resolution=request.args.get('resolution', 'hourly'),
+                point=request.args.get('point'),
+                sensor=request.args.get('sensor'),
+                start=request.args.get('start'),
+                end=request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(rollups)
 
 @app.route('/api/sample_history/delete/<int:sample_id>', methods=['POST'])
 def delete_sample_history(sample_id):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('DELETE FROM samples WHERE id = ?', (sample_id,))
-        conn.commit()
-        conn.close()
+        db.execute('DELETE FROM samples WHERE id = ?', (sample_id,))
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -621,6 +599,8 @@ def save_breeding_site():
     do = data.get('do')
     turbidity = data.get('turbidity')
     temp = data.get('temp')
+    if temp is None:
+        temp = hardware.read_temp(timeout=0).get('temp')  # cached probe reading, no conversion wait
     water_level = data.get('water_level')
     lat = data.get('lat')
     lng = data.get('lng')
@@ -635,60 +615,116 @@ def save_breeding_site():
         temp is not None and 26.80 <= temp <= 33.20 and
         water_level is not None):
         try:
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute('''INSERT INTO samples (timestamp, point, lat, lng, ph, ph_voltage, do, do_voltage, turbidity, temp, water_level) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                      (timestamp, point, lat, lng, ph, ph_voltage, do, do_voltage, turbidity, temp, water_level))
-            conn.commit()
-            conn.close()
+            sample_id = db.insert('''INSERT INTO samples (timestamp, point, lat, lng, ph, ph_voltage, do, do_voltage, turbidity, temp, water_level) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                                  (timestamp, point, lat, lng, ph, ph_voltage, do, do_voltage, turbidity, temp, water_level))
+            telemetry.publish('samples', {
+                'id': sample_id, 'timestamp': timestamp, 'point': point, 'lat': lat, 'lng': lng,
+                'ph': ph, 'do': do, 'turbidity': turbidity, 'temp': temp, 'water_level': water_level
+            })
             return jsonify({'status': 'success'})
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)}), 500
     else:
         return jsonify({'status': 'error', 'message': 'Criteria not met or missing data'}), 400
 
+# --- API: Proximity Queries (spatial index) ---
+def _proximity_args():
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    if lat is None or lng is None:
+        gps = hardware.get_latest_gps()  # default to the rover's position
+        lat, lng = gps.get('lat'), gps.get('lng')
+    if lat is None or lng is None:
+        raise ValueError('lat/lng required (no GPS fix)')
+    kinds = request.args.get('kind', 'all')
+    kinds = list(spatial.KINDS) if kinds == 'all' else kinds.split(',')
+    return lat, lng, kinds
+
+@app.route('/api/proximity')
+def api_proximity():
+    # Everything within ?radius= meters (default 50) of ?lat=&lng= (default: current GPS fix)
+    try:
+        lat, lng, kinds = _proximity_args()
+        radius = min(request.args.get('radius', 50.0, type=float), spatial.NEAREST_MAX_RADIUS_M)
+        limit = request.args.get('limit', 100, type=int)
+        with db.connection() as conn:
+            items = [item for kind in kinds for item in spatial.within(conn, lat, lng, radius, kind)]
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    items.sort(key=lambda item: item['distance_m'])
+    return jsonify({'lat': lat, 'lng': lng, 'radius': radius, 'items': items[:limit]})
+
+@app.route('/api/nearest')
+def api_nearest():
+    # The ?k= (default 1) nearest points/sites to ?lat=&lng= (default: current GPS fix)
+    try:
+        lat, lng, kinds = _proximity_args()
+        k = max(1, min(request.args.get('k', 1, type=int), 100))
+        with db.connection() as conn:
+            items = [item for kind in kinds for item in spatial.nearest(conn, lat, lng, kind, k)]
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    items.sort(key=lambda item: item['distance_m'])
+    return jsonify({'lat': lat, 'lng': lng, 'items': items[:k]})
+
+# --- API: Mission Planning ---
+def _docking_station():
+    row = db.query_one('SELECT lat, lng FROM docking_station WHERE id=1')
+    if row and row[0] is not None and row[1] is not None:
+        return {'point': 'dock', 'lat': row[0], 'lng': row[1]}
+    return None
+
+def _plan_mission(points, depart=None, return_to_dock=True, speed_mps=None, dwell_s=None):
+    # Leave from the dock (or the current fix if none is set) and come back to it
+    dock = _docking_station()
+    start = dock
+    if start is None:
+        gps = hardware.get_latest_gps()
+        if gps.get('lat') is not None and gps.get('lng') is not None:
+            start = {'point': 'rover', 'lat': gps['lat'], 'lng': gps['lng']}
+    return planner.plan(points, start=start, end=dock if return_to_dock else None,
+                        speed_mps=speed_mps or planner.CRUISE_SPEED_MPS,
+                        dwell_s=planner.SAMPLE_DWELL_S if dwell_s is None else dwell_s,
+                        depart=depart)
+
+@app.route('/api/mission/plan', methods=['GET', 'POST'])
+def api_mission_plan():
+    # Points from ?points=A,B,C or a JSON body {"points": ["A", ...] or [{"point","lat","lng"}, ...]};
+    # default: every saved point. Optional speed_mps, dwell_s, return_to_dock.
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+    options = {**request.args.to_dict(), **data}
+    requested = options.get('points')
+    if isinstance(requested, str):
+        requested = [p.strip() for p in requested.split(',') if p.strip()]
+    try:
+        saved = {row[0]: {'point': row[0], 'lat': row[1], 'lng': row[2]}
+                 for row in db.query('SELECT point, lat, lng FROM points')}
+        if requested is None:
+            points = list(saved.values())
+        else:
+            points = [p if isinstance(p, dict) else saved.get(p) for p in requested]
+            missing = [name for name, p in zip(requested, points) if p is None]
+            if missing:
+                return jsonify({'status': 'error', 'message': f"Unknown points: {', '.join(missing)}"}), 400
+        result = _plan_mission(points, depart=datetime.datetime.now(),
+                               return_to_dock=str(options.get('return_to_dock', True)).lower() not in ('0', 'false', 'no'),
+                               speed_mps=float(options['speed_mps']) if options.get('speed_mps') else None,
+                               dwell_s=float(options['dwell_s']) if options.get('dwell_s') not in (None, '') else None)
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(result)
+
+@app.route('/api/mission/current_plan')
+def api_mission_current_plan():
+    return jsonify(mission_plan or {'status': 'no_plan'})
+
 # --- API: GPS Data ---
 @app.route('/api/gps')
 def api_gps():
-    gps = hardware.get_latest_gps()
-    # Store in DB if valid
+    gps = dict(hardware.get_latest_gps())
+    # Fixes are persisted by the gps_track writer, not per poll
     if gps['lat'] is not None and gps['lng'] is not None:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS gps_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            lat REAL,
-            lng REAL,
-            raw TEXT,
-            date TEXT,
-            time TEXT
-        )''')
-        conn.commit()
-        # Use date/time from GPS if available, else try to parse NMEA
-        date_str = gps.get('date')
-        time_str = gps.get('time')
-        if not date_str or not time_str:
-            if gps.get('raw'):
-                try:
-                    parts = gps['raw'].split(',')
-                    if gps['raw'].startswith('$GPRMC'):
-                        if len(parts) > 9:
-                            time_str = f"{parts[1][:2]}:{parts[1][2:4]}:{parts[1][4:6]}"
-                            date_str = f"{parts[9][4:6]}/{parts[9][2:4]}/{parts[9][:2]}"
-                    elif gps['raw'].startswith('$GPGGA'):
-                        if len(parts) > 1:
-                            time_str = f"{parts[1][:2]}:{parts[1][2:4]}:{parts[1][4:6]}"
-                            now = datetime.datetime.now()
-                            date_str = now.strftime("%m/%d/%Y")
-                except Exception as e:
-                    print(f"Error parsing GPS date/time: {e}")
-        c.execute('INSERT INTO gps_log (timestamp, lat, lng, raw, date, time) VALUES (?, ?, ?, ?, ?, ?)',
-                  (datetime.datetime.now().isoformat(), gps['lat'], gps['lng'], gps['raw'], date_str, time_str))
-        conn.commit()
-        conn.close()
-        gps['date'] = date_str
-        gps['time'] = time_str
+        gps['date'], gps['time'] = gps_track.fix_date_time(gps)
     else:
         log_error('GPS_ERROR', 'No valid GPS data received', 'GPS', 'WARNING', 
                  gps_lat=gps.get('lat'), gps_lng=gps.get('lng'))
@@ -699,73 +735,85 @@ def api_gps():
 def api_ultrasonic():
     return jsonify(hardware.get_ultrasonic())
 
+# --- API: Ultrasonic Ranging ---
+@app.route('/api/ranging')
+def api_ranging():
+    return jsonify({'readings': ranging.latest(), 'stats': ranging.get_stats()})
+
+# --- API: I2C Transaction Counters ---
+@app.route('/api/i2c_stats')
+def api_i2c_stats():
+    return jsonify(hardware.get_i2c_stats())
+
+@app.route('/api/motion_stats')
+def api_motion_stats():
+    return jsonify(dict(motion.get_stats(), angles=hardware.current_angles, pwm=hardware.pwm_stats))
+
+@app.route('/api/temperature')
+def api_temperature():
+    # Every DS18B20 probe from the background bulk-conversion cache
+    return jsonify({'probes': w1temp.get_readings(), 'stats': w1temp.get_stats()})
+
+@app.route('/api/sensor_sweep')
+def api_sensor_sweep():
+    # One concurrent reading of ?sensors=a,b (default: the water sensors), with per-sweep stats
+    names = request.args.get('sensors')
+    names = [n.strip() for n in names.split(',') if n.strip()] if names else None
+    unknown = [n for n in names or () if n not in hardware.SWEEP_SENSORS]
+    if unknown:
+        return jsonify({'status': 'error', 'message': f"Unknown sensors: {', '.join(unknown)}"}), 400
+    return jsonify(dict(hardware.sweep_sensors(names), stats=hardware.sweep_stats))
+
 # --- API: YOLOv8 Object Detection ---
 @app.route('/api/yolo')
 def api_yolo():
-    # This may take a few seconds to run
-    return jsonify(hardware.run_yolo_inference())
+    # Cached result from the vision worker; ?max_age=<seconds> waits for a fresher frame
+    return jsonify(vision.get_detections(max_age=request.args.get('max_age', type=float)))
+
+@app.route('/api/vision_stats')
+def api_vision_stats():
+    return jsonify(vision.get_stats())
 
 # --- Mission Progress Status API (Demo) ---
 @app.route('/api/mission_status')
 def api_mission_status():
+    return jsonify(mission_status())
+
+def mission_status():
     # Demo/mock data: in real use, update with actual mission logic
     # Example: {'A': 'visited', 'B': 'in_progress', 'C': 'pending', 'D': 'pending', 'docking': 'docked'}
-    status = {
+    return {
         'A': 'visited',
         'B': 'in_progress',
         'C': 'pending',
         'D': 'pending',
         'docking': 'docked'  # or 'en_route', 'away'
     }
-    return jsonify(status)
 
 # Add error logging function
 def log_error(error_type, message, component, severity, water_level=None, gps_lat=None, gps_lng=None):
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''INSERT INTO error_logs 
-                    (timestamp, error_type, message, component, severity, water_level, gps_lat, gps_lng)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                 (datetime.datetime.now().isoformat(), error_type, message, component, 
-                  severity, water_level, gps_lat, gps_lng))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Error logging failed: {str(e)}")
+    # Queued and batch-written by error_log; below-threshold severities are not stored
+    error_log.log_error(error_type, message, component, severity,
+                        water_level=water_level, gps_lat=gps_lat, gps_lng=gps_lng)
 
 # Add endpoint to get error logs
 @app.route('/api/error-logs')
 def get_error_logs():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT timestamp, error_type, message, component, severity, water_level, gps_lat, gps_lng FROM error_logs ORDER BY timestamp DESC LIMIT 100')
-    rows = c.fetchall()
-    conn.close()
-    logs = [
-        {
-            'timestamp': row[0],
-            'error_type': row[1],
-            'message': row[2],
-            'component': row[3],
-            'severity': row[4],
-            'water_level': row[5],
-            'gps_lat': row[6],
-            'gps_lng': row[7]
-        }
-        for row in rows
-    ]
+    # Optional filters: component, severity (comma-separated), min_severity, limit
+    try:
+        logs = error_log.query(component=request.args.get('component'),
+                               severity=request.args.get('severity'),
+                               min_severity=request.args.get('min_severity'),
+                               limit=request.args.get('limit', 100))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     return jsonify(logs)
 
 # Add endpoint to clear error logs
 @app.route('/api/error-logs/clear', methods=['POST'])
 def clear_error_logs():
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('DELETE FROM error_logs')
-        conn.commit()
-        conn.close()
+        error_log.clear()
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -790,8 +838,8 @@ def read_turbidity():
 @app.route('/api/yolo_detection')
 def yolo_detection():
     try:
-        # Run YOLOv8 inference
-        results = hardware.run_yolo_inference()
+        # Latest YOLOv8 result from the vision worker (?max_age=<seconds> bounds its age)
+        results = vision.get_detections(max_age=request.args.get('max_age', type=float))
         
         if 'error' in results:
             return jsonify({'error': results['error']}), 500
@@ -809,7 +857,7 @@ def yolo_detection():
         highest_conf = 0
         
         for obj in results['objects']:
-            class_name = obj['class']
+            class_name = obj.get('name')
             confidence = obj['confidence']
             
             if confidence > highest_conf and class_name in yolo_to_obj:
@@ -829,31 +877,14 @@ def manual_control():
     data = request.get_json()
     action = data.get('action')
     pwm = data.get('pwm', 32768)
+    if action != 'stop' and action not in actuators.DRIVE_ACTIONS:
+        return jsonify({'status': 'error', 'message': 'Unknown action'}), 400
     try:
-        # Only set up PCA9685 for DC motors at 1000Hz (do not reset all or set freq every time)
-        pca = hardware.setup_pca9685(channel=0, frequency=1000)  # 1000Hz for DC motors
-        # Do NOT reset all or change frequency here!
-        if action == 'forward':
-            hardware.move_forward(pca, pwm)
-        elif action == 'backward':
-            hardware.move_backward(pca, pwm)
-        elif action == 'left':
-            hardware.rotate_left(pca, pwm)
-        elif action == 'right':
-            hardware.rotate_right(pca, pwm)
-        elif action == 'northwest':
-            hardware.move_northwest(pca, pwm)
-        elif action == 'northeast':
-            hardware.move_northeast(pca, pwm)
-        elif action == 'southwest':
-            hardware.move_southwest(pca, pwm)
-        elif action == 'southeast':
-            hardware.move_southeast(pca, pwm)
-        elif action == 'stop':
-            hardware.stop_motors(pca)
-        else:
-            return jsonify({'status': 'error', 'message': 'Unknown action'}), 400
+        # The arbiter keeps the PCA9685 at 1000Hz for DC motors while driving
+        actuators.drive_action(action, pwm)
         return jsonify({'status': 'success', 'action': action})
+    except actuators.Preempted as e:
+        return jsonify({'status': 'rejected', 'message': str(e)}), 409
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -870,19 +901,22 @@ def servo_control():
         data = request.get_json()
         channel = int(data.get('channel'))
         angle = int(data.get('angle'))
-        # 1. Reset all channels at 50Hz
-        pca = hardware.setup_pca9685(channel=0, frequency=50)
-        hardware.reset_all_channels(pca)
-        # 2. Move to requested angle
-        clamped = hardware.set_servo_angle(pca, channel, angle)
-        time.sleep(0.5)
-        # 3. Move back to initial position
-        init_angle = hardware.servo_config[channel]["init"]
-        hardware.smooth_move(pca, channel, clamped, init_angle, hardware.servo_config[channel]["delay"])
-        # 4. Reset all channels again
-        hardware.reset_all_channels(pca)
+        with actuators.session('manual', 'servos', wait=False) as arm:
+            # 1. Reset all channels at 50Hz
+            arm.call(hardware.reset_all_channels)
+            # 2. Move to requested angle
+            clamped = arm.call(lambda pca: hardware.set_servo_angle(pca, channel, angle))
+            arm_sequences.record({channel: clamped})  # no-op unless teaching a sequence
+            time.sleep(0.5)
+            # 3. Move back to initial position
+            init_angle = hardware.servo_config[channel]["init"]
+            hardware.smooth_move(None, channel, init_angle, session=arm)
+            # 4. Reset all channels again
+            arm.call(hardware.reset_all_channels)
         set_status('manual')
         return jsonify({'status': 'success', 'channel': channel, 'angle': clamped})
+    except actuators.Preempted as e:
+        return jsonify({'status': 'rejected', 'message': str(e)}), 409
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
     finally:
@@ -895,8 +929,8 @@ def reset_channels():
     if not control_lock.acquire(blocking=False):
         return jsonify({'status': 'busy', 'message': 'System is busy'}), 409
     try:
-        pca = hardware.setup_pca9685(channel=0)
-        hardware.reset_all_channels(pca)
+        # All channels off is safe at either frequency: runs as a stop command
+        actuators.call(hardware.reset_all_channels, source='stop')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -915,24 +949,32 @@ def automation_sequence():
     try:
         while not stop_automation_flag.is_set():
             # 1. Move forward for 5 seconds (motors)
-            pca = hardware.setup_pca9685(channel=0, frequency=1000)
-            hardware.move_forward(pca, 32768)
-            time.sleep(5)
-            hardware.stop_motors(pca)
+            with actuators.session('automation', 'motors', cancel=stop_automation_flag.set) as drive:
+                try:
+                    drive.call(lambda pca: hardware.move_forward(pca, 32768), info={'left': 1, 'right': 1})
+                    stop_automation_flag.wait(5)
+                finally:
+                    # A revoked session's channels belong to whoever took over
+                    if not drive.revoked:
+                        drive.call(hardware.stop_motors)
+            if stop_automation_flag.is_set():
+                break  # stopped or preempted while driving: do not take the arm (and the PCA9685 mode) back
             # 2. Servo arm action (safe sequence)
-            pca = hardware.setup_pca9685(channel=0, frequency=50)
-            hardware.reset_all_channels(pca)
-            hardware.smooth_move(pca, 9, 70, 20, hardware.servo_config[9]["delay"])
-            time.sleep(1)
-            hardware.smooth_move(pca, 9, 20, 70, hardware.servo_config[9]["delay"])
-            hardware.reset_all_channels(pca)
+            with actuators.session('automation', 'servos', cancel=stop_automation_flag.set) as arm:
+                try:
+                    arm.call(hardware.reset_all_channels)
+                    arm.call(lambda pca: hardware.set_servo_angle(pca, 9, 70))
+                    hardware.smooth_move(None, 9, 20, session=arm)
+                    time.sleep(1)
+                    hardware.smooth_move(None, 9, 70, session=arm)
+                finally:
+                    if not arm.revoked:
+                        arm.write_pwm({ch: 0 for ch in actuators.ARM_CHANNELS})
             time.sleep(1)
             # 3. Repeat or add more logic as needed
+    except actuators.Preempted as e:
+        print(f"[WARN] Automation stopped: {e}")
     finally:
-        pca = hardware.setup_pca9685(channel=0, frequency=1000)
-        hardware.stop_motors(pca)
-        pca = hardware.setup_pca9685(channel=0, frequency=50)
-        hardware.reset_all_channels(pca)
         set_status('idle')
         control_lock.release()
 
@@ -960,24 +1002,82 @@ def move_to_object():
     data = request.get_json()
     object_name = data.get('object')
     try:
-        # Run the arm movement in a background thread
-        threading.Thread(target=perform_object_sequence, args=(object_name,), daemon=True).start()
-        return jsonify({'status': 'started'})
+        # Queued on the arm sequence worker; poll /api/arm/jobs/<id> for progress
+        job = arm_sequences.submit(object_name)
+        return jsonify({'status': 'started', 'job': job})
+    except (KeyError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e).strip("'")}), 400
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# --- Arm Sequences (keyframe routines, teach and replay) ---
+@app.route('/api/arm/sequences')
+def api_arm_sequences():
+    return jsonify({'sequences': arm_sequences.available(), 'recording': arm_sequences.recording_status(),
+                    'stats': arm_sequences.get_stats()})
+
+@app.route('/api/arm/play', methods=['POST'])
+def api_arm_play():
+    data = request.get_json() or {}
+    try:
+        return jsonify({'status': 'queued', 'job': arm_sequences.submit(data.get('sequence'))})
+    except (KeyError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e).strip("'")}), 400
+
+@app.route('/api/arm/jobs')
+def api_arm_jobs():
+    return jsonify(arm_sequences.get_jobs())
+
+@app.route('/api/arm/jobs/<int:job_id>')
+def api_arm_job(job_id):
+    job = arm_sequences.get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/api/arm/cancel', methods=['POST'])
+def api_arm_cancel():
+    # {"job_id": n} cancels one job; no body cancels the running job and the queue
+    data = request.get_json(silent=True) or {}
+    return jsonify({'status': 'success', 'cancelled': arm_sequences.cancel(data.get('job_id'))})
+
+@app.route('/api/arm/record', methods=['POST'])
+def api_arm_record():
+    # {"action": "start", "name": ...}: following /servo_control moves become keyframes
+    # {"action": "keyframe", "targets": {"9": 60, ...}, "hold": 1.0}: add one explicitly
+    # {"action": "stop", "discard": false}: write arm_sequences/<name>.seq
+    data = request.get_json() or {}
+    action = data.get('action')
+    try:
+        if action == 'start':
+            arm_sequences.start_recording(data.get('name'))
+        elif action == 'keyframe':
+            targets = {int(ch): float(angle) for ch, angle in (data.get('targets') or {}).items()}
+            if not arm_sequences.record(targets, data.get('hold')):
+                raise ValueError('Not recording')
+        elif action == 'stop':
+            keyframes = arm_sequences.stop_recording(discard=bool(data.get('discard')))
+            return jsonify({'status': 'success', 'sequence': arm_sequences.dumps(keyframes)})
+        else:
+            return jsonify({'status': 'error', 'message': 'Unknown action'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'success', 'recording': arm_sequences.recording_status()})
+
 @app.route('/pump_on', methods=['POST'])
 def pump_on_route():
     try:
-        hardware.pump_on()
+        actuators.pump(True)
         return jsonify({'status': 'on'})
+    except actuators.Preempted as e:
+        return jsonify({'status': 'rejected', 'message': str(e)}), 409
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/pump_off', methods=['POST'])
 def pump_off_route():
     try:
-        hardware.pump_off()
+        actuators.pump(False)
         return jsonify({'status': 'off'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -992,9 +1092,16 @@ def api_pattern_circle():
     if pattern_thread and pattern_thread.is_alive():
         return jsonify({'status': 'Pattern already running'})
     pattern_stop_event.clear()
+    pattern_status.update(running=True, pattern='circle', segment=0, segments=0)
     def run_pattern():
-        from app import hardware
-        hardware.run_circle_pattern(lat, lng, radius, pattern_stop_event)
+        try:
+            with actuators.session('pattern', 'motors', cancel=pattern_stop_event.set, wait=False) as session:
+                hardware.run_circle_pattern(lat, lng, radius, pattern_stop_event, progress=pattern_status,
+                                            session=session)
+        except actuators.Preempted as e:
+            print(f"[WARN] Circle pattern stopped: {e}")
+        finally:
+            pattern_status['running'] = False
     pattern_thread = threading.Thread(target=run_pattern, daemon=True)
     pattern_thread.start()
     return jsonify({'status': 'Circle pattern started'})
@@ -1005,10 +1112,71 @@ def api_pattern_stop():
     pattern_stop_event.set()
     return jsonify({'status': 'Pattern stopped'})
 
+# --- Endpoints: Actuator Arbiter ---
+@app.route('/api/estop', methods=['POST'])
+def api_estop():
+    data = request.get_json(silent=True) or {}
+    action = data.get('action', 'stop')
+    if action == 'stop':
+        stop_automation_flag.set()
+        arm_sequences.cancel()
+        latency_ms = actuators.emergency_stop(data.get('reason') or 'emergency stop')
+        return jsonify({'status': 'stopped', 'latency_ms': latency_ms})
+    elif action == 'clear':
+        actuators.clear_estop()
+        return jsonify({'status': 'cleared'})
+    return jsonify({'status': 'error', 'message': 'Unknown action'}), 400
+
+@app.route('/api/actuators')
+def api_actuators():
+    return jsonify(actuators.get_stats())
+
+# --- Telemetry Push (Socket.IO) ---
+def _gps_telemetry():
+    gps = hardware.get_latest_gps()
+    return {'lat': gps.get('lat'), 'lng': gps.get('lng'), 'date': gps.get('date'),
+            'time': gps.get('time'), 'timestamp': gps.get('timestamp')}
+
+telemetry.register_source('gps', _gps_telemetry)
+telemetry.register_source('nav', lambda: dict(nav_status))
+telemetry.register_source('pattern', lambda: dict(pattern_status))
+telemetry.register_source('mission', mission_status)
+telemetry.register_source('ranging', lambda: {side: r['distance'] for side, r in ranging.latest().items()})
+telemetry.register_event_topic('samples')
+
+# --- Application Startup ---
+_services_started = False
+_services_lock = threading.Lock()
+
+def create_app():
+    """Initialize the database and start the background services (idempotent).
+
+    Importing this module only defines the routes; call this before serving.
+    """
+    global _services_started
+    with _services_lock:
+        if not _services_started:
+            _services_started = True
+            init_db()
+            # Start sensor acquisition and scheduler in background
+            w1temp.start()
+            actuators.start()
+            # Ultrasonic ranging with the obstacle guard on the actuator arbiter
+            ranging.start()
+            hardware.start_acquisition()
+            scheduler.start(run_scheduled_mission)
+            # Persist GPS fixes as they arrive from the GPS thread
+            gps_track.start()
+            telemetry.init(socketio)
+            # Open the camera and warm the detector before the first request
+            vision.start()
+    return app
+
 if __name__ == '__main__':
     try:
         import eventlet
         import eventlet.wsgi
+        create_app()
         socketio.run(app, host="127.0.0.1", port=5000, debug=True)
     except Exception as e:
         print(f"Error running server: {e}")
@@ -0,0 +1,196 @@
+"""Time-parameterized servo motion for the sampling arm (channels 9/10/11).
+
+A move plans one velocity profile per servo: trapezoidal (constant
+acceleration, cruise, deceleration), or an S-curve (minimum-jerk quintic)
+for smoother starts and stops. The speed limit comes from the old
+one-degree-per-``delay`` stepping in hardware.servo_config. By default the
+channels are synchronized so they all arrive together.
+
+A move is compiled into a tick table: at each tick of TICK_HZ (the servo
+frame rate) only the channels whose position changed. One loop plays it
+on absolute deadlines, so write latency and sleep overshoot do not add up
+over a move. Frames already due after a slow write are merged, and all
+changed channels go out in one write_pwm burst. Moves are serialized
+(see move_lock), so concurrent callers queue instead of writing over each
+other. Given an actuators session, the writes go through the actuator
+arbiter and a stop or higher-priority command ends the move (raises
+actuators.Preempted). arm_sequences.py compiles whole keyframe routines into the same
+tables.
+"""
+import math
+import threading
+import time
+
+from app import hardware
+
+TICK_HZ = 50.0            # PCA9685 servo frame rate: faster updates are never seen by the servo
+ACCEL_TIME_S = 0.15       # time to reach full speed from rest
+ANGLE_STEP_DEG = 1.0      # commanded angles are rounded to this, so a slow servo is not rewritten every tick
+DEFAULT_PROFILE = 'trapezoid'
+MIN_JERK_PEAK_V = 1.875   # peak velocity of the quintic s(tau) = 10tau^3 - 15tau^4 + 6tau^5, per unit d/T
+MIN_JERK_PEAK_A = 5.7735  # peak acceleration, per unit d/T^2
+
+move_lock = threading.Lock()
+stats = {'moves': 0, 'ticks': 0, 'late_ticks': 0, 'max_late_ms': 0.0, 'stopped': 0}
+
+
+def max_speed(channel):
+    """deg/s: the old smooth_move rate of one degree per servo_config delay."""
+    return 1.0 / hardware.servo_config[channel]['delay']
+
+
+class Profile:
+    """Position of one servo over time for a move from ``start`` to ``target`` (degrees)."""
+
+    def __init__(self, start, target, v_max, a_max, shape=DEFAULT_PROFILE):
+        if shape not in ('trapezoid', 'scurve'):
+            raise ValueError(f"Unknown motion profile: {shape}")
+        self.start = start
+        self.distance = abs(target - start)
+        self.sign = 1 if target >= start else -1
+        self.shape = shape
+        self.a = a_max
+        if shape == 'scurve':
+            d = self.distance
+            self.duration = max(MIN_JERK_PEAK_V * d / v_max, math.sqrt(MIN_JERK_PEAK_A * d / a_max)) if d else 0.0
+        elif self.distance < v_max * v_max / a_max:
+            self.v = math.sqrt(self.distance * a_max)  # triangular: never reaches v_max
+            self.duration = 2 * self.v / a_max
+        else:
+            self.v = v_max
+            self.duration = self.distance / v_max + v_max / a_max
+
+    def stretch(self, duration):
+        """Slow the profile down to take exactly ``duration`` seconds (for synchronized moves)."""
+        if duration <= self.duration or not self.distance:
+            return
+        if self.shape == 'trapezoid':
+            # Same acceleration, lower cruise speed: d = v*T - v^2/a
+            a, t = self.a, duration
+            self.v = (a * t - math.sqrt(max(0.0, a * a * t * t - 4 * a * self.distance))) / 2
+        self.duration = duration
+
+    def position(self, t):
+        if t >= self.duration:
+            return self.start + self.sign * self.distance
+        if t <= 0:
+            return self.start
+        if self.shape == 'scurve':
+            tau = t / self.duration
+            s = self.distance * tau ** 3 * (10 - 15 * tau + 6 * tau * tau)
+        else:
+            ta = self.v / self.a
+            if t < ta:
+                s = 0.5 * self.a * t * t
+            elif t < self.duration - ta:
+                s = 0.5 * self.a * ta * ta + self.v * (t - ta)
+            else:
+                s = self.distance - 0.5 * self.a * (self.duration - t) ** 2
+        return self.start + self.sign * s
+
+
+def plan(targets, start=None, shape=DEFAULT_PROFILE, synchronized=True, speed=None):
+    """Profiles for ``targets`` ({channel: angle}, clamped to servo_config limits).
+
+    ``start`` defaults to hardware.current_angles; ``speed`` ({channel: deg/s})
+    overrides the configured limit. Returns (profiles, duration).
+    """
+    start = start or hardware.current_angles
+    speed = speed or {}
+    profiles = {}
+    for channel, angle in targets.items():
+        cfg = hardware.servo_config[channel]
+        target = max(cfg['min'], min(angle, cfg['max']))
+        v_max = speed.get(channel) or max_speed(channel)
+        profiles[channel] = Profile(start[channel], target, v_max, v_max / ACCEL_TIME_S, shape)
+    duration = max((p.duration for p in profiles.values()), default=0.0)
+    if synchronized:
+        for profile in profiles.values():
+            profile.stretch(duration)
+    return profiles, duration
+
+
+def _angle(profile, t):
+    return round(profile.position(t) / ANGLE_STEP_DEG) * ANGLE_STEP_DEG
+
+
+def compile_profiles(profiles, duration, first_tick=0):
+    """Tick table for planned profiles: [(tick, {channel: duty}, {channel: angle})].
+
+    Only channels whose duty changes appear in a frame (all of them in the
+    first), and ticks where nothing changes are left out.
+    """
+    frames = []
+    previous = {}
+    last = max(1, math.ceil(duration * TICK_HZ))
+    for tick in range(last + 1):
+        t = min(tick / TICK_HZ, duration)
+        angles = {ch: _angle(p, t) for ch, p in profiles.items()}
+        duties = {ch: hardware.angle_to_pwm(a) for ch, a in angles.items()}
+        changed = {ch: duty for ch, duty in duties.items() if previous.get(ch) != duty}
+        if changed:
+            frames.append((first_tick + tick, changed, {ch: angles[ch] for ch in changed}))
+            previous.update(changed)
+    return frames
+
+
+def play(pca, frames, stop_event=None, on_tick=None, session=None):
+    """Write a tick table on absolute deadlines at TICK_HZ.
+
+    Frames that are already due when the loop gets to them (after a slow
+    write) are merged into one write. ``on_tick(tick)`` is called after every
+    write. Returns True if the table ran to the end, False if stopped.
+    With an actuators ``session``, frames are written through it (``pca`` is unused).
+    """
+    write = session.write_pwm if session is not None else lambda duties: hardware.write_pwm(pca, duties)
+    period = 1.0 / TICK_HZ
+    t0 = time.monotonic()
+    i = 0
+    while i < len(frames):
+        if stop_event is not None and stop_event.is_set():
+            stats['stopped'] += 1
+            return False
+        tick = frames[i][0]
+        delay = t0 + tick * period - time.monotonic()
+        if delay > 0:
+            # Sleep in slices of a frame so a stop request is seen within one period
+            if stop_event is not None:
+                stop_event.wait(min(delay, period))
+            else:
+                time.sleep(delay)
+            continue
+        if -delay > period:
+            stats['late_ticks'] += 1
+            stats['max_late_ms'] = max(stats['max_late_ms'], -delay * 1000)
+        duties, angles = {}, {}
+        now_tick = (time.monotonic() - t0) / period
+        while i < len(frames) and (not duties or frames[i][0] <= now_tick):
+            duties.update(frames[i][1])
+            angles.update(frames[i][2])
+            i += 1
+        write(duties)
+        for channel, angle in angles.items():
+            if channel in hardware.current_angles:
+                hardware.current_angles[channel] = round(angle)
+        stats['ticks'] += 1
+        if on_tick:
+            on_tick(frames[i - 1][0])
+    return True
+
+
+def execute(pca, profiles, duration, stop_event=None, session=None):
+    """Run planned profiles to completion (or ``stop_event``). Returns the final angles."""
+    play(pca, compile_profiles(profiles, duration), stop_event, session=session)
+    return {ch: hardware.current_angles[ch] for ch in profiles}
+
+
+def move(pca, targets, shape=DEFAULT_PROFILE, synchronized=True, speed=None, stop_event=None, session=None):
+    """Plan and run one move of several servos; concurrent moves wait their turn."""
+    with move_lock:
+        profiles, duration = plan(targets, shape=shape, synchronized=synchronized, speed=speed)
+        stats['moves'] += 1
+        return execute(pca, profiles, duration, stop_event, session)
+
+
+def get_stats():
+    return dict(stats)
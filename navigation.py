@@ -0,0 +1,217 @@
+"""Closed-loop GPS/compass navigation to a target point.
+
+NavigationController runs at a fixed control rate. Between ticks it waits on
+the GPS fix condition, so it reacts as soon as a fix arrives. The rover
+position is projected onto a local east/north plane centred on the target
+(cached per target, no haversine per tick), and a PID on the heading error
+sets a differential left/right wheel speed, instead of bang-bang
+rotate/forward commands. Runs are bounded by a time and distance budget
+derived from the starting distance. Without an explicit ``pca`` the wheels
+are driven through an actuators session, so a stop, an obstacle or an
+operator command preempts the run.
+"""
+import functools
+import math
+import threading
+import time
+
+from app import actuators
+from app import hardware
+from app import spatial
+
+MIN_FORWARD = 0.3  # fraction of forward_pwm kept when creeping up on the target
+
+
+class LocalFrame:
+    """Equirectangular east/north projection around an origin (accurate to well under 1% within a few km)."""
+
+    def __init__(self, lat, lng):
+        self.lat = lat
+        self.lng = lng
+        self._m_per_deg_lat = spatial.M_PER_DEG_LAT
+        self._m_per_deg_lng = self._m_per_deg_lat * math.cos(math.radians(lat))
+
+    def to_local(self, lat, lng):
+        """(east, north) in metres from the origin."""
+        return (lng - self.lng) * self._m_per_deg_lng, (lat - self.lat) * self._m_per_deg_lat
+
+    def distance_bearing(self, lat, lng):
+        """Distance (m) and bearing (deg, 0 = north) from (lat, lng) to the origin."""
+        east, north = self.to_local(lat, lng)
+        return math.hypot(east, north), (math.degrees(math.atan2(-east, -north)) + 360) % 360
+
+
+@functools.lru_cache(maxsize=32)
+def local_frame(lat, lng):
+    return LocalFrame(lat, lng)
+
+
+def heading_error(bearing, heading):
+    """Signed difference bearing - heading in (-180, 180]; positive = target is to the right."""
+    err = (bearing - heading + 360) % 360
+    return err - 360 if err > 180 else err
+
+
+class PID:
+    def __init__(self, kp, ki, kd, limit=1.0):
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.limit = limit
+        self.reset()
+
+    def reset(self):
+        self._integral = 0.0
+        self._previous = None
+
+    def update(self, error, dt):
+        if dt > 0:
+            self._integral += error * dt
+            if self.ki:
+                # anti-windup: the integral term alone never exceeds the output limit
+                bound = self.limit / abs(self.ki)
+                self._integral = max(-bound, min(self._integral, bound))
+        derivative = 0.0 if self._previous is None or dt <= 0 else (error - self._previous) / dt
+        self._previous = error
+        out = self.kp * error + self.ki * self._integral + self.kd * derivative
+        return max(-self.limit, min(out, self.limit))
+
+
+class NavigationController:
+    """Drive to a lat/lng with proportional differential steering.
+
+    ``status`` (a dict, e.g. main.nav_status) is updated every tick with
+    running/target/last so the dashboard telemetry keeps working.
+    """
+
+    def __init__(self, pca=None, compass=None, rate_hz=10.0, forward_pwm=40000,
+                 arrive_radius=1.5, slow_radius=5.0, kp=1 / 45.0, ki=0.0, kd=1 / 300.0,
+                 gps_timeout_s=3.0, compass_timeout_s=1.0, status=None):
+        self.pca = pca
+        self.compass = compass
+        self.period = 1.0 / rate_hz
+        self.forward_pwm = forward_pwm
+        self.arrive_radius = arrive_radius
+        self.slow_radius = slow_radius
+        self.steering = PID(kp, ki, kd)
+        self.gps_timeout_s = gps_timeout_s
+        self.compass_timeout_s = compass_timeout_s
+        self.status = status if status is not None else {}
+        self._stop = threading.Event()
+        self._session = None
+        self.stats = {'ticks': 0, 'gps_wakeups': 0, 'motor_updates': 0}
+
+    def stop(self):
+        self._stop.set()
+
+    def budget(self, distance):
+        """(max seconds, max metres travelled) for a run starting ``distance`` metres away."""
+        return 60.0 + distance / 0.1, 20.0 + 3.0 * distance
+
+    def _heading(self):
+        data = self.compass.get_compass_data()
+        if data and data.get('heading') is not None:
+            return data['heading'], data
+        return None, data
+
+    def _drive(self, left, right):
+        self.stats['motor_updates'] += 1
+        if self._session is not None:
+            actuators.drive(left, right, self.forward_pwm, source='nav', session=self._session)
+        else:
+            hardware.set_wheel_speeds(self.pca, left, right, self.forward_pwm)
+
+    def _stop_motors(self):
+        if self._session is None:
+            if self.pca is not None:
+                hardware.stop_motors(self.pca)
+            return
+        session, self._session = self._session, None
+        try:
+            if not session.revoked:
+                session.call(hardware.stop_motors)
+        finally:
+            session.close()
+
+    def run(self, lat, lng, max_time_s=None, max_distance_m=None):
+        """Navigate until arrival, stop(), a sensor timeout or the budget runs out. Returns the reason."""
+        if self.compass is None:
+            from app.compass import Compass  # talks to the I2C compass: imported on first navigation
+            self.compass = Compass()
+        self._stop.clear()
+        self.steering.reset()
+        frame = local_frame(lat, lng)
+        self.status.update(running=True, target={'lat': lat, 'lng': lng})
+        try:
+            if self.pca is None:
+                self._session = actuators.session('nav', 'motors', cancel=self.stop, wait=False)
+            reason = self._loop(frame, max_time_s, max_distance_m)
+            if self._session is not None and self._session.revoked:
+                reason = f'preempted: {self._session.revoked}'
+        except actuators.Vetoed as e:
+            reason = f'obstacle: {e}'
+        except actuators.Preempted as e:
+            reason = f'preempted: {e}'
+        except Exception as e:
+            reason = f'error: {e}'
+        finally:
+            try:
+                self._stop_motors()
+            finally:
+                self.status['running'] = False
+        self.status['last'] = reason
+        return reason
+
+    def _loop(self, frame, max_time_s, max_distance_m):
+        start = time.monotonic()
+        seq = hardware.get_gps_seq()
+        gps = hardware.get_latest_gps()
+        gps_at = start if gps.get('lat') is not None else None
+        compass_at = start
+        position = None
+        travelled = 0.0
+        budget = None
+        last_tick = next_tick = start
+        while not self._stop.is_set():
+            # Sleep until the next tick, or less if a GPS fix arrives first
+            new_seq, fix = hardware.wait_for_gps_fix(seq, timeout=max(0.0, next_tick - time.monotonic()))
+            now = time.monotonic()
+            next_tick = max(next_tick + self.period, now)
+            if fix is not None:
+                seq, gps, gps_at = new_seq, fix, now
+                self.stats['gps_wakeups'] += 1
+            if gps_at is None or now - gps_at > self.gps_timeout_s:
+                return 'no_gps'
+            heading, comp = self._heading()
+            if heading is None:
+                if now - compass_at > self.compass_timeout_s:
+                    return 'no_compass'
+                continue
+            compass_at = now
+            dt, last_tick = now - last_tick, now
+            self.stats['ticks'] += 1
+
+            local = frame.to_local(gps['lat'], gps['lng'])
+            if position is not None:
+                travelled += math.hypot(local[0] - position[0], local[1] - position[1])
+            position = local
+            dist, brng = frame.distance_bearing(gps['lat'], gps['lng'])
+            if budget is None:
+                budget = self.budget(dist)
+                max_time_s = max_time_s or budget[0]
+                max_distance_m = max_distance_m or budget[1]
+            if dist < self.arrive_radius:
+                return 'arrived'
+            if now - start > max_time_s:
+                return 'time_budget'
+            if travelled > max_distance_m:
+                return 'distance_budget'
+
+            err = heading_error(brng, heading)
+            turn = self.steering.update(err, dt)
+            # Drive forward only when roughly facing the target, slow down close to it
+            forward = max(0.0, math.cos(math.radians(err)))
+            forward *= max(MIN_FORWARD, min(1.0, dist / self.slow_radius))
+            self._drive(forward + turn, forward - turn)
+            self.status['last'] = {'gps': gps, 'compass': comp, 'dist': dist, 'bearing': brng,
+                                   'heading': heading, 'err': err, 'turn': turn, 'forward': forward,
+                                   'travelled': travelled}
+        return 'stopped'
@@ -0,0 +1,142 @@
+"""Mission route planning over sampling points.
+
+plan() orders a set of waypoints into the shortest tour it can find,
+leaving from and returning to the docking station when one is given:
+exact (Held-Karp dynamic programming) for up to EXACT_MAX_POINTS points,
+otherwise nearest-neighbour followed by 2-opt improvement. Distances come
+from a cached pairwise haversine table, so re-planning the same sites is
+cheap. A missing start or end is modelled as a free endpoint (a virtual
+node zero metres from everything).
+"""
+import datetime
+import functools
+import itertools
+
+from app.spatial import haversine_m
+
+EXACT_MAX_POINTS = 10
+CRUISE_SPEED_MPS = 0.3     # average over-ground speed including turns
+SAMPLE_DWELL_S = 120.0     # time spent at each point (arm, sensors, logging)
+
+stats = {'plans': 0, 'exact': 0, 'heuristic': 0}
+
+
+@functools.lru_cache(maxsize=4096)
+def _distance(a, b):
+    return haversine_m(a[0], a[1], b[0], b[1])
+
+
+def distance_matrix(coords):
+    """Pairwise metres between (lat, lng) tuples; pairs are cached across calls.
+
+    A ``None`` entry is a free endpoint, zero metres from everything.
+    """
+    n = len(coords)
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            if coords[i] is not None and coords[j] is not None:
+                a, b = sorted((coords[i], coords[j]))
+                matrix[i][j] = matrix[j][i] = _distance(a, b)
+    return matrix
+
+
+def _held_karp(dist, start, end, nodes):
+    """Exact shortest path start -> all nodes -> end."""
+    best = {(1 << i, i): (dist[start][node], None) for i, node in enumerate(nodes)}
+    for size in range(2, len(nodes) + 1):
+        for subset in itertools.combinations(range(len(nodes)), size):
+            mask = sum(1 << i for i in subset)
+            for last in subset:
+                prev_mask = mask & ~(1 << last)
+                best[(mask, last)] = min(
+                    (best[(prev_mask, k)][0] + dist[nodes[k]][nodes[last]], k)
+                    for k in subset if k != last)
+    full = (1 << len(nodes)) - 1
+    cost, last = min((best[(full, k)][0] + dist[nodes[k]][end], k) for k in range(len(nodes)))
+    order, mask = [], full
+    while last is not None:
+        order.append(nodes[last])
+        mask, last = mask & ~(1 << last), best[(mask, last)][1]
+    return [start] + order[::-1] + [end]
+
+
+def _nearest_neighbour(dist, start, end, nodes):
+    order, remaining = [start], set(nodes)
+    while remaining:
+        nxt = min(remaining, key=lambda node: dist[order[-1]][node])
+        order.append(nxt)
+        remaining.discard(nxt)
+    return order + [end]
+
+
+def _two_opt(order, dist):
+    """Reverse inner segments while that shortens the path (endpoints stay fixed)."""
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(order) - 2):
+            for j in range(i + 1, len(order) - 1):
+                a, b, c, d = order[i - 1], order[i], order[j], order[j + 1]
+                if dist[a][c] + dist[b][d] < dist[a][b] + dist[c][d] - 1e-9:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+    return order
+
+
+def plan(points, start=None, end=None, speed_mps=CRUISE_SPEED_MPS, dwell_s=SAMPLE_DWELL_S, depart=None):
+    """Order ``points`` (dicts with 'point', 'lat', 'lng') into a route.
+
+    ``start``/``end`` are optional {'lat', 'lng'} dicts (typically the dock).
+    Returns {'waypoints': [...], 'order': [...], 'total_m', 'total_s', 'method'};
+    each waypoint carries its leg distance and cumulative ETA.
+    """
+    stats['plans'] += 1
+    stops = [dict(p) for p in points if p.get('lat') is not None and p.get('lng') is not None]
+    nodes = list(range(len(stops)))
+    coords = [(p['lat'], p['lng']) for p in stops]
+    endpoints = []
+    for label, where in (('start', start), ('end', end)):
+        if where and where.get('lat') is not None and where.get('lng') is not None:
+            coords.append((where['lat'], where['lng']))
+            endpoints.append(dict(where, point=where.get('point', label)))
+        else:
+            coords.append(None)  # free endpoint
+            endpoints.append(None)
+    dist = distance_matrix(coords)
+    s, e = len(stops), len(stops) + 1
+
+    if not stops:
+        order, method = [s, e], 'empty'
+    elif len(stops) <= EXACT_MAX_POINTS:
+        order, method = _held_karp(dist, s, e, nodes), 'exact'
+        stats['exact'] += 1
+    else:
+        order = _two_opt(_nearest_neighbour(dist, s, e, nodes), dist)
+        method = 'nn+2opt'
+        stats['heuristic'] += 1
+
+    by_index = stops + endpoints
+    waypoints, elapsed, total_m, previous = [], 0.0, 0.0, None
+    for index in order:
+        stop = by_index[index]
+        if stop is None:
+            continue  # free endpoint: nothing to drive to
+        leg = dist[previous][index] if previous is not None else 0.0
+        total_m += leg
+        elapsed += leg / speed_mps
+        waypoint = dict(stop, leg_m=round(leg, 1), eta_s=round(elapsed, 1))
+        if depart:
+            waypoint['eta'] = (depart + datetime.timedelta(seconds=elapsed)).isoformat()
+        waypoints.append(waypoint)
+        if index < len(stops):
+            elapsed += dwell_s
+        previous = index
+    return {
+        'waypoints': waypoints,
+        'order': [by_index[i]['point'] for i in order if i < len(stops)],
+        'total_m': round(total_m, 1),
+        'total_s': round(elapsed, 1),
+        'method': method,
+    }
+
@@ -0,0 +1,187 @@
+"""Ultrasonic ranging service and obstacle guard.
+
+One background thread pings the front and back HC-SR04 sensors in turn,
+never both at once, so neither hears the other's echo. Each sensor is
+pinged RATE_HZ times a second. A median over MEDIAN_WINDOW samples drops
+single spikes: a missed echo reads as max range, a stray echo as very
+close. Every filtered reading goes to the listeners (add_listener) and is
+kept for latest() and hardware.get_ultrasonic().
+
+The obstacle guard is one of those listeners. When a side's filtered
+distance drops below STOP_DISTANCE_M while the rover drives towards it,
+the guard stops the wheels through the actuator arbiter. It does this on
+the ranging thread, right after that reading, so the stop lands within
+one sampling period. Until the distance is back above
+STOP_DISTANCE_M + CLEAR_MARGIN_M, drive commands towards that side are
+vetoed. Turning in place is always allowed. Reaction times, from the ping
+to the motors stopped, are in get_stats().
+"""
+import collections
+import datetime
+import os
+import statistics
+import threading
+import time
+
+from app import actuators
+from app import backend
+
+SENSORS = {'front': {'trigger': 5, 'echo': 6}, 'back': {'trigger': 13, 'echo': 19}}
+TOWARDS = {'front': 1, 'back': -1}  # sign of (left + right) wheel speed that drives towards a side
+MAX_DISTANCE_M = 4.0
+RATE_HZ = float(os.environ.get('ROVER_RANGING_HZ', '10'))  # pings per sensor per second
+MIN_SLOT_S = 0.04          # longest HC-SR04 echo (~38 ms) before the other sensor may trigger
+MEDIAN_WINDOW = 3
+STOP_DISTANCE_M = float(os.environ.get('ROVER_STOP_DISTANCE_M', '0.35'))
+CLEAR_MARGIN_M = 0.1
+
+_cond = threading.Condition()
+_windows = {side: collections.deque(maxlen=MEDIAN_WINDOW) for side in SENSORS}
+_misses = {side: 0 for side in SENSORS}
+_latest = {}               # side -> last filtered reading
+_listeners = []            # callback(reading), called from the ranging thread
+_blocked = {}              # side -> filtered distance while within STOP_DISTANCE_M
+_thread = None
+stats = {'pings': 0, 'errors': 0, 'late_slots': 0}
+guard_stats = {'stops': 0, 'vetoes': 0, 'blocked': 0}
+reaction = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': None}
+
+
+def add_listener(callback):
+    """Register callback(reading) to be called from the ranging thread on every filtered reading."""
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+def remove_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def _measure(side):
+    cfg = SENSORS[side]
+    pinged = time.monotonic()
+    try:
+        raw = backend.ping(cfg['trigger'], cfg['echo'], MAX_DISTANCE_M)
+        error = None if raw is not None else 'no echo'
+    except Exception as e:
+        raw, error = None, str(e)
+    with _cond:
+        stats['pings'] += 1
+        window = _windows[side]
+        if error:
+            stats['errors'] += 1
+            _misses[side] += 1
+            if _misses[side] >= MEDIAN_WINDOW:
+                window.clear()  # too old to filter with: report no distance
+        else:
+            _misses[side] = 0
+            window.append(raw)
+        reading = {'side': side, 'distance': statistics.median(window) if window else None, 'raw': raw,
+                   'timestamp': datetime.datetime.now().isoformat(), 'monotonic': pinged, 'error': error}
+        _latest[side] = reading
+        _cond.notify_all()
+    for callback in list(_listeners):
+        try:
+            callback(reading)
+        except Exception as e:
+            print(f"[WARN] Ranging listener error: {e}")
+
+
+def _ranging_loop():
+    sides = list(SENSORS)
+    deadline = time.monotonic()
+    while True:
+        slot = max(MIN_SLOT_S, 1.0 / (RATE_HZ * len(sides)))
+        for side in sides:
+            _measure(side)
+            deadline += slot
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                stats['late_slots'] += 1
+                deadline = time.monotonic()
+
+
+def start(guard=True):
+    """Start the ranging thread and (by default) the obstacle guard (idempotent)."""
+    global _thread
+    if guard:
+        add_listener(_guard)
+        actuators.set_motion_veto(_veto)
+    with _cond:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_ranging_loop, daemon=True, name='ranging')
+            _thread.start()
+
+
+def _public(reading, now):
+    return {'distance': reading['distance'], 'raw': reading['raw'], 'timestamp': reading['timestamp'],
+            'age': now - reading['monotonic'], 'error': reading['error']}
+
+
+def latest(timeout=None):
+    """Latest filtered reading of every sensor: {side: {distance, raw, timestamp, age, error}}.
+
+    Starts the service if needed and waits up to ``timeout`` for the first readings.
+    """
+    start(guard=False)
+    deadline = time.monotonic() + (timeout or 0.0)
+    with _cond:
+        while len(_latest) < len(SENSORS) and time.monotonic() < deadline:
+            _cond.wait(deadline - time.monotonic())
+        now = time.monotonic()
+        readings = {side: _public(_latest[side], now) for side in _latest}
+    for side in SENSORS:
+        readings.setdefault(side, {'distance': None, 'raw': None, 'timestamp': None, 'age': None,
+                                   'error': 'No reading yet'})
+    return readings
+
+
+# === Obstacle guard ===
+def _towards(side, left, right):
+    return (left + right) * TOWARDS[side] > 0
+
+
+def _guard(reading):
+    side, distance = reading['side'], reading['distance']
+    if distance is None:
+        return
+    with _cond:
+        if distance < STOP_DISTANCE_M:
+            if side not in _blocked:
+                guard_stats['blocked'] += 1
+            _blocked[side] = distance
+        elif side in _blocked and distance > STOP_DISTANCE_M + CLEAR_MARGIN_M:
+            del _blocked[side]
+        if side not in _blocked:
+            return
+    if _towards(side, *actuators.wheel_directions()):
+        actuators.obstacle_stop(f'obstacle {distance:.2f} m {side}')
+        ms = (time.monotonic() - reading['monotonic']) * 1000
+        with _cond:
+            guard_stats['stops'] += 1
+            reaction['count'] += 1
+            reaction['total_ms'] += ms
+            reaction['max_ms'] = max(reaction['max_ms'], ms)
+            reaction['last_ms'] = ms
+        print(f"[WARN] Obstacle {distance:.2f} m {side}: motors stopped in {ms:.1f} ms")
+
+
+def _veto(info):
+    """actuators motion veto: refuse drive commands towards a blocked side."""
+    with _cond:
+        for side, distance in _blocked.items():
+            if _towards(side, info['left'], info['right']):
+                guard_stats['vetoes'] += 1
+                return f'obstacle {distance:.2f} m {side}'
+    return None
+
+
+def get_stats():
+    with _cond:
+        return dict(stats, guard=dict(guard_stats), blocked=dict(_blocked), rate_hz=RATE_HZ,
+                    stop_distance_m=STOP_DISTANCE_M,
+                    reaction_ms=dict(reaction, mean_ms=reaction['total_ms'] / reaction['count'])
+                    if reaction['count'] else dict(reaction))
@@ -0,0 +1,271 @@
+"""Mission scheduler: a heap of next-due times instead of per-minute polling.
+
+Schedules are loaded from the ``schedules`` table once (and again whenever
+save_schedule calls notify_changed()). Each one recurs weekly on ``day`` at
+``time`` (HH:MM, local time); a ``week`` of 1-5 restricts it to that week of
+the month (days 1-7 are week 1), empty/0 means every week. The worker thread
+sleeps until the earliest due time, runs everything due at that moment as a
+single mission, records the outcome in ``schedule_runs`` and re-arms each
+schedule for its next occurrence.
+
+Runs that were missed, because the rover was off or a previous mission
+overran the slot, are handled by MISSED_POLICY:
+
+* ``catch_up``: run once as soon as possible if missed by less than
+  CATCHUP_MAX_AGE_S, recording any older occurrences as missed.
+* ``skip``: record them as missed and wait for the next occurrence.
+"""
+import datetime
+import heapq
+import os
+import threading
+
+from app import db
+
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+MISSED_POLICY = os.environ.get('ROVER_MISSED_RUNS', 'catch_up')
+CATCHUP_MAX_AGE_S = 6 * 3600.0
+LATE_TOLERANCE_S = 60.0   # a run started this late still counts as on time
+MAX_SLEEP_S = 300.0       # re-check the wall clock at least this often (NTP steps on boot)
+HISTORY_LIMIT = 100
+SEARCH_DAYS = 7 * 16      # a 5th-week weekday can be three months away
+
+_cond = threading.Condition()
+_heap = []                # (due datetime, point)
+_schedules = {}           # point -> schedule dict
+_changed = True
+_running = None           # {'points': [...], 'due': datetime, 'started': datetime} while a mission runs
+_thread = None
+stats = {'loads': 0, 'wakeups': 0, 'missions': 0, 'runs': 0, 'missed': 0, 'caught_up': 0, 'errors': 0}
+
+
+def init_schema(c):
+    """Create the execution history table. ``c`` is an open connection/cursor."""
+    c.execute('''CREATE TABLE IF NOT EXISTS schedule_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        point TEXT,
+        due TEXT,
+        started TEXT,
+        finished TEXT,
+        status TEXT,
+        detail TEXT
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_schedule_runs_point_due ON schedule_runs (point, due)')
+
+
+def _parse(row):
+    point, day, at, pattern, radius, lat, lng, week = row
+    try:
+        weekday = DAYS.index(str(day).strip().capitalize())
+        hour, minute = (int(part) for part in str(at).split(':')[:2])
+        week = int(week) if week not in (None, '') else 0
+    except (ValueError, TypeError):
+        print(f"[WARN] Ignoring schedule for {point}: bad day/time/week {day!r} {at!r} {week!r}")
+        return None
+    if not 0 <= hour < 24 or not 0 <= minute < 60 or not 0 <= week <= 5:
+        print(f"[WARN] Ignoring schedule for {point}: out of range {day!r} {at!r} week={week}")
+        return None
+    return {'point': point, 'weekday': weekday, 'hour': hour, 'minute': minute, 'week': week,
+            'pattern': pattern, 'radius': radius, 'lat': lat, 'lng': lng}
+
+
+def next_occurrence(schedule, after):
+    """The first time strictly after ``after`` (naive local datetime) that ``schedule`` is due."""
+    day = after.date()
+    for offset in range(SEARCH_DAYS):
+        candidate = day + datetime.timedelta(days=offset)
+        if candidate.weekday() != schedule['weekday']:
+            continue
+        if schedule['week'] and (candidate.day - 1) // 7 + 1 != schedule['week']:
+            continue
+        due = datetime.datetime.combine(candidate, datetime.time(schedule['hour'], schedule['minute']))
+        if due > after:
+            return due
+    return None
+
+
+def previous_occurrence(schedule, before):
+    """The last time at or before ``before`` that ``schedule`` was due."""
+    day = before.date()
+    for offset in range(SEARCH_DAYS):
+        candidate = day - datetime.timedelta(days=offset)
+        if candidate.weekday() != schedule['weekday']:
+            continue
+        if schedule['week'] and (candidate.day - 1) // 7 + 1 != schedule['week']:
+            continue
+        due = datetime.datetime.combine(candidate, datetime.time(schedule['hour'], schedule['minute']))
+        if due <= before:
+            return due
+    return None
+
+
+def _last_runs():
+    rows = db.query('SELECT point, MAX(due) FROM schedule_runs GROUP BY point')
+    return {point: datetime.datetime.fromisoformat(due) for point, due in rows if due}
+
+
+def _record(point, due, status, started=None, finished=None, detail=None):
+    db.execute('INSERT INTO schedule_runs (point, due, started, finished, status, detail) VALUES (?, ?, ?, ?, ?, ?)',
+               (point, due.isoformat(timespec='minutes'), started and started.isoformat(),
+                finished and finished.isoformat(), status, detail))
+
+
+def _occurrences(schedule, first, last):
+    """Every due time of ``schedule`` from ``first`` up to and including ``last``."""
+    due = first
+    while due is not None and due <= last:
+        yield due
+        due = next_occurrence(schedule, due)
+
+
+def _arm(schedule, last_due, now):
+    """Push the next run of ``schedule`` after ``last_due``, applying MISSED_POLICY to overdue slots."""
+    due = next_occurrence(schedule, last_due)
+    if due is None:
+        return
+    if (now - due).total_seconds() > LATE_TOLERANCE_S:
+        latest = previous_occurrence(schedule, now)
+        missed = list(_occurrences(schedule, due, latest))
+        if MISSED_POLICY == 'catch_up' and (now - latest).total_seconds() <= CATCHUP_MAX_AGE_S:
+            missed.remove(latest)
+            detail = f'superseded by {latest.isoformat()}'
+            stats['caught_up'] += 1
+            due = latest
+        else:
+            detail = MISSED_POLICY
+            due = next_occurrence(schedule, now)
+        for slot in missed:
+            _record(schedule['point'], slot, 'missed', detail=detail)
+            stats['missed'] += 1
+    if due is not None:
+        heapq.heappush(_heap, (due, schedule['point']))
+
+
+def _load(now):
+    """Rebuild the heap from the schedules table. Called with _cond held."""
+    stats['loads'] += 1
+    rows = db.query('SELECT point, day, time, pattern, radius, lat, lng, week FROM schedules')
+    last_runs = _last_runs()
+    _schedules.clear()
+    _heap.clear()
+    for row in rows:
+        schedule = _parse(row)
+        if schedule is None:
+            continue
+        _schedules[schedule['point']] = schedule
+        last = last_runs.get(schedule['point'])
+        if last is None or (_running and schedule['point'] in _running['points']):
+            # New schedule (or one that is running now): start from its next slot
+            after = now - datetime.timedelta(seconds=LATE_TOLERANCE_S) if last is None else now
+            due = next_occurrence(schedule, after)
+            if due is not None:
+                heapq.heappush(_heap, (due, schedule['point']))
+        else:
+            _arm(schedule, last, now)
+
+
+def notify_changed():
+    """Reload the schedules before the next wakeup (call after editing the schedules table)."""
+    global _changed
+    with _cond:
+        _changed = True
+        _cond.notify_all()
+
+
+def _take_due():
+    """Block until something is due; return (due, [schedules]) for the earliest due time."""
+    global _changed
+    with _cond:
+        while True:
+            now = datetime.datetime.now()
+            if _changed:
+                _changed = False
+                _load(now)
+            if _heap:
+                due = _heap[0][0]
+                wait = (due - now).total_seconds()
+                if wait <= 0:
+                    batch = []
+                    while _heap and _heap[0][0] == due:
+                        _, point = heapq.heappop(_heap)
+                        if point in _schedules:
+                            batch.append(_schedules[point])
+                    return due, batch
+            else:
+                wait = MAX_SLEEP_S
+            _cond.wait(timeout=min(wait, MAX_SLEEP_S))
+            stats['wakeups'] += 1
+
+
+def _worker(run_mission):
+    global _running
+    while True:
+        due, batch = _take_due()
+        if not batch:
+            continue
+        started = datetime.datetime.now()
+        points = [schedule['point'] for schedule in batch]
+        with _cond:
+            _running = {'points': points, 'due': due, 'started': started}
+        stats['missions'] += 1
+        try:
+            results = run_mission(batch, due) or {}
+        except Exception as e:
+            print(f"[ERROR] Scheduled mission {points} failed: {e}")
+            results = {point: ('error', str(e)) for point in points}
+        finished = datetime.datetime.now()
+        for schedule in batch:
+            status, detail = results.get(schedule['point'], ('ok', None))
+            stats['runs'] += 1
+            stats['errors'] += status == 'error'
+            try:
+                _record(schedule['point'], due, status, started, finished, detail)
+            except Exception as e:
+                print(f"[ERROR] Could not record schedule run for {schedule['point']}: {e}")
+        with _cond:
+            _running = None
+            now = datetime.datetime.now()
+            for schedule in batch:
+                if _schedules.get(schedule['point']) is schedule:
+                    _arm(schedule, due, now)
+
+
+def start(run_mission):
+    """Start the scheduler thread (idempotent).
+
+    ``run_mission(schedules, due)`` is called with the schedule dicts due at
+    ``due`` and may return {point: (status, detail)}; by default every point
+    is recorded as 'ok', or as 'error' if it raises.
+    """
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=_worker, args=(run_mission,), daemon=True, name='scheduler')
+        _thread.start()
+
+
+def upcoming(limit=20):
+    """The next due time of every schedule, soonest first."""
+    with _cond:
+        items = sorted(_heap)[:limit]
+        running = None
+        if _running:
+            running = dict(_running, due=_running['due'].isoformat(), started=_running['started'].isoformat())
+    return {'running': running,
+            'upcoming': [{'point': point, 'due': due.isoformat()} for due, point in items],
+            'policy': MISSED_POLICY}
+
+
+def history(point=None, limit=HISTORY_LIMIT):
+    """Recorded runs (including missed ones), newest first."""
+    sql = 'SELECT id, point, due, started, finished, status, detail FROM schedule_runs'
+    params = ()
+    if point:
+        sql += ' WHERE point=?'
+        params = (point,)
+    rows = db.query(sql + ' ORDER BY due DESC, id DESC LIMIT ?', params + (limit,))
+    return [dict(zip(('id', 'point', 'due', 'started', 'finished', 'status', 'detail'), row)) for row in rows]
+
+
+def get_stats():
+    with _cond:
+        return dict(stats, scheduled=len(_heap))
@@ -0,0 +1,730 @@
+"""Simulated rover hardware for running and benchmarking the server off-Pi.
+
+Selected with ``ROVER_BACKEND=sim`` (see backend.py). Provides drop-in
+replacements for everything hardware.py takes from the Pi libraries:
+
+* FakeI2C: a busio.I2C look-alike with a TCA9548A at 0x70 routing to a
+  PCA9685 (0x40, mux channel 0) and an ADS1115 (0x48, mux channel 1), all
+  modelled at register level (auto-increment, prescaler, single-shot
+  conversions that take 1/data_rate to complete).
+* a fake 1-Wire sysfs tree with DS18B20 ``w1_slave``, ``temperature`` and
+  ``resolution`` files and the bus master's ``therm_bulk_read``,
+* a pty that streams ESP32 text blocks and NMEA like the GPS board,
+* fake gpiozero OutputDevice, lgpio and HC-SR04 pings.
+
+Every bus transaction sleeps for a realistic time (I2C bytes at the bus
+clock plus ioctl overhead, 750 ms DS18B20 conversions, serial baud rate),
+scaled by ``ROVER_SIM_LATENCY`` (0 disables the delays). The adafruit
+drivers are used on top of FakeI2C when installed, otherwise small
+register-compatible stand-ins below.
+
+    ROVER_BACKEND=sim python -m app.sim_hardware   # per-reading latency report
+"""
+import errno
+import fcntl
+import functools
+import os
+import random
+import select
+import struct
+import tempfile
+import termios
+import threading
+import time
+
+LATENCY_SCALE = float(os.environ.get('ROVER_SIM_LATENCY', '1'))
+LATENCY = {
+    'i2c_overhead_s': 120e-6,     # i2c-dev ioctl, START/STOP and address byte
+    'i2c_clock_hz': 100000,       # 9 clocks per byte incl. ACK
+    'w1_conversion_s': 0.75,      # DS18B20 12-bit conversion (halved per bit less)
+    'w1_read_s': 0.012,           # scratchpad read at 1-Wire speed
+    'gpio_s': 5e-6,
+    'gps_baud': 115200,
+}
+
+TCA_ADDRESS = 0x70
+PCA_ADDRESS = 0x40
+ADS_ADDRESS = 0x48
+
+
+def _delay(seconds):
+    if LATENCY_SCALE > 0 and seconds > 0:
+        time.sleep(seconds * LATENCY_SCALE)
+
+
+# === Simulated environment ===
+class World:
+    """Physical quantities the fake sensors report. Values may be callables."""
+
+    def __init__(self):
+        # ADS1115 input -> volts (P0 turbidity, P1 DO, P2 pH, P3 water level)
+        self.analog = {0: 2.0, 1: 1.0, 2: 2.5, 3: 1.2}
+        self.analog_noise_v = 0.002
+        self.temperatures = {'28-00000a1b2c3d': 28.0}
+        self.ranges = {13: 2.0, 5: 2.0}  # ultrasonic trigger pin -> metres
+        self.range_noise_m = 0.005
+        self.position = (14.5995, 120.9842)
+        self.gpio = {}
+
+    def volts(self, pin):
+        value = self.analog.get(pin, 0.0)
+        value = value() if callable(value) else value
+        return value + random.gauss(0, self.analog_noise_v)
+
+    def temperature(self, probe):
+        value = self.temperatures[probe]
+        return value() if callable(value) else value
+
+
+world = World()
+
+
+# === I2C bus and register models ===
+class TCA9548AModel:
+    def __init__(self):
+        self.mask = 0
+
+    def write(self, data):
+        if data:
+            self.mask = data[-1]
+
+    def read(self, n):
+        return bytes([self.mask] * n)
+
+
+class PCA9685Model:
+    MODE1, PRESCALE, LED0_ON_L = 0x00, 0xFE, 0x06
+    SLEEP, AI = 0x10, 0x20
+
+    def __init__(self):
+        self.regs = bytearray(256)
+        self.regs[self.MODE1] = 0x11
+        self.regs[self.PRESCALE] = 0x1E
+        self.pointer = 0
+
+    def _store(self, reg, value):
+        if reg == self.PRESCALE and not self.regs[self.MODE1] & self.SLEEP:
+            return  # prescaler is only writable in sleep mode
+        self.regs[reg] = value
+
+    def _advance(self):
+        if self.regs[self.MODE1] & self.AI:
+            self.pointer = (self.pointer + 1) & 0xFF
+
+    def write(self, data):
+        if not data:
+            return
+        self.pointer = data[0]
+        for value in data[1:]:
+            self._store(self.pointer, value)
+            self._advance()
+
+    def read(self, n):
+        out = bytearray()
+        for _ in range(n):
+            out.append(self.regs[self.pointer])
+            self._advance()
+        return bytes(out)
+
+    def duty(self, channel):
+        """16-bit duty cycle currently programmed on a channel."""
+        on_l, on_h, off_l, off_h = self.regs[self.LED0_ON_L + 4 * channel:self.LED0_ON_L + 4 * channel + 4]
+        on, off = on_l | on_h << 8, off_l | off_h << 8
+        if on & 0x1000:
+            return 0xFFFF
+        if off & 0x1000:
+            return 0
+        return ((off - on) & 0xFFF) << 4
+
+    @property
+    def frequency(self):
+        return 25000000 / 4096.0 / (self.regs[self.PRESCALE] + 1)
+
+
+class ADS1115Model:
+    FULL_SCALE = {0: 6.144, 1: 4.096, 2: 2.048, 3: 1.024, 4: 0.512, 5: 0.256, 6: 0.256, 7: 0.256}
+    DATA_RATES = (8, 16, 32, 64, 128, 250, 475, 860)
+    DIFFERENTIAL = {0: (0, 1), 1: (0, 3), 2: (1, 3), 3: (2, 3)}
+
+    def __init__(self, world):
+        self.world = world
+        self.regs = [0, 0x8583, 0x8000, 0x7FFF]
+        self.pointer = 0
+        self.ready_at = 0.0
+        self.pending = None  # config of the conversion in progress
+
+    def _sample(self, config):
+        mux = (config >> 12) & 7
+        if mux >= 4:
+            volts = self.world.volts(mux - 4)
+        else:
+            pos, neg = self.DIFFERENTIAL[mux]
+            volts = self.world.volts(pos) - self.world.volts(neg)
+        count = int(volts / self.FULL_SCALE[(config >> 9) & 7] * 32768)
+        return max(-32768, min(32767, count)) & 0xFFFF
+
+    def _settle(self):
+        now = time.monotonic()
+        if self.pending is not None and now >= self.ready_at:
+            self.regs[0] = self._sample(self.pending)
+            if self.pending & 0x0100:   # single-shot: done
+                self.pending = None
+            else:                       # continuous: next conversion
+                self.ready_at = now + 1.0 / self.DATA_RATES[(self.pending >> 5) & 7]
+
+    def write(self, data):
+        if not data:
+            return
+        self.pointer = data[0] & 3
+        if len(data) >= 3:
+            value = data[1] << 8 | data[2]
+            if self.pointer == 1:
+                self._settle()
+                if value & 0x8000 or not value & 0x0100:
+                    self.pending = value
+                    self.ready_at = time.monotonic() + 1.0 / self.DATA_RATES[(value >> 5) & 7]
+                value &= 0x7FFF
+            self.regs[self.pointer] = value
+
+    def read(self, n):
+        self._settle()
+        value = self.regs[self.pointer]
+        if self.pointer == 1 and self.pending is None:
+            value |= 0x8000  # OS bit: not converting
+        return bytes([value >> 8, value & 0xFF] * ((n + 1) // 2))[:n]
+
+
+class FakeI2C:
+    """busio.I2C look-alike: a TCA9548A routing to the downstream devices."""
+
+    def __init__(self, world=world):
+        self._lock = threading.Lock()
+        self.tca = TCA9548AModel()
+        self.pca = PCA9685Model()
+        self.ads = ADS1115Model(world)
+        self.channels = {0: {PCA_ADDRESS: self.pca}, 1: {ADS_ADDRESS: self.ads}}
+        self.transactions = 0
+
+    def _device(self, address):
+        if address == TCA_ADDRESS:
+            return self.tca
+        for channel, devices in self.channels.items():
+            if self.tca.mask & (1 << channel) and address in devices:
+                return devices[address]
+        raise OSError(errno.EREMOTEIO, f"No I2C device at 0x{address:02x}")
+
+    def _transfer(self, address, nbytes):
+        self.transactions += 1
+        _delay(LATENCY['i2c_overhead_s'] + 9.0 * (nbytes + 1) / LATENCY['i2c_clock_hz'])
+        return self._device(address)
+
+    def try_lock(self):
+        return self._lock.acquire(blocking=False)
+
+    def unlock(self):
+        self._lock.release()
+
+    def scan(self):
+        found = [TCA_ADDRESS]
+        for channel, devices in self.channels.items():
+            if self.tca.mask & (1 << channel):
+                found.extend(devices)
+        return sorted(found)
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        data = bytes(buffer[start:end])
+        self._transfer(address, len(data)).write(data)
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        end = len(buffer) if end is None else end
+        buffer[start:end] = self._transfer(address, end - start).read(end - start)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *, out_start=0, out_end=None,
+                              in_start=0, in_end=None):
+        in_end = len(buffer_in) if in_end is None else in_end
+        data = bytes(buffer_out[out_start:out_end])
+        device = self._transfer(address, len(data) + in_end - in_start)
+        device.write(data)
+        buffer_in[in_start:in_end] = device.read(in_end - in_start)
+
+    def deinit(self):
+        pass
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def I2C():
+    """The simulated bus (one per process, like the Pi's /dev/i2c-1)."""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = FakeI2C()
+    return _bus
+
+
+# === Driver stand-ins (used when the adafruit libraries are missing) ===
+class _I2CDevice:
+    def __init__(self, bus, address):
+        self.bus = bus
+        self.address = address
+
+    def __enter__(self):
+        while not self.bus.try_lock():
+            time.sleep(0)
+        return self
+
+    def __exit__(self, *exc):
+        self.bus.unlock()
+        return False
+
+    def write(self, buf, *, start=0, end=None):
+        self.bus.writeto(self.address, buf, start=start, end=end)
+
+    def readinto(self, buf, *, start=0, end=None):
+        self.bus.readfrom_into(self.address, buf, start=start, end=end)
+
+    def write_then_readinto(self, out_buffer, in_buffer, *, out_start=0, out_end=None, in_start=0, in_end=None):
+        self.bus.writeto_then_readfrom(self.address, out_buffer, in_buffer, out_start=out_start,
+                                       out_end=out_end, in_start=in_start, in_end=in_end)
+
+
+class _PWMChannel:
+    def __init__(self, pca, index):
+        self._pca = pca
+        self._index = index
+
+    @property
+    def duty_cycle(self):
+        buf = bytearray(4)
+        with self._pca.i2c_device as i2c:
+            i2c.write_then_readinto(bytes([0x06 + 4 * self._index]), buf)
+        on, off = struct.unpack('<HH', buf)
+        if on & 0x1000:
+            return 0xFFFF
+        return 0 if off & 0x1000 else (off & 0xFFF) << 4
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        if value == 0xFFFF:
+            on, off = 0x1000, 0
+        elif value >> 4 == 0:
+            on, off = 0, 0x1000
+        else:
+            on, off = 0, value >> 4
+        with self._pca.i2c_device as i2c:
+            i2c.write(bytes([0x06 + 4 * self._index]) + struct.pack('<HH', on, off))
+
+
+class SimPCA9685:
+    """Register-level subset of adafruit_pca9685.PCA9685."""
+
+    def __init__(self, i2c_bus, *, address=PCA_ADDRESS, reference_clock_speed=25000000):
+        self.i2c_device = _I2CDevice(i2c_bus, address)
+        self.reference_clock_speed = reference_clock_speed
+        self.channels = [_PWMChannel(self, i) for i in range(16)]
+        self.reset()
+
+    def _read_reg(self, reg):
+        buf = bytearray(1)
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(bytes([reg]), buf)
+        return buf[0]
+
+    def _write_reg(self, reg, value):
+        with self.i2c_device as i2c:
+            i2c.write(bytes([reg, value]))
+
+    @property
+    def mode1(self):
+        return self._read_reg(0x00)
+
+    @mode1.setter
+    def mode1(self, value):
+        self._write_reg(0x00, value)
+
+    @property
+    def frequency(self):
+        return self.reference_clock_speed / 4096.0 / (self._read_reg(0xFE) + 1)
+
+    @frequency.setter
+    def frequency(self, freq):
+        prescale = int(self.reference_clock_speed / 4096.0 / freq + 0.5)
+        old_mode = self.mode1
+        self.mode1 = (old_mode & 0x7F) | 0x10
+        self._write_reg(0xFE, prescale)
+        self.mode1 = old_mode
+        time.sleep(0.005)
+        self.mode1 = old_mode | 0xA0
+
+    def reset(self):
+        self.mode1 = 0x00
+
+    def deinit(self):
+        self.reset()
+
+
+class SimADS1115:
+    """Single-shot subset of adafruit_ads1x15.ads1115.ADS1115."""
+    GAINS = {2 / 3: 0, 1: 1, 2: 2, 4: 3, 8: 4, 16: 5}
+    FULL_SCALE = {2 / 3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+
+    def __init__(self, i2c, gain=1, data_rate=128, address=ADS_ADDRESS):
+        self.i2c_device = _I2CDevice(i2c, address)
+        self.gain = gain
+        self.data_rate = data_rate
+
+    def _reg(self, pointer):
+        buf = bytearray(2)
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(bytes([pointer]), buf)
+        return buf[0] << 8 | buf[1]
+
+    def read(self, pin):
+        config = (0x8000 | (4 + pin) << 12 | self.GAINS[self.gain] << 9 | 0x0100
+                  | ADS1115Model.DATA_RATES.index(self.data_rate) << 5 | 0x0003)
+        with self.i2c_device as i2c:
+            i2c.write(bytes([1, config >> 8, config & 0xFF]))
+        while not self._reg(1) & 0x8000:
+            pass
+        raw = self._reg(0)
+        return raw - 0x10000 if raw & 0x8000 else raw
+
+
+class SimAnalogIn:
+    def __init__(self, ads, positive_pin, negative_pin=None):
+        self._ads = ads
+        self._pin = positive_pin
+
+    @property
+    def value(self):
+        return self._ads.read(self._pin)
+
+    @property
+    def voltage(self):
+        return self.value * self._ads.FULL_SCALE[self._ads.gain] / 32767
+
+
+class _AdsModule:
+    ADS1115 = SimADS1115
+    P0, P1, P2, P3 = 0, 1, 2, 3
+
+
+try:
+    from adafruit_pca9685 import PCA9685
+except ImportError:
+    PCA9685 = SimPCA9685
+
+try:
+    import adafruit_ads1x15.ads1115 as ADS
+    from adafruit_ads1x15.analog_in import AnalogIn
+except ImportError:
+    ADS = _AdsModule
+    AnalogIn = SimAnalogIn
+
+
+# === GPIO ===
+class OutputDevice:
+    """gpiozero.OutputDevice stand-in."""
+
+    def __init__(self, pin, active_high=True, initial_value=False):
+        self.pin = pin
+        self.value = 1 if initial_value else 0
+        world.gpio[pin] = self.value
+
+    def on(self):
+        _delay(LATENCY['gpio_s'])
+        self.value = world.gpio[self.pin] = 1
+
+    def off(self):
+        _delay(LATENCY['gpio_s'])
+        self.value = world.gpio[self.pin] = 0
+
+    def close(self):
+        pass
+
+
+def ping(trigger, echo, max_distance, timeout=0.05):
+    """backend.ping stand-in: world.ranges[trigger] plus noise, after the echo round trip."""
+    metres = world.ranges.get(trigger, max_distance)
+    metres = metres() if callable(metres) else metres
+    if metres is None:
+        _delay(timeout)
+        return None  # no echo pulse: sensor unplugged
+    metres = max(0.02, min(metres + random.gauss(0, world.range_noise_m), max_distance))
+    _delay(2 * LATENCY['gpio_s'] + 2 * metres / 343.0)
+    return metres
+
+
+class _LgpioModule:
+    """lgpio stand-in (chip handles, claims, reads and writes)."""
+
+    def __init__(self):
+        self._handles = 0
+
+    def gpiochip_open(self, chip):
+        self._handles += 1
+        return self._handles
+
+    def gpiochip_close(self, handle):
+        pass
+
+    def gpio_claim_output(self, handle, gpio, level=0, lFlags=0):
+        world.gpio[gpio] = level
+
+    def gpio_claim_input(self, handle, gpio, lFlags=0):
+        world.gpio.setdefault(gpio, 0)
+
+    def gpio_free(self, handle, gpio):
+        pass
+
+    def gpio_write(self, handle, gpio, level):
+        _delay(LATENCY['gpio_s'])
+        world.gpio[gpio] = level
+
+    def gpio_read(self, handle, gpio):
+        _delay(LATENCY['gpio_s'])
+        return world.gpio.get(gpio, 0)
+
+
+lgpio = _LgpioModule()
+
+
+# === 1-Wire sysfs ===
+_w1_root = None
+_start_lock = threading.Lock()  # guards lazy creation of the w1 tree and GPS pty
+
+
+def _w1_slave_text(temp_c):
+    millic = int(round(temp_c * 1000))
+    raw = struct.pack('<h', int(round(temp_c * 16)))
+    scratch = f"{raw[0]:02x} {raw[1]:02x} 4b 46 7f ff 0c 10 1c"
+    return f"{scratch} : crc=1c YES\n{scratch} t={millic}\n"
+
+
+def w1_devices_dir():
+    """Fake /sys/bus/w1/devices (created on first use)."""
+    global _w1_root
+    with _start_lock:
+        if _w1_root is None:
+            root = tempfile.mkdtemp(prefix='rover-w1-')
+            os.makedirs(os.path.join(root, 'w1_bus_master1'))
+            for probe in world.temperatures:
+                os.makedirs(os.path.join(root, probe))
+                with open(os.path.join(root, probe, 'w1_slave'), 'w') as f:
+                    f.write(_w1_slave_text(world.temperature(probe)))
+                for name in ('temperature', 'resolution'):
+                    open(os.path.join(root, probe, name), 'w').close()
+            open(os.path.join(root, 'w1_bus_master1', 'therm_bulk_read'), 'w').close()
+            _w1_root = root
+    return _w1_root
+
+
+def _w1_conversion_s(probe):
+    return LATENCY['w1_conversion_s'] / 2 ** (12 - _w1_resolution.get(probe, 12))
+
+
+def _w1_probe(path):
+    probe = os.path.basename(os.path.dirname(path))
+    if probe not in world.temperatures:
+        raise FileNotFoundError(path)
+    return probe
+
+
+def read_w1_slave(path):
+    """Read a probe's w1_slave like the kernel does: convert, then fetch the scratchpad."""
+    probe = _w1_probe(path)
+    _delay(_w1_conversion_s(probe) + LATENCY['w1_read_s'])
+    text = _w1_slave_text(world.temperature(probe))
+    with open(path, 'w') as f:
+        f.write(text)
+    return text.splitlines(True)
+
+
+# Bulk conversion state: all probes convert at once after 'trigger'
+_w1_resolution = {}
+_w1_bulk = {'done_at': None, 'pending': set()}
+_w1_lock = threading.Lock()
+
+
+def read_w1(path):
+    """Read a sysfs attribute: therm_bulk_read, or a probe's temperature/resolution."""
+    name = os.path.basename(path)
+    if name == 'therm_bulk_read':
+        # -1: converting, 1: done and values not all read yet, 0: nothing pending
+        with _w1_lock:
+            if not _w1_bulk['pending']:
+                return '0\n'
+            return '-1\n' if time.monotonic() < _w1_bulk['done_at'] else '1\n'
+    probe = _w1_probe(path)
+    if name == 'resolution':
+        return f"{_w1_resolution.get(probe, 12)}\n"
+    if name != 'temperature':
+        raise FileNotFoundError(path)
+    with _w1_lock:
+        bulk = probe in _w1_bulk['pending']
+        wait = max(0.0, _w1_bulk['done_at'] - time.monotonic()) / max(LATENCY_SCALE, 1e-9) if bulk else None
+        _w1_bulk['pending'].discard(probe)
+    # After a bulk trigger the scratchpad already holds the value; otherwise convert first
+    _delay((wait if bulk else _w1_conversion_s(probe)) + LATENCY['w1_read_s'])
+    return f"{int(round(world.temperature(probe) * 1000))}\n"
+
+
+def write_w1(path, text):
+    name = os.path.basename(path)
+    if name == 'therm_bulk_read':
+        if text.strip() != 'trigger':
+            raise OSError(errno.EINVAL, 'expected trigger', path)
+        _delay(LATENCY['w1_read_s'])  # skip ROM + convert T broadcast
+        with _w1_lock:
+            _w1_bulk['pending'] = set(world.temperatures)
+            _w1_bulk['done_at'] = time.monotonic() + max(_w1_conversion_s(p) for p in world.temperatures) * LATENCY_SCALE
+        return
+    probe = _w1_probe(path)
+    if name != 'resolution' or text.strip() not in ('9', '10', '11', '12'):
+        raise OSError(errno.EINVAL, f'invalid write {text!r}', path)
+    _delay(LATENCY['w1_read_s'])
+    _w1_resolution[probe] = int(text)
+
+
+# === ESP32 GPS over a pty ===
+def _nmea(body):
+    checksum = functools.reduce(lambda a, b: a ^ b, body.encode(), 0)
+    return f"${body}*{checksum:02X}\r\n"
+
+
+def _nmea_coord(value, width):
+    value = abs(value)
+    return f"{int(value):0{width}d}{(value % 1) * 60:07.4f}"
+
+
+def gps_sentences(lat, lng, now=None):
+    """One epoch as the ESP32 prints it: text block followed by GGA and RMC."""
+    now = now or time.gmtime()
+    hms = time.strftime('%H%M%S', now)
+    ns, ew = ('N' if lat >= 0 else 'S'), ('E' if lng >= 0 else 'W')
+    return (f"Latitude: {lat:.6f}\r\nLongitude: {lng:.6f}\r\n"
+            f"Date: {time.strftime('%m/%d/%Y', now)}\r\nTime: {time.strftime('%H:%M:%S', now)}\r\n"
+            "-----------------------\r\n"
+            + _nmea(f"GNGGA,{hms}.00,{_nmea_coord(lat, 2)},{ns},{_nmea_coord(lng, 3)},{ew},1,09,0.9,12.3,M,46.9,M,,")
+            + _nmea(f"GNRMC,{hms}.00,A,{_nmea_coord(lat, 2)},{ns},{_nmea_coord(lng, 3)},{ew},0.4,54.7,"
+                    f"{time.strftime('%d%m%y', now)},,,A"))
+
+
+class FakeGps:
+    """Writes one GPS epoch per second into a pty at the configured baud rate."""
+
+    def __init__(self, rate_hz=1.0):
+        self.master, self._slave = os.openpty()
+        attrs = termios.tcgetattr(self._slave)
+        attrs[3] &= ~(termios.ECHO | termios.ICANON)
+        termios.tcsetattr(self._slave, termios.TCSANOW, attrs)
+        fcntl.fcntl(self.master, fcntl.F_SETFL, fcntl.fcntl(self.master, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self.port = os.ttyname(self._slave)
+        self.rate_hz = rate_hz
+        self.dropped = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            lat, lng = world.position
+            data = gps_sentences(lat, lng).encode()
+            for i in range(0, len(data), 64):
+                chunk = data[i:i + 64]
+                _delay(len(chunk) * 10.0 / LATENCY['gps_baud'])
+                try:
+                    os.write(self.master, chunk)
+                except BlockingIOError:
+                    self.dropped += len(chunk)  # nobody reading: the UART FIFO overflows
+            time.sleep(1.0 / self.rate_hz)
+
+
+_gps = None
+
+
+def gps_port():
+    """Device path of the simulated GPS serial port (started on first use)."""
+    global _gps
+    with _start_lock:
+        if _gps is None:
+            _gps = FakeGps()
+    return _gps.port
+
+
+class _SerialException(OSError):
+    pass
+
+
+class _PtySerial:
+    """Enough of serial.Serial to read a pty when pyserial is not installed."""
+
+    def __init__(self, port, baudrate=9600, timeout=None):
+        try:
+            self._fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        except OSError as e:
+            raise _SerialException(str(e))
+        self.timeout = timeout
+
+    @property
+    def in_waiting(self):
+        buf = fcntl.ioctl(self._fd, termios.FIONREAD, b'\0\0\0\0')
+        return struct.unpack('I', buf)[0]
+
+    def read(self, size=1):
+        ready, _, _ = select.select([self._fd], [], [], self.timeout)
+        if not ready:
+            return b''
+        try:
+            return os.read(self._fd, size)
+        except OSError as e:
+            raise _SerialException(str(e))
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _SerialModule:
+    Serial = _PtySerial
+    SerialException = _SerialException
+
+
+try:
+    import serial
+except ImportError:
+    serial = _SerialModule
+
+
+# === Latency report ===
+def main():
+    os.environ['ROVER_BACKEND'] = 'sim'
+    from app import hardware
+    from app import w1temp
+
+    def timed(name, fn, runs):
+        start, before = time.perf_counter(), hardware.i2c_stats['transactions']
+        for _ in range(runs):
+            fn()
+        elapsed = (time.perf_counter() - start) / runs
+        per_read = (hardware.i2c_stats['transactions'] - before) / runs
+        print(f"{name:14}{elapsed * 1000:10.2f} ms{per_read:10.1f}")
+
+    print(f"backend: {hardware.backend.NAME}, latency scale {LATENCY_SCALE}")
+    print(f"{'reading':14}{'latency':>13}{'i2c tx':>10}")
+    timed('ph', hardware.read_ph, 20)
+    timed('do', lambda: hardware.read_do(), 20)
+    timed('turbidity', hardware.read_turbidity, 20)
+    timed('water_level', hardware.read_water_level, 20)
+    timed('w1 bulk conv', w1temp.refresh, 2)
+    timed('temp (cached)', hardware.read_temp, 20)
+    pca = hardware.setup_pca9685(channel=0, frequency=1000)
+    timed('move_forward', lambda: hardware.move_forward(pca, 30000 + random.randint(0, 1000)), 20)
+    from app import actuators
+    timed('drive (arbiter)', lambda: actuators.drive_action('forward', 30000 + random.randint(0, 1000)), 20)
+    timed('stop (arbiter)', actuators.stop_motors, 20)
+    seq, fix = hardware.wait_for_gps_fix(timeout=5)
+    print(f"gps fix: {fix and (fix['lat'], fix['lng'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Geospatial index over sampling points and sample (breeding site) locations.
+
+Two SQLite R*Tree tables mirror the coordinates of ``points`` and
+``samples``; triggers keep them in sync on every insert, update and delete,
+so set_point, save_breeding_site, the scheduler and deletes from the
+history page all maintain the index without extra code. Queries fetch the
+candidates in a bounding box from the R*Tree and rank them by exact
+haversine distance.
+"""
+import math
+
+EARTH_RADIUS_M = 6371000.0
+M_PER_DEG_LAT = math.radians(1) * EARTH_RADIUS_M
+NEAREST_START_RADIUS_M = 50.0
+NEAREST_MAX_RADIUS_M = 50000.0
+
+# kind -> (rtree table, base table, columns returned)
+KINDS = {
+    'points': ('points_rtree', 'points', ('point', 'lat', 'lng')),
+    'samples': ('samples_rtree', 'samples',
+                ('id', 'point', 'lat', 'lng', 'timestamp', 'ph', 'do', 'turbidity', 'temp', 'water_level')),
+}
+
+
+def init_schema(c):
+    """Create the R*Trees and their triggers. ``c`` is an open connection/cursor."""
+    for rtree, table, _ in KINDS.values():
+        exists = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (rtree,)).fetchone()
+        c.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {rtree} USING rtree(id, min_lat, max_lat, min_lng, max_lng)')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{rtree}_insert AFTER INSERT ON {table}
+            WHEN NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL
+            BEGIN
+            INSERT OR REPLACE INTO {rtree} VALUES (NEW.rowid, NEW.lat, NEW.lat, NEW.lng, NEW.lng);
+            END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{rtree}_update AFTER UPDATE OF lat, lng ON {table}
+            BEGIN
+            DELETE FROM {rtree} WHERE id = OLD.rowid;
+            INSERT INTO {rtree} SELECT NEW.rowid, NEW.lat, NEW.lat, NEW.lng, NEW.lng
+                WHERE NEW.lat IS NOT NULL AND NEW.lng IS NOT NULL;
+            END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{rtree}_delete AFTER DELETE ON {table}
+            BEGIN
+            DELETE FROM {rtree} WHERE id = OLD.rowid;
+            END''')
+        if not exists:
+            c.execute(f'''INSERT INTO {rtree} SELECT rowid, lat, lat, lng, lng FROM {table}
+                WHERE lat IS NOT NULL AND lng IS NOT NULL''')
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres; the one implementation the other modules use."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _bbox(lat, lng, radius_m):
+    dlat = radius_m / M_PER_DEG_LAT
+    dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def _candidates(conn, kind, lat, lng, radius_m):
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind: {kind}")
+    rtree, table, columns = KINDS[kind]
+    min_lat, max_lat, min_lng, max_lng = _bbox(lat, lng, radius_m)
+    select = ', '.join(f't.{column}' for column in columns)
+    cur = conn.execute(f'''SELECT {select} FROM {rtree} r JOIN {table} t ON t.rowid = r.id
+        WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lng >= ? AND r.min_lng <= ?''',
+                       (min_lat, max_lat, min_lng, max_lng))
+    for row in cur:
+        item = dict(zip(columns, row))
+        item['kind'] = kind
+        item['distance_m'] = haversine_m(lat, lng, item['lat'], item['lng'])
+        yield item
+
+
+def within(conn, lat, lng, radius_m, kind='samples', limit=None):
+    """Items of ``kind`` within ``radius_m`` metres, nearest first."""
+    found = [item for item in _candidates(conn, kind, lat, lng, radius_m) if item['distance_m'] <= radius_m]
+    found.sort(key=lambda item: item['distance_m'])
+    return found[:limit] if limit else found
+
+
+def nearest(conn, lat, lng, kind='samples', k=1, max_radius_m=NEAREST_MAX_RADIUS_M):
+    """The ``k`` nearest items of ``kind`` (within ``max_radius_m``), nearest first.
+
+    The search box doubles from NEAREST_START_RADIUS_M until it holds k items
+    inside its inscribed circle, so only nearby index pages are read.
+    """
+    radius = min(NEAREST_START_RADIUS_M, max_radius_m)
+    while True:
+        found = within(conn, lat, lng, radius, kind)
+        if len(found) >= k or radius >= max_radius_m:
+            return found[:k]
+        radius = min(radius * 2, max_radius_m)
@@ -0,0 +1,187 @@
+"""Socket.IO telemetry push for the dashboards.
+
+One background producer samples the in-memory state sources (GPS fix,
+navigation status, pattern progress, mission status, ultrasonic ranges) and pushes only the
+fields that changed since the last push to each subscribed room, instead of
+every open dashboard polling the HTTP API. Event topics (new samples) are
+queued by publish() and flushed on the next tick.
+
+Clients join with ``socket.emit('subscribe', {topics: [...], max_rate: 2})``.
+Rooms are per topic and rate tier, so a client's update rate is capped at the
+tier at or below ``max_rate`` while the producer's work stays independent of
+the number of clients.
+"""
+import collections
+import threading
+import time
+
+from flask import request
+from flask_socketio import join_room, leave_room, emit
+
+RATE_TIERS = (1, 2, 5, 10)  # updates per second a client can ask for
+DEFAULT_RATE = 1
+MAX_EVENT_BACKLOG = 100
+
+_socketio = None
+_sources = {}                    # state topic -> callable returning a dict
+_event_topics = set()
+_tier_state = {}                 # (topic, tier) -> last state pushed to that room
+_tier_events = {}                # (topic, tier) -> deque of pending events
+_subscribers = collections.Counter()  # (topic, tier) -> client count
+_client_rooms = {}               # sid -> set of (topic, tier)
+_lock = threading.Lock()
+_started = False
+_MISSING = object()
+stats = {'ticks': 0, 'emits': 0, 'fields': 0}
+
+
+def _room(topic, tier):
+    return f"{topic}@{tier}"
+
+
+def _tier_for(rate):
+    try:
+        rate = float(rate)
+    except (TypeError, ValueError):
+        rate = DEFAULT_RATE
+    eligible = [t for t in RATE_TIERS if t <= rate]
+    return eligible[-1] if eligible else RATE_TIERS[0]
+
+
+def register_source(topic, fn):
+    """Register a state topic; ``fn()`` must return a JSON-serializable dict."""
+    _sources[topic] = fn
+
+
+def register_event_topic(topic):
+    _event_topics.add(topic)
+
+
+def publish(topic, event):
+    """Queue an event (e.g. a newly stored sample) for every subscribed tier."""
+    with _lock:
+        for key, count in _subscribers.items():
+            if key[0] == topic and count > 0:
+                _tier_events.setdefault(key, collections.deque(maxlen=MAX_EVENT_BACKLOG)).append(event)
+
+
+def _diff(old, new):
+    if old is None:
+        return dict(new)
+    changed = {k: v for k, v in new.items() if old.get(k, _MISSING) != v}
+    for k in old:
+        if k not in new:
+            changed[k] = None
+    return changed
+
+
+def _tick(tier, states):
+    pushes = []  # (topic, payload, changed fields), emitted once _lock is released
+    with _lock:
+        for key in [key for key, count in _subscribers.items() if key[1] == tier and count > 0]:
+            topic = key[0]
+            if topic in states:
+                new = states[topic]
+                delta = _diff(_tier_state.get(key), new)
+                _tier_state[key] = new
+                if delta:
+                    pushes.append((topic, delta, len(delta)))
+            elif topic in _event_topics:
+                pending = _tier_events.pop(key, None)
+                if pending:
+                    pushes.append((topic, list(pending), 0))
+    for topic, payload, fields in pushes:
+        _socketio.emit(topic, payload, to=_room(topic, tier))
+        stats['emits'] += 1
+        stats['fields'] += fields
+
+
+def _collect_states(topics):
+    states = {}
+    for topic in topics:
+        try:
+            states[topic] = _sources[topic]()
+        except Exception as e:
+            print(f"[WARN] Telemetry source {topic} failed: {e}")
+    return states
+
+
+def _producer():
+    base = min(1.0 / t for t in RATE_TIERS)
+    next_due = {tier: 0.0 for tier in RATE_TIERS}
+    while True:
+        now = time.monotonic()
+        due = [tier for tier in RATE_TIERS if now >= next_due[tier]]
+        if due:
+            with _lock:
+                active = {topic for (topic, tier), n in _subscribers.items() if n > 0 and tier in due}
+            # Each source is sampled at most once per tick, whatever the client count
+            states = _collect_states(active & set(_sources))
+            for tier in due:
+                _tick(tier, states)
+                next_due[tier] = now + 1.0 / tier
+            stats['ticks'] += 1
+        _socketio.sleep(base)
+
+
+def init(socketio):
+    """Install the subscribe handlers and start the producer (idempotent)."""
+    global _socketio, _started
+    _socketio = socketio
+    if _started:
+        return
+    _started = True
+
+    @socketio.on('subscribe')
+    def handle_subscribe(data):
+        data = data or {}
+        tier = _tier_for(data.get('max_rate', DEFAULT_RATE))
+        topics = [t for t in data.get('topics', []) if t in _sources or t in _event_topics]
+        # A topic is streamed at one rate per client: leave its other tiers first
+        _drop_rooms(request.sid, lambda key: key[0] in topics and key[1] != tier)
+        with _lock:
+            rooms = _client_rooms.setdefault(request.sid, set())
+            for topic in topics:
+                key = (topic, tier)
+                if key not in rooms:
+                    rooms.add(key)
+                    _subscribers[key] += 1
+                    join_room(_room(topic, tier))
+        # New subscribers get the full current state once, then deltas
+        for topic in topics:
+            if topic in _sources:
+                try:
+                    emit(topic, _sources[topic]())
+                except Exception as e:
+                    print(f"[WARN] Telemetry source {topic} failed: {e}")
+        emit('subscribed', {'topics': topics, 'rate': tier})
+
+    @socketio.on('unsubscribe')
+    def handle_unsubscribe(data):
+        topics = set((data or {}).get('topics', []))
+        _drop_rooms(request.sid, lambda key: key[0] in topics)
+
+    socketio.start_background_task(_producer)
+
+
+def drop_client(sid):
+    """Forget a disconnected client's subscriptions (call from the disconnect handler)."""
+    _drop_rooms(sid, lambda key: True)
+
+
+def _drop_rooms(sid, match):
+    with _lock:
+        rooms = _client_rooms.get(sid, set())
+        for key in [k for k in rooms if match(k)]:
+            rooms.discard(key)
+            _subscribers[key] -= 1
+            if _subscribers[key] <= 0:
+                del _subscribers[key]
+                _tier_state.pop(key, None)
+                _tier_events.pop(key, None)
+            try:
+                leave_room(_room(*key), sid=sid)
+            except Exception:
+                pass
+        if not rooms:
+            _client_rooms.pop(sid, None)
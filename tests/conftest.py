@@ -0,0 +1,14 @@
+"""Import the checkout as the ``app`` package on the simulated backend."""
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('ROVER_BACKEND', 'sim')
+os.environ.setdefault('ROVER_SIM_LATENCY', '0')
+
+if 'app' not in sys.modules:
+    app = types.ModuleType('app')
+    app.__path__ = [ROOT]
+    sys.modules['app'] = app
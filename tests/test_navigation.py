@@ -0,0 +1,23 @@
+from app import hardware
+from app import navigation
+
+
+def _driven(monkeypatch, fn):
+    """Channels left on (non-zero duty) by ``fn``."""
+    written = {}
+    monkeypatch.setattr(hardware, 'write_pwm', lambda pca, duties: written.update(duties))
+    fn()
+    return {ch for ch, duty in written.items() if duty}
+
+
+def test_forward_uses_move_forward_channels(monkeypatch):
+    assert (_driven(monkeypatch, lambda: hardware.set_wheel_speeds(None, 1, 1))
+            == _driven(monkeypatch, lambda: hardware.move_forward(None, 65535)))
+
+
+def test_positive_heading_error_turns_right(monkeypatch):
+    controller = navigation.NavigationController(pca=object())
+    turn = controller.steering.update(45.0, 0.1)  # target 45 degrees to the right
+    assert turn > 0
+    channels = _driven(monkeypatch, lambda: controller._drive(turn, -turn))
+    assert channels == _driven(monkeypatch, lambda: hardware.rotate_right(None, 65535))
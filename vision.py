@@ -0,0 +1,213 @@
+"""Background camera + YOLOv8 worker.
+
+The camera stays open and captures RGB frames straight into one reused
+NumPy buffer (no JPEG encode/decode, no temp file), the model is loaded and
+warmed once when the worker starts, and the latest detections are cached
+with their class names, boxes and frame timestamp. HTTP handlers read the
+cache via get_detections() instead of running inference themselves.
+
+The worker only runs while someone has asked for detections in the last
+IDLE_AFTER_S seconds, so an unwatched rover does not burn CPU, and frames
+that barely differ from the last one the detector saw reuse its result
+(see GATE_*). The camera is opened before the model is loaded, and a failed
+start is not retried for START_RETRY_S seconds, so a rover without a camera
+does not reload the model on every request.
+"""
+import datetime
+import os
+import threading
+import time
+
+from app import hardware
+
+# Detector settings (see detector.py): 'ultralytics' runs yolov8n.pt with
+# PyTorch, 'onnx' runs an exported (optionally INT8) model with ONNX Runtime.
+DETECTOR_BACKEND = os.environ.get('ROVER_DETECTOR', 'ultralytics')
+DETECTOR_MODEL = os.environ.get('ROVER_DETECTOR_MODEL') or None  # None = backend default
+DETECTOR_IMGSZ = int(os.environ.get('ROVER_DETECTOR_IMGSZ', '0')) or None  # None = 640 / as exported
+IDLE_AFTER_S = 30.0
+DEFAULT_TIMEOUT_S = 10.0
+MIN_FRAME_INTERVAL_S = 0.2
+START_RETRY_S = 60.0
+
+# Change gating: each frame is reduced to a GATE_GRID grayscale thumbnail and
+# compared with the thumbnail of the last frame that went through the
+# detector. If the scene is effectively static the previous detections are
+# reused, until they are GATE_MAX_AGE_S old.
+GATE_ENABLED = True
+GATE_GRID = (32, 24)            # thumbnail cells (columns, rows)
+GATE_MEAN_THRESHOLD = 2.0       # mean absolute difference, grey levels
+GATE_CELL_THRESHOLD = 15.0      # a cell changed if it moved more than this...
+GATE_CELL_FRACTION = 0.01       # ...and the scene changed if more cells than this did
+GATE_MAX_AGE_S = 15.0
+
+_cond = threading.Condition()
+_latest = None           # last published result dict
+_last_request = 0.0      # monotonic time of the last get_detections()
+_worker_thread = None
+_start_failed_at = None  # monotonic time of the last failed worker start
+_start_lock = threading.Lock()
+stats = {'frames': 0, 'capture_ms': 0.0, 'inference_ms': 0.0,
+         'gate_hits': 0, 'gate_misses': 0, 'inference_ms_saved': 0.0}
+
+
+def load_model():
+    """Load the detector and run it once on a blank frame so the first real frame is fast."""
+    import numpy as np
+    from app import detector
+    if DETECTOR_BACKEND == 'ultralytics' and not hardware.yolo_available():
+        return None
+    model = detector.load(DETECTOR_BACKEND, DETECTOR_MODEL, DETECTOR_IMGSZ)
+    width, height = hardware.CAMERA_RESOLUTION
+    model.detect(np.zeros((height, width, 3), dtype=np.uint8))
+    return model
+
+
+def _publish(result):
+    global _latest
+    with _cond:
+        _latest = result
+        _cond.notify_all()
+
+
+def thumbnail(rgb, np):
+    """Block-averaged grayscale thumbnail of GATE_GRID cells."""
+    cols, rows = GATE_GRID
+    h, w = rgb.shape[0] // rows, rgb.shape[1] // cols
+    blocks = rgb[:h * rows, :w * cols].reshape(rows, h, cols, w, 3)
+    return blocks.mean(axis=(1, 3, 4), dtype=np.float32)
+
+
+def scene_changed(previous, current, np):
+    if previous is None:
+        return True
+    diff = np.abs(current - previous)
+    return (float(diff.mean()) > GATE_MEAN_THRESHOLD
+            or float((diff > GATE_CELL_THRESHOLD).mean()) > GATE_CELL_FRACTION)
+
+
+def _wanted():
+    return time.monotonic() - _last_request < IDLE_AFTER_S
+
+
+def _open():
+    """(camera, model), or raises; the camera is checked first so a missing one costs no model load."""
+    cam = hardware.get_camera()
+    if cam is None:
+        raise RuntimeError('PiCamera not available')
+    model = load_model()
+    if model is None:
+        raise RuntimeError('YOLOv8 not installed')
+    return cam, model
+
+
+def _worker():
+    global _start_failed_at
+    try:
+        import numpy as np
+        cam, model = _open()
+    except Exception as e:
+        print(f"[ERROR] Vision worker failed to start: {e}")
+        _start_failed_at = time.monotonic()
+        _publish({'error': str(e)})
+        return
+    width, height = hardware.CAMERA_RESOLUTION
+    # picamera pads rows to 32 pixels and height to 16
+    frame = np.empty(((height + 15) // 16 * 16, (width + 31) // 32 * 32, 3), dtype=np.uint8)
+    bgr = np.empty((height, width, 3), dtype=np.uint8)  # detectors take BGR like cv2
+    seq = 0
+    reference = None      # thumbnail of the last frame the detector saw
+    inferred = None       # (objects, frame timestamp, monotonic) of that frame
+    print("[INFO] Vision worker ready")
+
+    while True:
+        with _cond:
+            _cond.wait_for(_wanted)
+        try:
+            t0 = time.monotonic()
+            timestamp = datetime.datetime.now().isoformat()
+            cam.capture(frame, 'rgb', use_video_port=True)
+            t1 = time.monotonic()
+            seq += 1
+            stats['frames'] += 1
+            stats['capture_ms'] = (t1 - t0) * 1000
+            thumb = thumbnail(frame[:height, :width], np) if GATE_ENABLED else None
+            if (GATE_ENABLED and inferred is not None and t0 - inferred[2] < GATE_MAX_AGE_S
+                    and not scene_changed(reference, thumb, np)):
+                stats['gate_hits'] += 1
+                stats['inference_ms_saved'] += stats['inference_ms']
+                objects, inferred_at = inferred[0], inferred[1]
+                cached = True
+            else:
+                np.copyto(bgr, frame[:height, :width, ::-1])
+                objects = model.detect(bgr)
+                stats['gate_misses'] += 1
+                stats['inference_ms'] = (time.monotonic() - t1) * 1000
+                reference, inferred = thumb, (objects, timestamp, t0)
+                inferred_at = timestamp
+                cached = False
+            _publish({'objects': objects, 'frame': seq,
+                      'frame_timestamp': timestamp, 'frame_monotonic': t0,
+                      'inferred_timestamp': inferred_at, 'cached': cached,
+                      'inference_ms': round(stats['inference_ms'], 1)})
+            time.sleep(max(0.0, MIN_FRAME_INTERVAL_S - (time.monotonic() - t0)))
+        except Exception as e:
+            print(f"[WARN] Vision frame failed: {e}")
+            time.sleep(1)
+
+
+def start():
+    """Open the camera and warm the model in the background (idempotent).
+
+    After a failed start, nothing is retried until START_RETRY_S have passed.
+    """
+    global _worker_thread
+    if _worker_thread is not None and _worker_thread.is_alive():
+        return
+    with _start_lock:
+        if _worker_thread is not None and _worker_thread.is_alive():
+            return
+        if _start_failed_at is not None and time.monotonic() - _start_failed_at < START_RETRY_S:
+            return
+        _worker_thread = threading.Thread(target=_worker, daemon=True)
+        _worker_thread.start()
+
+
+def get_stats():
+    """Frame/inference counters; gate hits are frames served from the previous detections."""
+    checked = stats['gate_hits'] + stats['gate_misses']
+    return dict(stats, gate_hit_rate=stats['gate_hits'] / checked if checked else 0.0)
+
+
+def _result(latest, now):
+    if latest is None:
+        return {'objects': [], 'pending': True}
+    result = {k: v for k, v in latest.items() if k != 'frame_monotonic'}
+    if 'frame_monotonic' in latest:
+        result['age'] = round(now - latest['frame_monotonic'], 3)
+    return result
+
+
+def get_detections(max_age=None, timeout=DEFAULT_TIMEOUT_S):
+    """Latest detections.
+
+    With ``max_age`` None the cached result is returned immediately. Otherwise
+    waits (up to ``timeout`` seconds) for a frame captured at most ``max_age``
+    seconds before the call (0 = a new frame); on timeout the latest result
+    is returned with 'stale': True.
+    """
+    global _last_request
+    start()
+    with _cond:
+        requested = _last_request = time.monotonic()
+        _cond.notify_all()  # wake an idle worker
+
+        def fresh():
+            return _latest is not None and ('error' in _latest or
+                                            _latest['frame_monotonic'] >= requested - max_age)
+
+        ok = max_age is None or _cond.wait_for(fresh, timeout)
+        result = _result(_latest, time.monotonic())
+    if not ok:
+        result['stale'] = True
+    return result
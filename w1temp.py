@@ -0,0 +1,233 @@
+"""DS18B20 temperature probes on the 1-Wire bus, read in the background.
+
+Probes are discovered once (and rescanned only when a read fails). Every
+REFRESH_S seconds one conversion is started on all probes at once by
+writing ``trigger`` to the bus master's ``therm_bulk_read``; each probe's
+``temperature`` attribute then returns the converted value without another
+conversion. With N probes a refresh costs one conversion time instead of N.
+Kernels without bulk read fall back to reading each probe's ``w1_slave``, as
+does a bulk conversion still not done after BULK_TIMEOUT_FACTOR conversion
+times (a probe dropped off mid-conversion).
+
+Conversion time depends on the resolution (9 bits: 94 ms, 0.5 C steps ...
+12 bits: 750 ms, 0.0625 C steps), set per probe with RESOLUTION.
+
+Readers (the DO table compensation, breeding-site checks, the acquisition
+service) get the cached value from latest(); they never wait for a
+conversion unless the cache is older than they accept.
+"""
+import datetime
+import glob
+import os
+import threading
+import time
+
+from app import backend
+
+REFRESH_S = 5.0
+DEFAULT_RESOLUTION = None  # bits (9-12) applied to every probe; None keeps the probe's setting
+RESOLUTION = {}            # probe id (e.g. '28-00000a1b2c3d') -> bits, overrides DEFAULT_RESOLUTION
+PRIMARY_PROBE = os.environ.get('ROVER_W1_PROBE')  # probe reported as "the" water temperature
+CONVERSION_S = {9: 0.094, 10: 0.188, 11: 0.375, 12: 0.75}
+BULK_POLL_S = 0.01
+BULK_TIMEOUT_FACTOR = 2.0  # give up on a bulk conversion after this many conversion times
+VALID_RANGE_C = (-55.0, 125.0)
+POWER_ON_C = 85.0          # scratchpad reset value, read back when a conversion did not run
+
+_lock = threading.Lock()   # one conversion on the bus at a time
+_cond = threading.Condition()
+_probes = None             # probe id -> {'dir': path, 'resolution': bits}
+_bulk_path = None
+_latest = {}               # probe id -> {'temp', 'timestamp', 'monotonic', 'error'}
+_bus_error = None          # last discovery/bulk-read failure, reported for probes without a reading
+_thread = None
+stats = {'scans': 0, 'conversions': 0, 'bulk': 0, 'fallback': 0, 'bulk_timeouts': 0, 'errors': 0,
+         'last_conversion_s': None}
+
+
+def _discover():
+    """Find probes and the bulk-read attribute; apply configured resolutions."""
+    global _probes, _bulk_path
+    stats['scans'] += 1
+    root = backend.w1_devices_dir()
+    probes = {}
+    for path in sorted(glob.glob(os.path.join(root, '28-*'))):
+        probe = os.path.basename(path)
+        probes[probe] = {'dir': path, 'resolution': _apply_resolution(probe, path)}
+    bulk = sorted(glob.glob(os.path.join(root, 'w1_bus_master*', 'therm_bulk_read')))
+    _bulk_path = bulk[0] if bulk else None
+    _probes = probes
+    return probes
+
+
+def _apply_resolution(probe, path):
+    wanted = RESOLUTION.get(probe, DEFAULT_RESOLUTION)
+    try:
+        current = int(backend.read_w1(os.path.join(path, 'resolution')).strip())
+    except (OSError, ValueError):
+        current = None  # older kernels: no resolution attribute, assume 12 bits
+    if wanted and wanted != current:
+        try:
+            backend.write_w1(os.path.join(path, 'resolution'), str(wanted))
+            current = wanted
+        except OSError as e:
+            print(f"[WARN] Could not set {probe} resolution to {wanted} bits: {e}")
+    return current or 12
+
+
+def set_resolution(probe, bits):
+    """Change one probe's resolution (9-12 bits) now and for later rescans."""
+    if bits not in CONVERSION_S:
+        raise ValueError(f"Resolution must be 9-12 bits, got {bits}")
+    RESOLUTION[probe] = bits
+    with _lock:
+        probes = _probes if _probes is not None else _discover()
+        if probe not in probes:
+            raise ValueError(f"Unknown probe: {probe}")
+        probes[probe]['resolution'] = _apply_resolution(probe, probes[probe]['dir'])
+
+
+def _parse_millic(text):
+    temp_c = int(text.strip()) / 1000.0
+    if not VALID_RANGE_C[0] <= temp_c <= VALID_RANGE_C[1]:
+        raise ValueError('Temperature out of valid range')
+    if temp_c == POWER_ON_C:
+        raise ValueError('Power-on reset value (conversion did not run)')
+    return temp_c
+
+
+def _parse_w1_slave(lines):
+    if len(lines) < 2 or 'YES' not in lines[0]:
+        raise ValueError('Invalid sensor response')
+    pos = lines[1].find('t=')
+    if pos == -1:
+        raise ValueError('Temperature data not found')
+    return _parse_millic(lines[1][pos + 2:])
+
+
+def _bulk_convert(probes):
+    """Trigger a bulk conversion and wait for it; False if it did not finish in time."""
+    conversion = max(CONVERSION_S[p['resolution']] for p in probes.values())
+    deadline = time.monotonic() + BULK_TIMEOUT_FACTOR * conversion
+    backend.write_w1(_bulk_path, 'trigger')
+    time.sleep(conversion)
+    while backend.read_w1(_bulk_path).strip() == '-1':
+        if time.monotonic() > deadline:
+            stats['bulk_timeouts'] += 1
+            print(f"[WARN] 1-Wire bulk conversion not done after {BULK_TIMEOUT_FACTOR * conversion:.2f} s, "
+                  "reading probes one by one")
+            return False
+        time.sleep(BULK_POLL_S)
+    return True
+
+
+def _convert(probes):
+    """One conversion of every probe; returns probe -> (temp or None, error or None)."""
+    results = {}
+    if _bulk_path and _bulk_convert(probes):
+        stats['bulk'] += 1
+        read = lambda probe: _parse_millic(backend.read_w1(os.path.join(probes[probe]['dir'], 'temperature')))
+    else:
+        stats['fallback'] += 1
+        read = lambda probe: _parse_w1_slave(backend.read_w1_slave(os.path.join(probes[probe]['dir'], 'w1_slave')))
+    for probe in probes:
+        try:
+            results[probe] = (read(probe), None)
+        except Exception as e:
+            results[probe] = (None, str(e))
+    return results
+
+
+def refresh():
+    """Convert all probes now and update the cache. Returns the new readings."""
+    global _probes, _bus_error
+    with _lock:
+        began = time.monotonic()
+        try:
+            probes = _probes if _probes else _discover()
+            if not probes:
+                raise OSError('No sensor found')
+            results = _convert(probes)
+            error = None
+            if any(err for _, err in results.values()):
+                _probes = None  # a probe may have dropped off or been re-plugged: rescan next time
+        except Exception as e:
+            _probes = None
+            results, error = {}, str(e)
+        stats['conversions'] += 1
+        stats['last_conversion_s'] = time.monotonic() - began
+    now, stamp = time.monotonic(), datetime.datetime.now().isoformat()
+    with _cond:
+        _bus_error = error
+        if error:
+            stats['errors'] += 1
+            for entry in _latest.values():
+                entry['error'] = error
+        for probe, (temp_c, err) in results.items():
+            if err:
+                stats['errors'] += 1
+                _latest.setdefault(probe, {'temp': None, 'timestamp': None, 'monotonic': None})['error'] = err
+            else:
+                _latest[probe] = {'temp': temp_c, 'timestamp': stamp, 'monotonic': now, 'error': None}
+        _cond.notify_all()
+    return get_readings()
+
+
+def _refresh_loop():
+    while True:
+        started = time.monotonic()
+        refresh()
+        time.sleep(max(0.0, REFRESH_S - (time.monotonic() - started)))
+
+
+def start():
+    """Start the background refresh thread (idempotent)."""
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=_refresh_loop, daemon=True, name='w1temp')
+        _thread.start()
+
+
+def _primary():
+    if PRIMARY_PROBE:
+        return PRIMARY_PROBE
+    return min(_latest, default=None)
+
+
+def _entry(probe, now):
+    entry = _latest.get(probe)
+    if entry is None:
+        return {'temp': None, 'timestamp': None, 'age': None, 'error': _bus_error or 'No reading yet'}
+    age = None if entry['monotonic'] is None else now - entry['monotonic']
+    return {'temp': entry['temp'], 'timestamp': entry['timestamp'], 'age': age, 'error': entry['error']}
+
+
+def get_readings():
+    """Cached reading of every probe."""
+    now = time.monotonic()
+    with _cond:
+        return {probe: _entry(probe, now) for probe in _latest}
+
+
+def latest(probe=None, max_age=None, timeout=None):
+    """Cached reading of ``probe`` (default: the primary probe).
+
+    Waits up to ``timeout`` (default: one refresh period plus a conversion)
+    for the first reading, or for one at most ``max_age`` seconds old.
+    """
+    start()
+    deadline = time.monotonic() + (timeout if timeout is not None else REFRESH_S + max(CONVERSION_S.values()))
+    with _cond:
+        while True:
+            name = probe or _primary()
+            entry = _entry(name, time.monotonic())
+            fresh = entry['age'] is not None and (max_age is None or entry['age'] <= max_age)
+            remaining = deadline - time.monotonic()
+            if fresh or remaining <= 0:
+                return dict(entry, probe=name)
+            _cond.wait(remaining)
+
+
+def get_stats():
+    with _cond:
+        return dict(stats, probes=sorted(_probes or ()), bulk_read=_bulk_path is not None)